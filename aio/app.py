@@ -0,0 +1,83 @@
+"""
+Async application: the routes of app.py served by asyncio handlers
+
+The handlers only route: the request logic is the one of the Flask app, in
+controllers/*/service.py, run on a thread pool of AIO_HANDLER_THREADS so
+one worker keeps serving while requests wait on Mongo or the KDF executor.
+The listing, the export and /health read through pymongo's
+AsyncMongoClient. Run it with an ASGI server, e.g.:
+    hypercorn -b :5002 -w 2 aio.app:app
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from decouple import config
+from quart import Quart
+from aio.auth import auth
+from aio.db import close_async_client
+from aio.health import health
+from aio.rol import rol
+from aio.user import user
+from db.indexes import ensure_indexes
+from models.revoked_token.revocation_list import get_revocation_list
+from models.role.permission_index import get_permission_index
+from models.role.role_snapshot import get_role_snapshot
+from utils.password_hasher import configure as configure_password_hashing
+from utils.settings import get_settings, install_reload_signal
+
+app = Quart(__name__)
+# Quart refuses bodies over 16MB by default, /user/import takes up to USER_IMPORT_MAX_BYTES and checks it itself
+app.config['MAX_CONTENT_LENGTH'] = max(
+    app.config['MAX_CONTENT_LENGTH'] or 0, config('USER_IMPORT_MAX_BYTES', default=50 * 1024 * 1024, cast=int)
+)
+logging.basicConfig(level=logging.INFO)
+get_settings()
+
+for blueprint in (health, auth, rol, user):
+    app.register_blueprint(blueprint)
+
+if config('SECURITY_API_ENVIRONMENT') == 'Development':
+    @app.after_request
+    async def allow_any_origin(response):
+        response.headers.setdefault('Access-Control-Allow-Origin', '*')
+        return response
+
+
+def _warm_up():
+    # Same start-up work as app.py, run off the event loop
+    configure_password_hashing()
+    if config('MONGO_ENSURE_INDEXES', default=True, cast=bool):
+        try:
+            ensure_indexes()
+        except Exception as ex:
+            logging.error(f"Could not reconcile indexes: {ex}")
+    role_snapshot = get_role_snapshot()
+    if role_snapshot is not None:
+        get_permission_index().use_snapshot(role_snapshot)
+        role_snapshot.start()
+    else:
+        try:
+            get_permission_index().load()
+        except Exception as ex:
+            logging.error(f"Could not load the permission index: {ex}")
+    try:
+        get_revocation_list().load()
+        get_revocation_list().start()
+    except Exception as ex:
+        logging.error(f"Could not load the revocation list: {ex}")
+
+
+@app.before_serving
+async def start_up():
+    # In the worker process, after the ASGI server set its own signal handlers
+    install_reload_signal()
+    # Every request holds a thread while its handler runs, the default pool of a few threads would cap them
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=config('AIO_HANDLER_THREADS', default=64, cast=int), thread_name_prefix='aio-handler')
+    )
+    await asyncio.to_thread(_warm_up)
+
+
+@app.after_serving
+async def shut_down():
+    await close_async_client()
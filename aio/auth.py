@@ -0,0 +1,42 @@
+from quart import Blueprint, request
+from aio.util import parse_body, request_ip, respond
+from controllers.auth import service
+from controllers.schemas import LOGIN, LOGOUT, VERIFY_AUTH
+from utils.jwt_manager import get_jwks
+from utils.settings import get_settings
+
+auth = Blueprint('auth', __name__)
+
+
+@auth.post('/auth/verify_auth')
+async def verify_auth():
+    data, error = await parse_body(VERIFY_AUTH)
+    if error:
+        return error.to_tuple()
+    return await respond(service.verify_auth, request.headers.get("Authorization"), data['permission'])
+
+
+@auth.post('/auth/login')
+async def login():
+    data, error = await parse_body(LOGIN)
+    if error:
+        return error.to_tuple()
+    return await respond(service.login, data['email'], data['password'], request_ip())
+
+
+@auth.post('/auth/refresh')
+async def refresh():
+    return await respond(service.refresh, request.headers.get("Authorization"))
+
+
+@auth.get('/auth/jwks')
+async def jwks():
+    return get_jwks(), 200, {'Cache-Control': f"public, max-age={get_settings().jwks_max_age}"}
+
+
+@auth.put('/auth/logout')
+async def logout():
+    data, error = await parse_body(LOGOUT)
+    if error:
+        return error.to_tuple()
+    return await respond(service.logout, data['email'], request.headers.get('Authorization'))
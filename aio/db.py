@@ -0,0 +1,57 @@
+import asyncio
+import logging
+import os
+from decouple import config
+from pymongo import AsyncMongoClient
+from db.indexes import DEFAULT_COLLECTION_NAMES
+from utils.settings import get_settings
+
+_client = None
+_client_pid = None
+_client_url = None
+# Old clients being closed, referenced until their close task is done
+_closing = set()
+
+
+def get_async_client():
+    """Return the asyncio MongoClient of this process, created on first use
+
+    It shares the pool settings of db.mongo_client.get_client. The client is
+    bound to the event loop that first uses it, the async app runs a single
+    loop per worker process. A MONGO_URL changed by a settings reload gets
+    a new client, the previous one is closed on the loop.
+    """
+    global _client, _client_pid, _client_url
+    url = get_settings().mongo_url
+    if _client is not None and _client_pid == os.getpid() and _client_url != url:
+        logging.info("MONGO_URL changed, closing the asyncio MongoClient")
+        task = asyncio.get_running_loop().create_task(_client.close())
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+        _client = None
+    if _client is None or _client_pid != os.getpid():
+        _client = AsyncMongoClient(
+            url,
+            maxPoolSize=config("MONGO_MAX_POOL_SIZE", default=50, cast=int),
+            minPoolSize=config("MONGO_MIN_POOL_SIZE", default=0, cast=int),
+            maxIdleTimeMS=config("MONGO_MAX_IDLE_TIME_MS", default=60000, cast=int),
+            serverSelectionTimeoutMS=config("MONGO_SERVER_SELECTION_TIMEOUT_MS", default=5000, cast=int),
+            connect=False
+        )
+        _client_pid = os.getpid()
+        _client_url = url
+    return _client
+
+
+def get_async_collection(setting):
+    """Collection named by a setting, e.g. get_async_collection('USER_COLLECTION')"""
+    return get_async_client()[get_settings().mongo_db][config(setting, default=DEFAULT_COLLECTION_NAMES.get(setting))]
+
+
+async def close_async_client():
+    global _client, _client_pid, _client_url
+    if _client is not None and _client_pid == os.getpid():
+        await _client.close()
+    _client = None
+    _client_pid = None
+    _client_url = None
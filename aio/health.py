@@ -0,0 +1,34 @@
+import logging
+from quart import Blueprint
+from aio.queries import get_info_db
+from models.revoked_token.revocation_list import get_revocation_list
+from models.role.role_cache import get_role_cache
+from utils.email_manager import mail_stats
+from utils.jwt_manager import jwt_key_stats
+from utils.rate_limiter import rate_limit_stats
+from utils.kdf_executor import kdf_stats
+from utils.message_codes import HEALTH_SUCCESSFULLY, HEALTH_NOT_FOUND
+from utils.server_response import ServerResponse, StatusCode
+
+health = Blueprint('health', __name__)
+
+
+@health.get('/health')
+async def get_health():
+    try:
+        await get_info_db()
+        data = {
+            'kdf_executor': kdf_stats(),
+            'role_cache': get_role_cache().stats(),
+            'revocation_list': get_revocation_list().stats(),
+            'mail_delivery': mail_stats(),
+            'jwt_keys': jwt_key_stats(),
+            'rate_limits': rate_limit_stats()
+        }
+        response = ServerResponse(data=data, message='Connection to DB is OK',
+                                  message_code=HEALTH_SUCCESSFULLY, status=StatusCode.OK)
+    except Exception as ex:
+        logging.exception(ex)
+        response = ServerResponse(message='Connection to DB is not possible.',
+                                  message_code=HEALTH_NOT_FOUND, status=StatusCode.NOT_FOUND)
+    return response.to_tuple()
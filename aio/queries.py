@@ -0,0 +1,37 @@
+"""
+Async counterparts of the model queries the async app awaits itself
+
+The endpoints with request logic run the shared handlers of
+controllers/*/service.py on a thread. The reads here are the ones with
+no logic around them: the user listing, the streamed export and /health.
+They keep the contracts of the sync queries (same filters, same shapes).
+"""
+from aio.db import get_async_collection
+from db.mongo_client import keyset_query
+from models.user.listing import listing_projection, listing_page, listed_user
+
+
+def _users():
+    return get_async_collection('USER_COLLECTION')
+
+
+async def find_users_page(query, fields, after=None, limit=50):
+    """See models.user.listing.find_users_page"""
+    documents = await _users().find(keyset_query(query, after), listing_projection(fields)).sort('_id', 1).limit(limit + 1).to_list(None)
+    return listing_page(documents, fields, limit)
+
+
+async def iter_listed_users(query, fields, batch_size):
+    """See models.user.listing.iter_listed_users"""
+    after = None
+    while True:
+        documents = await _users().find(keyset_query(query, after), listing_projection(fields)).sort('_id', 1).limit(batch_size).to_list(None)
+        if documents:
+            yield [listed_user(document, fields) for document in documents]
+        if len(documents) < batch_size:
+            return
+        after = documents[-1]['_id']
+
+
+async def get_info_db():
+    return await get_async_collection('INFO_DB_COLLECTION').find({}).to_list()
@@ -0,0 +1,15 @@
+from quart import Blueprint
+from aio.util import parse_body, respond
+from controllers.rol import service
+from controllers.schemas import ROLE
+
+rol = Blueprint('rol', __name__)
+
+
+@rol.get('/rol')
+async def get_rol():
+    # Like RolParser, the name comes from the JSON body or the query string
+    data, error = await parse_body(ROLE, with_query=True)
+    if error:
+        return error.to_tuple()
+    return await respond(service.get_rol, data['name'])
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+from decouple import config
+from quart import Blueprint, request
+from werkzeug.exceptions import RequestEntityTooLarge
+from aio.queries import find_users_page, iter_listed_users
+from aio.util import parse_body, request_ip, respond
+from controllers.auth.authorization import authorize
+from controllers.schemas import ENROLLMENT, PASSWORD_CHANGE, PASSWORD_RESET, VERIFICATION, USER_LISTING
+from controllers.user import service
+from models.idempotency_key.idempotency_keys import IDEMPOTENCY_HEADER
+from models.user.bulk_import import (
+    ImportAborted, ImportBody, ImportBusy, ImportSlot, ImportTooLarge, import_format, importer_from_settings,
+    ndjson_results, FORMATS
+)
+from models.user.listing import listing_query, export_batch_size
+from utils.server_response import ServerResponse, StatusCode, encode
+from utils.message_codes import UNEXPECTED_ERROR, INVALID_IMPORT_FORMAT, IMPORT_TOO_LARGE, SERVER_BUSY
+
+user = Blueprint('user', __name__)
+
+
+@user.post('/user/enrollment')
+async def enrollment():
+    data, error = await parse_body(ENROLLMENT)
+    if error:
+        return error.to_tuple()
+    return await respond(
+        service.enrollment, data['name'], data['email'], data['password'], request_ip(),
+        request.headers.get(IDEMPOTENCY_HEADER)
+    )
+
+
+@user.put('/user/password')
+async def change_password():
+    data, error = await parse_body(PASSWORD_CHANGE)
+    if error:
+        return error.to_tuple()
+    return await respond(
+        service.change_password, data['user_email'], data['old_password'], data['new_password'],
+        data['confirm_password'], request_ip()
+    )
+
+
+@user.post('/user/password')
+async def reset_password():
+    data, error = await parse_body(PASSWORD_RESET)
+    if error:
+        return error.to_tuple()
+    return await respond(service.reset_password, data['email'], request_ip())
+
+
+@user.route('/user/verification', methods=['OPTIONS'])
+async def verification_options():
+    return '', 200, {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Headers": "Content-Type,Authorization",
+        "Access-Control-Allow-Methods": "GET,PUT,POST,DELETE,OPTIONS"
+    }
+
+
+@user.put('/user/verification')
+async def verification():
+    data, error = await parse_body(VERIFICATION)
+    if error:
+        return error.to_tuple()
+    return await respond(service.verification, data['user_email'], data['verification_code'])
+
+
+@user.post('/user/import')
+async def import_users():
+    """See UserImportController, the import itself runs on a thread"""
+    user_data, error = await asyncio.to_thread(authorize, request.headers.get('Authorization'), config('USER_IMPORT_PERMISSION', default='import_users'))
+    if error:
+        return error.to_tuple()
+
+    file_format = import_format(request.args.get('format'), request.mimetype)
+    if file_format is None:
+        return ServerResponse(
+            message=f"Send the users as text/csv or application/x-ndjson, or pass format={' or '.join(FORMATS)}",
+            message_code=INVALID_IMPORT_FORMAT,
+            status=StatusCode.BAD_REQUEST
+        ).to_tuple()
+
+    try:
+        slot = ImportSlot()
+    except ImportBusy as e:
+        return ServerResponse(
+            message=str(e),
+            message_code=SERVER_BUSY,
+            status=StatusCode.SERVICE_UNAVAILABLE,
+            headers={'Retry-After': str(e.retry_after)}
+        ).to_tuple()
+
+    body = ImportBody(config('USER_IMPORT_MAX_BYTES', default=50 * 1024 * 1024, cast=int))
+    try:
+        async for chunk in request.body:
+            body.write(chunk)
+        importer = importer_from_settings(dry_run=request.args.get('dry_run', '').lower() == 'true')
+        role = await asyncio.to_thread(importer.default_role)
+    except (ImportTooLarge, RequestEntityTooLarge):
+        body.close()
+        slot.release()
+        return ServerResponse(
+            message=f"Imports are limited to {body.max_bytes} bytes",
+            message_code=IMPORT_TOO_LARGE,
+            status=StatusCode.PAYLOAD_TOO_LARGE
+        ).to_tuple()
+    except ImportAborted as e:
+        body.close()
+        slot.release()
+        return ServerResponse(
+            message=str(e),
+            message_code=e.message_code,
+            status=StatusCode.UNPROCESSABLE_ENTITY
+        ).to_tuple()
+    except Exception as e:
+        body.close()
+        slot.release()
+        logging.error(f"An unexpected error occurred: {str(e)}", exc_info=True)
+        return ServerResponse(
+            message="An unexpected error occurred.",
+            message_code=UNEXPECTED_ERROR,
+            status=StatusCode.INTERNAL_SERVER_ERROR
+        ).to_tuple()
+
+    logging.info(f"User import ({file_format}) started by {user_data['email']}")
+    lines = ndjson_results(importer, body, file_format, role, slot)
+
+    async def stream():
+        try:
+            while True:
+                line = await asyncio.to_thread(next, lines, None)
+                if line is None:
+                    break
+                yield line
+        finally:
+            try:
+                lines.close()
+                # Already done by the generator if it started, not when it never ran
+                slot.release()
+            except ValueError:
+                # A disconnect cancelled us while a row was running on its thread, the generator is collected later
+                pass
+    return stream(), 200, {'Content-Type': 'application/x-ndjson'}
+
+
+@user.get('/user')
+async def list_users():
+    """See UserListController"""
+    _, error = await asyncio.to_thread(authorize, request.headers.get('Authorization'), config('USER_LIST_PERMISSION', default='list_users'))
+    if error:
+        return error.to_tuple()
+    args, error = await parse_body(USER_LISTING, with_query=True)
+    if error:
+        return error.to_tuple()
+    try:
+        page = await find_users_page(
+            listing_query(args['status'], args['role'], args['domain']), args['fields'], args['after'], args['limit']
+        )
+        return ServerResponse(data=page, status=StatusCode.OK).to_tuple()
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {str(e)}", exc_info=True)
+        return ServerResponse(
+            message="An unexpected error occurred.",
+            message_code=UNEXPECTED_ERROR,
+            status=StatusCode.INTERNAL_SERVER_ERROR
+        ).to_tuple()
+
+
+@user.get('/user/export')
+async def export_users():
+    """See UserExportController"""
+    user_data, error = await asyncio.to_thread(authorize, request.headers.get('Authorization'), config('USER_LIST_PERMISSION', default='list_users'))
+    if error:
+        return error.to_tuple()
+    args, error = await parse_body(USER_LISTING, with_query=True)
+    if error:
+        return error.to_tuple()
+    logging.info(f"User export started by {user_data['email']}")
+    query = listing_query(args['status'], args['role'], args['domain'])
+
+    async def stream():
+        try:
+            async for users in iter_listed_users(query, args['fields'], export_batch_size()):
+                yield b''.join(encode(listed) + b'\n' for listed in users)
+        except Exception as e:
+            logging.error(f"User export failed: {str(e)}", exc_info=True)
+            yield encode({'error': "The export stopped on an unexpected error"}) + b'\n'
+    return stream(), 200, {'Content-Type': 'application/x-ndjson', 'Content-Disposition': 'attachment; filename=users.ndjson'}
@@ -0,0 +1,26 @@
+import asyncio
+from quart import request
+from utils.rate_limiter import client_ip
+
+
+async def parse_body(schema, with_query=False):
+    """Quart counterpart of Schema.parse_request, returns (values, error ServerResponse)"""
+    data = await request.get_json(silent=True)
+    extra = (await request.values) if schema.from_values else request.args if with_query else None
+    if extra:
+        data = {**extra.to_dict(), **data} if isinstance(data, dict) else extra.to_dict()
+    return schema.validate(data)
+
+
+def request_ip():
+    """Quart counterpart of utils.rate_limiter.request_ip"""
+    return client_ip(request.remote_addr, request.headers.get('X-Forwarded-For'))
+
+
+async def respond(handler, *args):
+    """Run a request handler of controllers/*/service.py off the event loop, as a Quart response
+
+    The handlers are the ones of the Flask app, with their blocking Mongo and
+    KDF calls, so the loop keeps serving while they wait.
+    """
+    return (await asyncio.to_thread(handler, *args)).to_tuple()
@@ -4,6 +4,12 @@ from flask_restful import Api
 from flask_cors import CORS
 from decouple import config
 from service import addServiceLayer
+from db.indexes import ensure_indexes
+from utils.password_hasher import configure as configure_password_hashing
+from models.role.permission_index import get_permission_index
+from models.role.role_snapshot import get_role_snapshot
+from models.revoked_token.revocation_list import get_revocation_list
+from utils.settings import get_settings, install_reload_signal
 import logging
 
 app = Flask(__name__)
@@ -12,10 +18,43 @@ api = Api(app)
 flask_api_doc(app, config_path='./swagger.yml', url_prefix='/api/doc', title='API doc')
 logging.basicConfig(level=logging.INFO)
 
+# Fail on missing or malformed settings before serving anything, SIGHUP reloads them
+get_settings()
+install_reload_signal()
+
 if config('SECURITY_API_ENVIRONMENT') == 'Development':
     cors = CORS(app, resources={r"/api/openapi": {"origins": "*"}, r"/*": {"origins": "*"}})
 
 addServiceLayer(api)
 
+# Resolve the password hashing scheme, calibrating its cost when PASSWORD_HASH_TARGET_MS is set
+configure_password_hashing()
+
+if config('MONGO_ENSURE_INDEXES', default=True, cast=bool):
+    try:
+        ensure_indexes()
+    except Exception as ex:
+        # The service can still answer without the indexes, only slower
+        logging.error(f"Could not reconcile indexes: {ex}")
+
+role_snapshot = get_role_snapshot()
+if role_snapshot is not None:
+    # Roles are read from the host-wide snapshot, one process publishes it
+    get_permission_index().use_snapshot(role_snapshot)
+    role_snapshot.start()
+else:
+    try:
+        # Warm the role permissions so verify_auth never waits for Mongo
+        get_permission_index().load()
+    except Exception as ex:
+        logging.error(f"Could not load the permission index: {ex}")
+
+try:
+    # Warm the revoked token ids so validate_jwt never waits for Mongo
+    get_revocation_list().load()
+    get_revocation_list().start()
+except Exception as ex:
+    logging.error(f"Could not load the revocation list: {ex}")
+
 if __name__ == "__main__":
     app.run(host=config('FLASK_RUN_HOST'), port=config('SECURITY_SERVICE_PORT'))
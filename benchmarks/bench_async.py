@@ -0,0 +1,233 @@
+"""
+Throughput and latency of the sync app (gunicorn) against the async app (hypercorn)
+
+Both servers get the same memory budget: each is first started with one
+worker to measure its resident memory, then restarted with as many workers
+as fit in --memory-mb. Every scenario is then driven with the same load
+(--concurrency keep-alive clients for --duration seconds) against each
+server. The scenarios:
+    health  one Mongo query per request, pure I/O wait
+    login   user lookup, password check on the KDF executor, token update
+    verify  token validation only, no I/O
+
+Needs a reachable mongod, the servers use a throw-away database.
+
+Usage from the repository root (Linux, reads /proc):
+    python -m benchmarks.bench_async --uri mongodb://localhost:27017 --memory-mb 600
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+import bcrypt
+import requests
+from pymongo import MongoClient
+
+PASSWORD = 'benchmark-password'
+USERS = 200
+
+
+def seed(uri, db_name):
+    db = MongoClient(uri)[db_name]
+    db.user.drop()
+    db.role.drop()
+    db.info_db.drop()
+    now = datetime.utcnow()
+    db.role.insert_one({
+        'name': 'student', 'description': 'Student', 'permissions': ['read'], 'creation_date': now,
+        'mod_date': now, 'is_active': True, 'default_role': True, 'screens': [], 'app': 'bench'
+    })
+    db.info_db.insert_one({'name': 'bench'})
+    # A cheap bcrypt cost keeps the login scenario about I/O rather than the KDF
+    hashed = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(4)).decode()
+    db.user.insert_many([
+        {'name': f'Student {i}', 'email': f'student{i}@utn.ac.cr', 'password': hashed, 'status': 'Active',
+         'verification_code': '', 'expiration_code': None, 'role': 'student', 'token': '', 'is_session_active': False}
+        for i in range(USERS)
+    ])
+
+
+def server_env(uri, db_name):
+    env = dict(os.environ)
+    env.update({
+        'MONGO_URL': uri, 'MONGO_DB': db_name, 'USER_COLLECTION': 'user', 'ROLE_COLLECTION': 'role',
+        'INFO_DB_COLLECTION': 'info_db', 'PASSWORD_HASH_ALGORITHM': 'bcrypt', 'PASSWORD_HASH_COST': '4',
+        'PASSWORD_HASH_TARGET_MS': '0', 'FLASK_DEBUG': 'False', 'SECURITY_API_ENVIRONMENT': 'Benchmark',
+        'EMAIL_DELIVERY': 'queue'
+    })
+    env.setdefault('JWT_SECRET_KEY', 'benchmark-secret')
+    env.setdefault('ENCRYPTION_PASSWORD', 'benchmark-password')
+    return env
+
+
+def start_server(kind, port, workers, env):
+    if kind == 'sync':
+        command = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}', 'run_server:App']
+    else:
+        command = [sys.executable, '-m', 'hypercorn', '-w', str(workers), '-b', f'127.0.0.1:{port}', 'aio.app:app']
+    return launch(command, port, env, kind)
+
+
+def launch(command, port, env, name):
+    """Start a server and wait until its health endpoint answers"""
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/health', timeout=1).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.kill()
+    raise RuntimeError(f'{name} server did not start')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def tree_rss_mb(pid):
+    """Resident memory of a process and all its descendants"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+                children.setdefault(ppid, []).append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            with open(f'/proc/{current}/status') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+        except (OSError, StopIteration):
+            pass
+    return total / 1024
+
+
+def _request(session, base, scenario, i, token):
+    if scenario == 'health':
+        return session.get(f'{base}/health')
+    if scenario == 'login':
+        return session.post(f'{base}/auth/login', json={'email': f'student{i % USERS}@utn.ac.cr', 'password': PASSWORD})
+    return session.post(f'{base}/auth/verify_auth', json={'permission': 'read'}, headers={'Authorization': token})
+
+
+def _client(base, scenario, token, deadline, threads, results):
+    import threading
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def loop(offset):
+        session = requests.Session()
+        i = offset
+        local = []
+        while time.time() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = _request(session, base, scenario, i, token).status_code == 200
+            except requests.RequestException:
+                ok = False
+            local.append(time.perf_counter() - start)
+            if not ok:
+                with lock:
+                    errors[0] += 1
+            i += threads
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=loop, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put((latencies, errors[0]))
+
+
+def drive(port, scenario, concurrency, duration, client_processes):
+    base = f'http://127.0.0.1:{port}'
+    token = requests.post(f'{base}/auth/login', json={'email': 'student0@utn.ac.cr', 'password': PASSWORD}).json()['data']['token']
+    results = multiprocessing.Queue()
+    deadline = time.time() + duration
+    threads = max(concurrency // client_processes, 1)
+    clients = [multiprocessing.Process(target=_client, args=(base, scenario, token, deadline, threads, results))
+               for _ in range(client_processes)]
+    for client in clients:
+        client.start()
+    latencies, errors = [], 0
+    for _ in clients:
+        client_latencies, client_errors = results.get()
+        latencies.extend(client_latencies)
+        errors += client_errors
+    for client in clients:
+        client.join()
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    return {
+        'rps': len(latencies) / duration,
+        'p50': quantiles[49] * 1000,
+        'p95': quantiles[94] * 1000,
+        'p99': quantiles[98] * 1000,
+        'errors': errors
+    }
+
+
+def workers_for_budget(kind, port, env, memory_mb):
+    process = start_server(kind, port, 1, env)
+    try:
+        # Warm the worker so its memory reflects a serving process
+        for i in range(50):
+            requests.post(f'http://127.0.0.1:{port}/auth/login', json={'email': f'student{i}@utn.ac.cr', 'password': PASSWORD})
+        single = tree_rss_mb(process.pid)
+    finally:
+        stop_server(process)
+    # The master process is paid once, the rest scales with the workers
+    return max(int(memory_mb // single), 1), single
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uri', default='mongodb://localhost:27017')
+    parser.add_argument('--db', default='security_service_bench')
+    parser.add_argument('--memory-mb', type=float, default=600, help='Resident memory budget of each server')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--client-processes', type=int, default=4)
+    parser.add_argument('--scenarios', default='health,login,verify')
+    parser.add_argument('--port', type=int, default=5150)
+    args = parser.parse_args()
+
+    seed(args.uri, args.db)
+    env = server_env(args.uri, args.db)
+    report = []
+    for kind in ('sync', 'async'):
+        workers, single = workers_for_budget(kind, args.port, env, args.memory_mb)
+        process = start_server(kind, args.port, workers, env)
+        try:
+            rss = tree_rss_mb(process.pid)
+            for scenario in args.scenarios.split(','):
+                result = drive(args.port, scenario, args.concurrency, args.duration, args.client_processes)
+                report.append((kind, workers, single, rss, scenario, result))
+        finally:
+            stop_server(process)
+
+    print(f"{'server':<7}{'workers':>8}{'1w MB':>8}{'RSS MB':>8}  {'scenario':<8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for kind, workers, single, rss, scenario, r in report:
+        print(f"{kind:<7}{workers:>8}{single:>8.0f}{rss:>8.0f}  {scenario:<8}{r['rps']:>9.0f}{r['p50']:>9.1f}{r['p95']:>9.1f}{r['p99']:>9.1f}{r['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Lookup latency of the hot user/role queries with and without the declared indexes
+
+Seeds a throw-away database on a local mongod (about one million users by
+default), measures the queries used by the login/enrollment paths without the
+indexes, reconciles the indexes with db.indexes and measures again.
+
+Usage from the repository root:
+    python -m benchmarks.bench_indexes --uri mongodb://localhost:27017 --users 1000000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from pymongo import MongoClient
+from db.indexes import ensure_indexes, drop_declared_indexes
+
+USER_COLLECTION = 'user'
+ROLE_COLLECTION = 'role'
+COLLECTION_NAMES = {'USER_COLLECTION': USER_COLLECTION, 'ROLE_COLLECTION': ROLE_COLLECTION}
+DOMAINS = ['est.utn.ac.cr', 'utn.ac.cr', 'adm.utn.ac.cr']
+
+
+def user_email(i):
+    return f"student{i}@{DOMAINS[i % len(DOMAINS)]}"
+
+
+def seed(db, users, roles, batch_size):
+    db[USER_COLLECTION].drop()
+    db[ROLE_COLLECTION].drop()
+
+    now = datetime.utcnow()
+    db[ROLE_COLLECTION].insert_many([
+        {
+            'name': f"role{i}",
+            'description': f"Role {i}",
+            'permissions': ['read', 'write'],
+            'creation_date': now,
+            'mod_date': now,
+            'is_active': i % 4 != 0,
+            'default_role': i == 1,
+            'screens': ['Lab/Issue'],
+            'app': 'bench'
+        }
+        for i in range(roles)
+    ])
+
+    batch = []
+    for i in range(users):
+        batch.append({
+            'name': f"Student {i}",
+            'email': user_email(i),
+            # The stored value only has to look like a real hash
+            'password': 'x' * 60,
+            'status': 'Active' if i % 10 else 'Pending',
+            'verification_code': 100000 + i % 900000,
+            'expiration_code': now + timedelta(minutes=5),
+            'role': f"role{i % roles}",
+            'token': '',
+            'is_session_active': False
+        })
+        if len(batch) == batch_size:
+            db[USER_COLLECTION].insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db[USER_COLLECTION].insert_many(batch, ordered=False)
+
+
+def measure(fn, samples):
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'p50': statistics.median(timings),
+        'p95': timings[int(len(timings) * 0.95) - 1],
+        'p99': timings[int(len(timings) * 0.99) - 1],
+        'max': timings[-1]
+    }
+
+
+def run_queries(db, users, roles, samples):
+    users_collection = db[USER_COLLECTION]
+    roles_collection = db[ROLE_COLLECTION]
+    queries = {
+        'find_by_email': lambda: users_collection.find_one({'email': user_email(random.randrange(users))}),
+        'find_by_email (miss)': lambda: users_collection.find_one({'email': f"missing{random.randrange(users)}@utn.ac.cr"}),
+        'role get_by_name': lambda: roles_collection.find_one({'name': f"role{random.randrange(roles)}"}),
+        'active_and_default_roles': lambda: list(roles_collection.find({
+            'is_active': True,
+            '$or': [{'default_role': {'$exists': True}}, {'default_role': True}]
+        })),
+    }
+    return {name: measure(fn, samples) for name, fn in queries.items()}
+
+
+def print_report(without_indexes, with_indexes):
+    print(f"{'query':<28}{'no index p50':>14}{'p99':>10}{'index p50':>12}{'p99':>10}{'speedup':>10}")
+    for name, before in without_indexes.items():
+        after = with_indexes[name]
+        speedup = before['p50'] / after['p50'] if after['p50'] else float('inf')
+        print(f"{name:<28}{before['p50']:>12.3f}ms{before['p99']:>8.3f}ms"
+              f"{after['p50']:>10.3f}ms{after['p99']:>8.3f}ms{speedup:>9.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uri', default='mongodb://localhost:27017')
+    parser.add_argument('--db', default='security_service_bench')
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--roles', type=int, default=20)
+    parser.add_argument('--samples', type=int, default=200, help='Lookups per query and phase')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--skip-seed', action='store_true', help='Reuse the data of a previous run')
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    db = client[args.db]
+
+    if not args.skip_seed:
+        start = time.perf_counter()
+        seed(db, args.users, args.roles, args.batch_size)
+        print(f"Seeded {args.users} users and {args.roles} roles in {time.perf_counter() - start:.1f}s")
+
+    drop_declared_indexes(db, COLLECTION_NAMES)
+    without_indexes = run_queries(db, args.users, args.roles, args.samples)
+
+    start = time.perf_counter()
+    ensure_indexes(db, COLLECTION_NAMES)
+    print(f"Built indexes in {time.perf_counter() - start:.1f}s")
+    with_indexes = run_queries(db, args.users, args.roles, args.samples)
+
+    print_report(without_indexes, with_indexes)
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
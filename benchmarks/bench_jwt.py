@@ -0,0 +1,99 @@
+"""
+Token issue and verify throughput per signing algorithm
+
+No server or database needed, keys are generated in memory:
+    pyjwt    jwt.encode / get_unverified_header + jwt.decode with the secret or
+             PEM as read from the settings, parsed again on every call
+    keyring  utils.jwt_manager.Keyring, keys parsed once and looked up by kid
+
+Usage from the repository root:
+    python -m benchmarks.bench_jwt --iterations 20000
+"""
+import argparse
+import os
+import time
+import timeit
+import uuid
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from utils.jwt_manager import JwtKey, Keyring
+
+
+def _pem(private_key):
+    return private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+
+
+def generate_keys():
+    """{algorithm: (key as PyJWT takes it from the settings, key object for the keyring)}"""
+    secret = os.urandom(32).hex()
+    keys = {'HS256': (secret, secret.encode())}
+    for algorithm, private_key in (
+        ('EdDSA', ed25519.Ed25519PrivateKey.generate()),
+        ('ES256', ec.generate_private_key(ec.SECP256R1())),
+        ('RS256', rsa.generate_private_key(public_exponent=65537, key_size=2048)),
+    ):
+        keys[algorithm] = (_pem(private_key), private_key)
+    return keys
+
+
+def claims():
+    now = int(time.time())
+    return {
+        'exp': now + 1800, 'iat': now, 'iss': 'security-service-api', 'jti': uuid.uuid4().hex,
+        'sub': '64b7f0c2e13c4a2f9d1e8a77', 'rolName': 'student', 'email': 'student0@utn.ac.cr',
+        'name': 'Student 0', 'status': 'Active', 'permissions': ['read_courses', 'read_grades']
+    }
+
+
+def pyjwt_functions(algorithm, pem_or_secret):
+    if algorithm == 'HS256':
+        signing, verifying = pem_or_secret, pem_or_secret
+    else:
+        signing = pem_or_secret
+        private_key = serialization.load_pem_private_key(pem_or_secret.encode(), password=None)
+        verifying = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+
+    def issue():
+        return jwt.encode(claims(), signing, algorithm=algorithm)
+
+    token = issue()
+
+    def verify():
+        jwt.get_unverified_header(token)
+        return jwt.decode(token, verifying, algorithms=[algorithm])
+    return issue, verify
+
+
+def keyring_functions(algorithm, key):
+    keyring = Keyring([JwtKey(algorithm, key, active=True)])
+
+    def issue():
+        return keyring.sign(claims())
+
+    token = issue()
+
+    def verify():
+        return keyring.verify(token)
+    return issue, verify
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'algorithm':<10}{'path':<9}{'issue/s':>10}{'verify/s':>10}")
+    for algorithm, (pem_or_secret, key) in generate_keys().items():
+        for path, functions in (('pyjwt', pyjwt_functions(algorithm, pem_or_secret)),
+                                ('keyring', keyring_functions(algorithm, key))):
+            rates = [args.iterations / timeit.timeit(fn, number=args.iterations) for fn in functions]
+            print(f"{algorithm:<10}{path:<9}{rates[0]:>10.0f}{rates[1]:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
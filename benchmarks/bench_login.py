@@ -0,0 +1,100 @@
+"""
+Latency of the login data path before and after the projected login
+
+Measures, against a local mongod, the Mongo work of one login (password
+verification is left out, it is the same in both paths), with the role
+served by the warm role cache:
+    before   full user document by email, then the token update by id
+    login    projected login record by email, then the conditional
+             find_one_and_update of the session
+
+Usage from the repository root:
+    python -m benchmarks.bench_login --uri mongodb://localhost:27017
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime
+import bcrypt
+from pymongo import MongoClient
+
+USERS = 10000
+
+
+def seed(db):
+    db.user.drop()
+    db.role.drop()
+    now = datetime.utcnow()
+    hashed = bcrypt.hashpw(b'benchmark-password', bcrypt.gensalt(4)).decode()
+    db.role.insert_one({
+        'name': 'student', 'description': 'Student', 'permissions': ['read'], 'creation_date': now,
+        'mod_date': now, 'is_active': True, 'default_role': True, 'screens': ['Lab/Issue'], 'app': 'bench'
+    })
+    db.user.insert_many([
+        {'name': f'Student {i}', 'email': f'student{i}@utn.ac.cr', 'password': hashed, 'status': 'Active',
+         'verification_code': 100000 + i, 'expiration_code': now, 'role': 'student', 'token': 'x' * 400,
+         'is_session_active': False}
+        for i in range(USERS)
+    ])
+    db.user.create_index('email', unique=True)
+    db.role.create_index('name', unique=True)
+
+
+def measure(fn, samples):
+    timings = []
+    for _ in range(samples):
+        email = f'student{random.randrange(USERS)}@utn.ac.cr'
+        start = time.perf_counter()
+        fn(email)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'p50': statistics.median(timings),
+        'p99': timings[int(len(timings) * 0.99) - 1]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uri', default='mongodb://localhost:27017')
+    parser.add_argument('--db', default='security_service_bench')
+    parser.add_argument('--samples', type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ.update({
+        'MONGO_URL': args.uri, 'MONGO_DB': args.db, 'USER_COLLECTION': 'user', 'ROLE_COLLECTION': 'role',
+        'PASSWORD_HASH_ALGORITHM': 'bcrypt', 'PASSWORD_HASH_COST': '4', 'PASSWORD_HASH_TARGET_MS': '0'
+    })
+    client = MongoClient(args.uri)
+    seed(client[args.db])
+
+    # Imported once the settings point at the benchmark database
+    from models.role.role import RoleModel
+    from models.user.user import UserModel
+
+    def before(email):
+        user = UserModel.find_by_email(email)
+        RoleModel.get_by_name(user['role'])
+        UserModel.update_token(user['id'], 'token')
+
+    def login(email):
+        user = UserModel.find_login_record(email)
+        RoleModel.get_by_name(user.role)
+        # The stored hash is current, record_login never re-hashes here
+        UserModel.record_login(user, 'token', 'unused')
+
+    results = {
+        'before': measure(before, args.samples),
+        'login': measure(login, args.samples)
+    }
+
+    print(f"{'path':<14}{'p50':>10}{'p99':>10}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['p50']:>8.3f}ms{r['p99']:>8.3f}ms")
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Cost of reading a login body: per-request reqparse parser against the compiled schema
+
+Runs inside a Flask request context, no server or database needed:
+    reqparse  RequestParser built and run on every request, like LoginController did
+    schema    controllers.schemas.LOGIN, compiled once at import
+
+Usage from the repository root:
+    python -m benchmarks.bench_request_parsing --iterations 100000
+"""
+import argparse
+import timeit
+from flask import Flask
+from flask_restful import reqparse
+from werkzeug.exceptions import HTTPException
+from controllers.schemas import LOGIN
+
+BODIES = {
+    'valid': {'email': 'student0@utn.ac.cr', 'password': 'benchmark-password'},
+    'missing field': {'email': 'student0@utn.ac.cr'},
+}
+
+
+def reqparse_login():
+    parser = reqparse.RequestParser()
+    parser.add_argument('email', required=True, help="Email cannot be blank!")
+    parser.add_argument('password', required=True, help="Password cannot be blank!")
+    try:
+        return parser.parse_args()
+    except HTTPException:
+        return None
+
+
+def schema_login():
+    return LOGIN.parse_request()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    print(f"{'body':<15}{'reqparse us':>13}{'schema us':>11}{'speedup':>9}")
+    for name, body in BODIES.items():
+        with app.test_request_context('/auth/login', method='POST', json=body):
+            timings = [
+                timeit.timeit(fn, number=args.iterations) / args.iterations * 1e6
+                for fn in (reqparse_login, schema_login)
+            ]
+        print(f"{name:<15}{timings[0]:>13.2f}{timings[1]:>11.2f}{timings[0] / timings[1]:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Throughput and latency of the worker profiles of run_server.py
+
+Each profile (sync, gthread, gevent) is started through `python run_server.py`
+with its default worker count, or --workers when given, and driven with the
+same load (--concurrency keep-alive clients for --duration seconds) on:
+    login   user lookup, password check on the KDF executor, token update
+    verify  token validation only, no I/O
+
+The gevent profile is skipped when gevent is not installed.
+Needs a reachable mongod, the servers use a throw-away database.
+
+Usage from the repository root (Linux, reads /proc):
+    python -m benchmarks.bench_server_profiles --uri mongodb://localhost:27017
+"""
+import argparse
+import importlib.util
+import sys
+from benchmarks.bench_async import seed, server_env, launch, stop_server, tree_rss_mb, drive
+
+
+def start_profile(profile, port, workers, env):
+    env = dict(env)
+    env.update({
+        'SERVER_PROFILE': profile, 'SERVER_WORKERS': str(workers), 'SECURITY_SERVICE_PORT': str(port),
+        'FLASK_RUN_HOST': '127.0.0.1', 'SERVER_ACCESS_LOG': '', 'SERVER_LOG_LEVEL': 'warning'
+    })
+    return launch([sys.executable, 'run_server.py'], port, env, profile)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uri', default='mongodb://localhost:27017')
+    parser.add_argument('--db', default='security_service_bench')
+    parser.add_argument('--profiles', default='sync,gthread,gevent')
+    parser.add_argument('--workers', type=int, default=0, help='Workers of every profile, 0 uses the profile default')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--client-processes', type=int, default=4)
+    parser.add_argument('--scenarios', default='login,verify')
+    parser.add_argument('--port', type=int, default=5160)
+    args = parser.parse_args()
+
+    seed(args.uri, args.db)
+    env = server_env(args.uri, args.db)
+    report = []
+    for profile in args.profiles.split(','):
+        if profile == 'gevent' and importlib.util.find_spec('gevent') is None:
+            print('Skipping gevent, the package is not installed')
+            continue
+        process = start_profile(profile, args.port, args.workers, env)
+        try:
+            rss = tree_rss_mb(process.pid)
+            for scenario in args.scenarios.split(','):
+                result = drive(args.port, scenario, args.concurrency, args.duration, args.client_processes)
+                report.append((profile, rss, scenario, result))
+        finally:
+            stop_server(process)
+
+    print(f"{'profile':<9}{'RSS MB':>8}  {'scenario':<8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for profile, rss, scenario, r in report:
+        print(f"{profile:<9}{rss:>8.0f}  {scenario:<8}{r['rps']:>9.0f}{r['p50']:>9.1f}{r['p95']:>9.1f}{r['p99']:>9.1f}{r['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
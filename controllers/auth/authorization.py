@@ -0,0 +1,35 @@
+from models.role.permission_index import PermissionIndexUnavailable, get_permission_index, unavailable_server_response
+from utils.jwt_manager import validate_jwt
+from utils.message_codes import PERMISSION_DENIED
+from utils.server_response import ServerResponse, StatusCode
+
+
+def authorize(token, permission):
+    """(user data, None) when the token is valid and its role grants `permission`, (None, error ServerResponse) otherwise
+
+    Checked in-process like /auth/verify_auth, for the endpoints of this service that need a role.
+    """
+    if not token:
+        return None, ServerResponse(
+            message="Authorization token is required",
+            message_code="AUTH_TOKEN_REQUIRED",
+            status=StatusCode.UNAUTHORIZED
+        )
+    user_data = validate_jwt(token)
+    if user_data is None:
+        return None, ServerResponse(
+            message="Token Not Valid",
+            message_code="INVALID_TOKEN",
+            status=StatusCode.UNAUTHORIZED
+        )
+    try:
+        granted = get_permission_index().has_permission(user_data['rolName'], permission)
+    except PermissionIndexUnavailable as e:
+        return None, unavailable_server_response(e)
+    if not granted:
+        return None, ServerResponse(
+            message="The user role does not grant this permission",
+            message_code=PERMISSION_DENIED,
+            status=StatusCode.FORBIDDEN
+        )
+    return user_data, None
@@ -0,0 +1,20 @@
+import json
+from flask import Response
+from flask_restful import Resource
+from utils.jwt_manager import get_jwks
+from utils.settings import get_settings
+
+class JwksController(Resource):
+    route = '/auth/jwks'
+
+    """
+    Public keys to verify tokens without calling verify_auth
+    """
+    def get(self):
+        # Standard JWK Set body so any JOSE library can consume it
+        return Response(
+            json.dumps(get_jwks()),
+            mimetype='application/json',
+            status=200,
+            headers={'Cache-Control': f"public, max-age={get_settings().jwks_max_age}"}
+        )
@@ -0,0 +1,208 @@
+"""
+Request handling of the auth endpoints, shared by the Flask controllers and the async app
+
+Each function takes the validated fields and headers of the request and
+returns a ServerResponse, the caller only parses the request and sends it.
+"""
+import logging
+from datetime import datetime, timedelta
+from models.role.permission_index import PermissionIndexUnavailable, get_permission_index, unavailable_server_response
+from models.role.role import RoleModel
+from models.user.records import UserSession
+from models.user.user import UserModel
+from utils.email_validator import is_valid_email_domain
+from utils.jwt_manager import validate_jwt, generate_jwt, revoke_token
+from utils.kdf_executor import KdfPoolSaturated, saturated_server_response
+from utils.message_codes import PERMISSION_DENIED
+from utils.rate_limiter import RateLimited, throttled_server_response, check_rate_limits, record_failure, clear_failures
+from utils.server_response import ServerResponse, StatusCode
+
+
+def verify_auth(token, permission):
+    if not token:
+        return ServerResponse(
+            data=None,
+            message="Authorization token is required",
+            message_code="AUTH_TOKEN_REQUIRED",
+            status=StatusCode.UNAUTHORIZED
+        )
+
+    # Validate JWT
+    user_data = validate_jwt(token)
+    if user_data is None:
+        return ServerResponse(
+            message="User Not valid",
+            message_code="USER_NOT_FOUND",
+            status=StatusCode.BAD_REQUEST
+        )
+
+    # An empty permission only asks for authentication
+    try:
+        granted = not permission or get_permission_index().has_permission(user_data['rolName'], permission)
+    except PermissionIndexUnavailable as e:
+        return unavailable_server_response(e)
+    if not granted:
+        return ServerResponse(
+            message="The user role does not grant this permission",
+            message_code=PERMISSION_DENIED,
+            status=StatusCode.FORBIDDEN
+        )
+
+    return ServerResponse(
+        data=user_data,
+        message="User is valid",
+        message_code="USER_AUTHENTICATED",
+        status=StatusCode.OK
+    )
+
+
+def login(email, password, ip):
+    if not is_valid_email_domain(email):
+        return ServerResponse(
+            message="Invalid email domain",
+            message_code="INVALID_EMAIL_DOMAIN",
+            status=StatusCode.BAD_REQUEST
+        )
+
+    try:
+        # Before any Mongo or KDF work, a credential stuffing run stops here
+        check_rate_limits(ip, email)
+    except RateLimited as e:
+        return throttled_server_response(e)
+
+    user = UserModel.find_login_record(email)
+
+    try:
+        valid_password = bool(user) and UserModel.verify_password(password, user.password)
+    except KdfPoolSaturated as e:
+        return saturated_server_response(e)
+
+    if not valid_password:
+        record_failure(email)
+        return ServerResponse(
+            message="Invalid email or password",
+            message_code="INVALID_CREDENTIALS",
+            status=StatusCode.UNAUTHORIZED
+        )
+
+    if user.status != "Active":
+        return ServerResponse(
+            message="User is not active",
+            message_code="USER_NOT_ACTIVE",
+            status=StatusCode.FORBIDDEN
+        )
+
+    clear_failures(email)
+    role_object = RoleModel.get_by_name(user.role)
+    try:
+        permissions = get_permission_index().permissions_of(user.role)
+    except PermissionIndexUnavailable as e:
+        return unavailable_server_response(e)
+    token = generate_jwt(user.id, user.role, user.email, user.name, user.status, permissions)
+
+    # Store the token, conditioned on the user still being the one just authenticated
+    if not UserModel.record_login(user, token, password):
+        return ServerResponse(
+            message="Failed to update user token",
+            message_code="TOKEN_UPDATE_FAILED",
+            status=StatusCode.INTERNAL_SERVER_ERROR
+        )
+
+    return ServerResponse(
+        data={
+            "email": user.email,
+            "name": user.name,
+            "status": user.status,
+            "role": {
+                "name": role_object.name,
+                "permissions": role_object.permissions,
+                "is_active": role_object.is_active,
+                "screens": role_object.screens
+            },
+            "token": token
+        },
+        message="User has been authenticated",
+        message_code="USER_AUTHENTICATED",
+        status=StatusCode.OK
+    )
+
+
+def refresh(token):
+    if not token:
+        return ServerResponse(
+            message="Token not added",
+            message_code="BAD_REQUEST",
+            status=StatusCode.BAD_REQUEST
+        )
+
+    # Validate the old token
+    result = validate_jwt(token)
+    if result is None:
+        return ServerResponse(
+            message="Token Not Valid",
+            message_code="NOT_FOUND",
+            status=StatusCode.NOT_FOUND
+        )
+
+    expiration_time = result.get('exp', datetime.utcnow())  # Ensure expiration time is available
+    current_time = datetime.utcnow()
+    grace_period_end = expiration_time + timedelta(minutes=30)  # Grace period for token refresh
+
+    # An expired token is only refreshed within the grace period
+    if current_time > expiration_time and current_time >= grace_period_end:
+        return ServerResponse(
+            message="Token Expired",
+            message_code="UNAUTHORIZED",
+            status=StatusCode.UNAUTHORIZED
+        )
+
+    role_name = result['rolName']
+    try:
+        permissions = get_permission_index().permissions_of(role_name)
+    except PermissionIndexUnavailable as e:
+        return unavailable_server_response(e)
+    new_token = generate_jwt(result['identity'], role_name, result['email'], result['name'], result['status'], permissions)
+    return ServerResponse(
+        data={'token': new_token},
+        message='Token Refreshed',
+        message_code='OK',
+        status=StatusCode.OK
+    )
+
+
+def logout(email, token):
+    """`token` is the Authorization header of the request, revoked along with the session token"""
+    if not isinstance(email, str) or '@' not in email:
+        logging.warning(f"Invalid email format: {email}")
+        return ServerResponse(
+            message="Invalid email format",
+            message_code="INVALID_EMAIL",
+            status=StatusCode.BAD_REQUEST
+        )
+
+    user = UserModel.find_by_email(email, UserSession)
+    if not user:
+        logging.warning(f"User not found with email: {email}")
+        return ServerResponse(
+            message="The user does not exist",
+            message_code="INVALID_CREDENTIALS",
+            status=StatusCode.BAD_REQUEST
+        )
+
+    try:
+        # Revoke the session token and the presented one so they stop passing verify_auth
+        for revoked in (user.token, token):
+            if revoked:
+                revoke_token(revoked)
+        UserModel.logout_user(email)
+        return ServerResponse(
+            message="User has been logged out",
+            message_code="USER_LOGGED_OUT",
+            status=StatusCode.OK
+        )
+    except Exception:
+        return ServerResponse(
+            message="An error occurred during logout",
+            message_code="LOGOUT_ERROR",
+            status=StatusCode.INTERNAL_SERVER_ERROR
+        )
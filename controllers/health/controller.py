@@ -3,6 +3,13 @@ from flask_restful import Resource
 from utils.server_response import *
 from utils.message_codes import *
 from models.health.model import HealthModel
+from db.mongo_client import pool_stats
+from utils.kdf_executor import kdf_stats
+from models.role.role_cache import get_role_cache
+from models.revoked_token.revocation_list import get_revocation_list
+from utils.email_manager import mail_stats
+from utils.jwt_manager import jwt_key_stats
+from utils.rate_limiter import rate_limit_stats
 import logging
 
 
@@ -17,7 +24,16 @@ class HealthController(Resource):
         try:
             # Check connection status
             info_db= HealthModel.getInfoDB()
-            response = ServerResponse(message='Connection to DB is OK',
+            data = {
+                'mongo_pool': pool_stats(),
+                'kdf_executor': kdf_stats(),
+                'role_cache': get_role_cache().stats(),
+                'revocation_list': get_revocation_list().stats(),
+                'mail_delivery': mail_stats(),
+                'jwt_keys': jwt_key_stats(),
+                'rate_limits': rate_limit_stats()
+            }
+            response = ServerResponse(data=data, message='Connection to DB is OK',
                                         message_code=HEALTH_SUCCESSFULLY, status=StatusCode.OK)      
         except Exception as ex:
             print(ex)
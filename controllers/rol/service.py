@@ -0,0 +1,38 @@
+"""
+Request handling of the role endpoint, shared by the Flask controller and the async app
+"""
+import logging
+from models.role.role import RoleModel
+from utils.server_response import ServerResponse, StatusCode
+
+
+def get_rol(object_name):
+    try:
+        if not object_name:
+            return ServerResponse(message="name not inserted", message_code="ROL_NOT_FOUND", status=StatusCode.NOT_FOUND)
+
+        result = RoleModel.get_by_name(object_name)
+
+        if isinstance(result, dict) and "error" in result:
+            return ServerResponse(
+                data={},
+                message=result["error"],
+                status=StatusCode.INTERNAL_SERVER_ERROR,
+            )
+
+        if not result:  # If there are no rol objects
+            return ServerResponse(
+                data={},
+                message="No rol objects found",
+                message_code="NO_DATA",
+                status=StatusCode.OK,
+            )
+        return ServerResponse(
+            data=result.to_dict(),  # Convert the RolModel instance to a dictionary
+            message="ROL_FOUND",
+            message_code="OK_MSG",
+            status=StatusCode.OK,
+        )
+    except Exception as ex:
+        logging.error(ex)
+        return ServerResponse(status=StatusCode.INTERNAL_SERVER_ERROR)
@@ -0,0 +1,80 @@
+"""
+Request bodies of the endpoints, compiled once at import
+
+Shared by the Flask controllers and the async app, see utils.schema.
+"""
+from models.user.listing_fields import page_limit, page_cursor, listed_fields, email_domain, LISTED_FIELDS
+from utils.schema import Schema, Field
+
+
+def _permission_list(value):
+    if not isinstance(value, list) or not all(isinstance(permission, dict) for permission in value):
+        raise ValueError('must be a list of objects')
+    return value
+
+
+# Login, logout, verify_auth and the role lookup also take form fields and the query string, as their reqparse parsers did
+LOGIN = Schema(
+    from_values=True,
+    email=Field(str, required=True, help="Email cannot be blank!"),
+    password=Field(str, required=True, help="Password cannot be blank!")
+)
+
+LOGOUT = Schema(
+    from_values=True,
+    email=Field(str, required=True, help="Email cannot be blank!")
+)
+
+# An empty permission only asks for authentication
+VERIFY_AUTH = Schema(
+    from_values=True,
+    permission=Field(str, required=True, help='Permission is required')
+)
+
+# Format and domain rules are checked by the controller, with their own messages
+ENROLLMENT = Schema(
+    name=Field(str),
+    email=Field(str),
+    password=Field(str)
+)
+
+PASSWORD_CHANGE = Schema(
+    message="All fields are required: user_email, old_password, new_password, confirm_password",
+    user_email=Field(str, required=True, blank=False),
+    old_password=Field(str, required=True, blank=False),
+    new_password=Field(str, required=True, blank=False),
+    confirm_password=Field(str, required=True, blank=False)
+)
+
+PASSWORD_RESET = Schema(
+    email=Field(str, required=True, blank=False, help="User email is required")
+)
+
+VERIFICATION = Schema(
+    user_email=Field(str, required=True, help="User email is required"),
+    verification_code=Field(int, required=True, help="Verification code is required")
+)
+
+ROLE = Schema(
+    from_values=True,
+    _id=Field(str),
+    name=Field(str),
+    description=Field(str),
+    permissions=Field(_permission_list),
+    creation_date=Field(str),
+    mod_date=Field(str),
+    is_active=Field(str),
+    default_role=Field(list),
+    screens=Field(str),
+    app=Field(str)
+)
+
+# Query string of the user listing and export
+USER_LISTING = Schema(
+    limit=Field(page_limit, default=50),
+    after=Field(page_cursor),
+    status=Field(str),
+    role=Field(str),
+    domain=Field(email_domain),
+    fields=Field(listed_fields, default=LISTED_FIELDS)
+)
@@ -0,0 +1,25 @@
+import logging
+from decouple import config
+from flask import request, Response, stream_with_context
+from flask_restful import Resource
+from controllers.auth.authorization import authorize
+from controllers.schemas import USER_LISTING
+from models.user.listing import listing_query, ndjson_users
+
+
+class UserExportController(Resource):
+    route = '/user/export'
+
+    def get(self):
+        user, error = authorize(request.headers.get('Authorization'), config('USER_LIST_PERMISSION', default='list_users'))
+        if error:
+            return error.to_response()
+        args, error = USER_LISTING.parse_request(with_query=True)
+        if error:
+            return error.to_response()
+        logging.info(f"User export started by {user['email']}")
+        return Response(
+            stream_with_context(ndjson_users(listing_query(args['status'], args['role'], args['domain']), args['fields'])),
+            mimetype='application/x-ndjson',
+            headers={'Content-Disposition': 'attachment; filename=users.ndjson'}
+        )
@@ -0,0 +1,87 @@
+import logging
+from decouple import config
+from flask import request, Response, stream_with_context
+from flask_restful import Resource
+from controllers.auth.authorization import authorize
+from models.user.bulk_import import (
+    ImportAborted, ImportBody, ImportBusy, ImportSlot, ImportTooLarge, import_format, importer_from_settings,
+    ndjson_results, FORMATS
+)
+from utils.server_response import ServerResponse, StatusCode
+from utils.message_codes import INVALID_IMPORT_FORMAT, IMPORT_TOO_LARGE, IMPORT_UNAVAILABLE, SERVER_BUSY, UNEXPECTED_ERROR
+
+
+class UserImportController(Resource):
+    route = '/user/import'
+
+    def post(self):
+        user, error = authorize(request.headers.get('Authorization'), config('USER_IMPORT_PERMISSION', default='import_users'))
+        if error:
+            return error.to_response()
+
+        file_format = import_format(request.args.get('format'), request.mimetype)
+        if file_format is None:
+            return ServerResponse(
+                message=f"Send the users as text/csv or application/x-ndjson, or pass format={' or '.join(FORMATS)}",
+                message_code=INVALID_IMPORT_FORMAT,
+                status=StatusCode.BAD_REQUEST
+            ).to_response()
+
+        if config('SERVER_PROFILE', default='gthread') == 'sync':
+            # A sync worker misses its heartbeat while it streams and gunicorn kills it after SERVER_TIMEOUT
+            return ServerResponse(
+                message="Imports need the gthread or gevent server profile, use python -m models.user.bulk_import",
+                message_code=IMPORT_UNAVAILABLE,
+                status=StatusCode.SERVICE_UNAVAILABLE
+            ).to_response()
+
+        try:
+            slot = ImportSlot()
+        except ImportBusy as e:
+            return ServerResponse(
+                message=str(e),
+                message_code=SERVER_BUSY,
+                status=StatusCode.SERVICE_UNAVAILABLE,
+                headers={'Retry-After': str(e.retry_after)}
+            ).to_response()
+
+        body = ImportBody(config('USER_IMPORT_MAX_BYTES', default=50 * 1024 * 1024, cast=int))
+        try:
+            for chunk in iter(lambda: request.stream.read(64 * 1024), b''):
+                body.write(chunk)
+            importer = importer_from_settings(dry_run=request.args.get('dry_run', '').lower() == 'true')
+            role = importer.default_role()
+        except ImportTooLarge as e:
+            body.close()
+            slot.release()
+            return ServerResponse(
+                message=str(e),
+                message_code=IMPORT_TOO_LARGE,
+                status=StatusCode.PAYLOAD_TOO_LARGE
+            ).to_response()
+        except ImportAborted as e:
+            body.close()
+            slot.release()
+            return ServerResponse(
+                message=str(e),
+                message_code=e.message_code,
+                status=StatusCode.UNPROCESSABLE_ENTITY
+            ).to_response()
+        except Exception as e:
+            body.close()
+            slot.release()
+            logging.error(f"An unexpected error occurred: {str(e)}", exc_info=True)
+            return ServerResponse(
+                message="An unexpected error occurred.",
+                message_code=UNEXPECTED_ERROR,
+                status=StatusCode.INTERNAL_SERVER_ERROR
+            ).to_response()
+
+        logging.info(f"User import ({file_format}) started by {user['email']}")
+        response = Response(
+            stream_with_context(ndjson_results(importer, body, file_format, role, slot)),
+            mimetype='application/x-ndjson'
+        )
+        # The stream may be closed before it starts, the slot must not leak then
+        response.call_on_close(slot.release)
+        return response
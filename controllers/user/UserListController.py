@@ -0,0 +1,33 @@
+import logging
+from decouple import config
+from flask import request
+from flask_restful import Resource
+from controllers.auth.authorization import authorize
+from controllers.schemas import USER_LISTING
+from models.user.listing import listing_query, find_users_page
+from utils.server_response import ServerResponse, StatusCode
+from utils.message_codes import UNEXPECTED_ERROR
+
+
+class UserListController(Resource):
+    route = '/user'
+
+    def get(self):
+        _, error = authorize(request.headers.get('Authorization'), config('USER_LIST_PERMISSION', default='list_users'))
+        if error:
+            return error.to_response()
+        args, error = USER_LISTING.parse_request(with_query=True)
+        if error:
+            return error.to_response()
+        try:
+            page = find_users_page(
+                listing_query(args['status'], args['role'], args['domain']), args['fields'], args['after'], args['limit']
+            )
+            return ServerResponse(data=page, status=StatusCode.OK).to_response()
+        except Exception as e:
+            logging.error(f"An unexpected error occurred: {str(e)}", exc_info=True)
+            return ServerResponse(
+                message="An unexpected error occurred.",
+                message_code=UNEXPECTED_ERROR,
+                status=StatusCode.INTERNAL_SERVER_ERROR
+            ).to_response()
@@ -0,0 +1,321 @@
+"""
+Request handling of the user endpoints, shared by the Flask controllers and the async app
+
+Each function takes the validated fields and headers of the request and
+returns a ServerResponse, the caller only parses the request and sends it.
+"""
+import logging
+import random
+from datetime import datetime, timedelta
+from db.mongo_client import run_in_transaction
+from models.idempotency_key.idempotency_keys import get_idempotency_keys
+from models.role.role import RoleModel
+from models.user.records import UserCredentials, UserExists, UserVerification
+from models.user.user import UserModel
+from utils.auth_manager import generate_verification_code
+from utils.email_manager import send_email, send_email_new_password
+from utils.enrollment_validator import enrollment_error
+from utils.kdf_executor import KdfPoolSaturated, saturated_server_response
+from utils.password_hasher import hash_password
+from utils.password_validator import validate_password
+from utils.rate_limiter import RateLimited, throttled_server_response, check_rate_limits, record_failure, clear_failures
+from utils.server_response import ServerResponse, StatusCode
+from utils.message_codes import (
+    CREATED, USER_ALREADY_REGISTERED, NO_ACTIVE_ROLES_FOUND, DEFAULT_ROLE_NOT_FOUND, USER_CREATION_ERROR,
+    UNEXPECTED_ERROR, USER_NOT_FOUND, USER_NOT_ACTIVE, INVALID_OLD_PASSWORD, PASSWORDS_DO_NOT_MATCH,
+    PASSWORD_UPDATED_SUCCESSFULLY, UNEXPECTED_ERROR_OCCURRED, PASSWORD_RESET_INITIATED, UPDATE_USER_FAILED,
+    INVALID_VERIFICATION_CODE, VERIFICATION_EXPIRED, VERIFICATION_SUCCESSFUL
+)
+
+
+def enrollment(name, email, password, ip, idempotency_key=None):
+    try:
+        # Validar email, dominio, nombre y contraseña
+        error = enrollment_error(name, email, password)
+        if error:
+            return error
+
+        try:
+            check_rate_limits(ip)
+        except RateLimited as e:
+            return throttled_server_response(e)
+
+        # Un reintento con la misma Idempotency-Key recibe la respuesta guardada
+        key_id = None
+        if idempotency_key is not None:
+            idempotency_keys = get_idempotency_keys()
+            key_id, answer = idempotency_keys.begin(
+                'enrollment', idempotency_key, email, idempotency_keys.fingerprint(email, name)
+            )
+            if answer is not None:
+                return answer
+
+        response = enroll(name, email, password)
+        if key_id is not None:
+            try:
+                get_idempotency_keys().finish(key_id, response)
+            except Exception as e:
+                # The pending record expires with its lease, a retry runs again then
+                logging.error(f"Error storing the idempotent response: {str(e)}", exc_info=True)
+        return response
+
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {str(e)}", exc_info=True)
+        return ServerResponse(
+            message="An unexpected error occurred.",
+            message_code=UNEXPECTED_ERROR,
+            status=StatusCode.INTERNAL_SERVER_ERROR
+        )
+
+
+def enroll(name, email, password):
+    """ServerResponse of the enrollment, the unique email index arbitrates concurrent requests"""
+    try:
+        verification_code = random.randint(100000, 999999)
+        expiration_code = datetime.utcnow() + timedelta(minutes=5)
+
+        def renew_and_notify(session):
+            # Un usuario pendiente recibe un nuevo código en la misma operación que lo busca
+            status = UserModel.renew_verification_code(email, verification_code, expiration_code, session=session)
+            if status == 'Pending':
+                send_email(email, verification_code, session=session)
+            return status
+
+        status = run_in_transaction(renew_and_notify)
+        if status is None:
+            # Obtener roles activos y el rol predeterminado, servidos por la caché de roles
+            active_roles, default_role = RoleModel.find_active_and_default_roles()
+
+            # Validar que haya al menos un rol activo
+            if not active_roles:
+                return ServerResponse(
+                    message="No active roles found",
+                    message_code=NO_ACTIVE_ROLES_FOUND,
+                    status=StatusCode.UNPROCESSABLE_ENTITY
+                )
+
+            # Validar que se haya encontrado un rol predeterminado
+            if not default_role:
+                return ServerResponse(
+                    message="Default role not found",
+                    message_code=DEFAULT_ROLE_NOT_FOUND,
+                    status=StatusCode.INTERNAL_SERVER_ERROR
+                )
+
+            user_data = {
+                'name': name,
+                # Hashed once, outside the transaction, a retried transaction reuses it
+                'password': hash_password(password),
+                'email': email,
+                'status': 'Pending',
+                'verification_code': verification_code,
+                'expiration_code': expiration_code,
+                'role': default_role['name'],
+                'token': "",
+                'is_session_active': False
+            }
+
+            def create_and_notify(session):
+                if not UserModel.create_user_once(user_data, session=session):
+                    return False
+                send_email(email, verification_code, session=session)
+                return True
+
+            if run_in_transaction(create_and_notify):
+                return ServerResponse(
+                    data=None,
+                    message="User created successfully",
+                    message_code=CREATED,
+                    status=StatusCode.CREATED,
+                )
+            # A concurrent enrollment inserted the email first
+            status = run_in_transaction(renew_and_notify)
+
+        if status == 'Pending':
+            return ServerResponse(
+                data=None,
+                message="It seems that your user is already register, sending another verification code, please check your email",
+                message_code=CREATED,
+                status=StatusCode.CREATED,
+            )
+        return ServerResponse(
+            message="The user is already registered",
+            message_code=USER_ALREADY_REGISTERED,
+            status=StatusCode.CONFLICT
+        )
+    except KdfPoolSaturated as e:
+        return saturated_server_response(e)
+    except Exception as e:
+        logging.error(f"Error creating user: {str(e)}", exc_info=True)
+        return ServerResponse(
+            message="Error creating user",
+            message_code=USER_CREATION_ERROR,
+            status=StatusCode.INTERNAL_SERVER_ERROR
+        )
+
+
+def change_password(user_email, old_password, new_password, confirm_password, ip):
+    try:
+        # Rejected before the lookup and the KDF work
+        check_rate_limits(ip, user_email)
+
+        # Buscar usuario por email
+        user = UserModel.find_by_email(user_email, UserCredentials)
+        if not user:
+            return ServerResponse(
+                message="User not found",
+                message_code=USER_NOT_FOUND,
+                status=StatusCode.NOT_FOUND
+            )
+
+        # Verificar estado del usuario
+        if user.status != 'Active':
+            return ServerResponse(
+                message="User is not active",
+                message_code=USER_NOT_ACTIVE,
+                status=StatusCode.FORBIDDEN
+            )
+
+        # Verificar contraseña antigua
+        if not UserModel.verify_password(old_password, user.password):
+            record_failure(user_email)
+            return ServerResponse(
+                message="Old password is incorrect",
+                message_code=INVALID_OLD_PASSWORD,
+                status=StatusCode.UNAUTHORIZED
+            )
+
+        # Validar nueva contraseña
+        validation_message = validate_password(new_password)
+        if validation_message:
+            return ServerResponse(
+                message=validation_message,
+                status=StatusCode.BAD_REQUEST
+            )
+
+        if new_password != confirm_password:
+            return ServerResponse(
+                message="New password and confirm password do not match",
+                message_code=PASSWORDS_DO_NOT_MATCH,
+                status=StatusCode.BAD_REQUEST
+            )
+
+        clear_failures(user_email)
+        # Hashear nueva contraseña y actualizarla
+        UserModel.update_password(user_email, hash_password(new_password))
+
+        return ServerResponse(
+            message="Password updated successfully",
+            message_code=PASSWORD_UPDATED_SUCCESSFULLY,
+            status=StatusCode.OK
+        )
+
+    except RateLimited as e:
+        return throttled_server_response(e)
+    except KdfPoolSaturated as e:
+        return saturated_server_response(e)
+    except Exception as e:
+        logging.error(f"An error occurred: {str(e)}", exc_info=True)
+        return ServerResponse(
+            message="An unexpected error occurred.",
+            message_code=UNEXPECTED_ERROR_OCCURRED,
+            status=StatusCode.INTERNAL_SERVER_ERROR
+        )
+
+
+def reset_password(user_email, ip):
+    try:
+        check_rate_limits(ip)
+        if not UserModel.find_by_email(user_email, UserExists):
+            return ServerResponse(
+                message="User not found",
+                message_code=USER_NOT_FOUND,
+                status=StatusCode.NOT_FOUND
+            )
+        verification_code = generate_verification_code()
+        expiration_time = datetime.utcnow() + timedelta(minutes=5)
+        email_prefix = user_email.split('@')[0]
+        temporal_password = f"{email_prefix}{verification_code}"
+        encrypted_temp_password = hash_password(temporal_password)
+
+        def reset_and_notify(session):
+            updated = UserModel.update_reset_password_info(
+                user_email,
+                verification_code,
+                expiration_time,
+                encrypted_temp_password,
+                session=session
+            )
+            if updated:
+                send_email_new_password(user_email, temporal_password, session=session)
+            return updated
+
+        if run_in_transaction(reset_and_notify):
+            return ServerResponse(
+                message="Password reset initiated",
+                message_code=PASSWORD_RESET_INITIATED,
+                status=StatusCode.OK
+            )
+        return ServerResponse(
+            message="Failed to update user information",
+            message_code=UPDATE_USER_FAILED,
+            status=StatusCode.INTERNAL_SERVER_ERROR
+        )
+    except RateLimited as e:
+        return throttled_server_response(e)
+    except KdfPoolSaturated as e:
+        return saturated_server_response(e)
+    except Exception as e:
+        logging.error(f"An error occurred: {str(e)}", exc_info=True)
+        return ServerResponse(
+            message="An unexpected error occurred.",
+            message_code=UNEXPECTED_ERROR_OCCURRED,
+            status=StatusCode.INTERNAL_SERVER_ERROR
+        )
+
+
+def verification(email, code):
+    try:
+        user = UserModel.find_by_email(email, UserVerification)
+
+        if not user:
+            return ServerResponse(
+                message="User not found",
+                message_code=USER_NOT_FOUND,
+                status=StatusCode.NOT_FOUND
+            )
+
+        if user.verification_code != code:
+            return ServerResponse(
+                message="Invalid verification code",
+                message_code=INVALID_VERIFICATION_CODE,
+                status=StatusCode.UNAUTHORIZED
+            )
+
+        if user.expiration_code < datetime.utcnow():
+            return ServerResponse({
+                "message": "Verification code expired",
+                "message_code": VERIFICATION_EXPIRED,
+                "status": StatusCode.UNAUTHORIZED
+            })
+
+        if user.status.lower() != 'pending':
+            return ServerResponse({
+                "message": "User is not in a pending state",
+                "status": StatusCode.BAD_REQUEST
+            })
+
+        UserModel.user_activation(email)
+
+        return ServerResponse({
+            "message": "User successfully verified",
+            "message_code": VERIFICATION_SUCCESSFUL,
+            "status": StatusCode.OK
+        })
+
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {str(e)}", exc_info=True)
+        return ServerResponse(
+            message="An unexpected error occurred.",
+            status=StatusCode.INTERNAL_SERVER_ERROR
+        )
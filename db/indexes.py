@@ -0,0 +1,160 @@
+"""
+Declared indexes of the service collections
+
+The declarations are keyed by the setting that holds the collection name so
+the same list works for every environment. `ensure_indexes` reconciles the
+live collections against them: missing indexes are created, declared indexes
+whose keys or options drifted are rebuilt and, with `prune`, undeclared
+indexes are dropped.
+
+Usage from the repository root:
+    python -m db.indexes [--dry-run] [--prune]
+"""
+import argparse
+import logging
+from decouple import config
+from pymongo import ASCENDING, IndexModel
+from db.mongo_client import get_database
+
+
+INDEXES = {
+    'USER_COLLECTION': [
+        # find_by_email, update_user, logout_user, user_activation
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+        # models.user.listing, keyset pages of a status or a role
+        IndexModel([('status', ASCENDING), ('_id', ASCENDING)], name='status_id'),
+        IndexModel([('role', ASCENDING), ('_id', ASCENDING)], name='role_id'),
+    ],
+    'ROLE_COLLECTION': [
+        # RoleModel.get_by_name
+        IndexModel([('name', ASCENDING)], name='name'),
+        # db_find_active_and_default_roles
+        IndexModel([('is_active', ASCENDING), ('default_role', ASCENDING)], name='is_active_default_role'),
+    ],
+    'REVOKED_TOKEN_COLLECTION': [
+        # Records disappear once the token has expired
+        IndexModel([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0),
+        # Incremental sync of the revocation list
+        IndexModel([('revoked_at', ASCENDING)], name='revoked_at'),
+    ],
+    'EMAIL_OUTBOX_COLLECTION': [
+        # Dispatcher claims: due pending emails and expired leases
+        IndexModel([('status', ASCENDING), ('next_attempt_at', ASCENDING)], name='status_next_attempt_at'),
+        IndexModel([('status', ASCENDING), ('lease_until', ASCENDING)], name='status_lease_until'),
+        # Sent emails are kept a week
+        IndexModel([('sent_at', ASCENDING)], name='sent_at_ttl', expireAfterSeconds=7 * 24 * 3600),
+    ],
+    'IDEMPOTENCY_COLLECTION': [
+        # Stored responses and abandoned claims
+        IndexModel([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0),
+    ],
+}
+
+# Collections whose setting is optional
+DEFAULT_COLLECTION_NAMES = {
+    'REVOKED_TOKEN_COLLECTION': 'revoked_token',
+    'EMAIL_OUTBOX_COLLECTION': 'email_outbox',
+    'IDEMPOTENCY_COLLECTION': 'idempotency_key',
+}
+
+
+def _collection_name(setting, collection_names):
+    return collection_names.get(setting) or config(setting, default=DEFAULT_COLLECTION_NAMES.get(setting))
+
+# Options that make two indexes with the same keys different
+_COMPARED_OPTIONS = ('unique', 'sparse', 'partialFilterExpression', 'expireAfterSeconds')
+
+
+def _index_spec(document):
+    return (
+        list(document['key'].items()),
+        {option: document[option] for option in _COMPARED_OPTIONS if option in document}
+    )
+
+
+def _declared_spec(index_model):
+    document = dict(index_model.document)
+    document['key'] = dict(document['key'])
+    return _index_spec(document)
+
+
+def reconcile_collection(collection, declared, prune=False, dry_run=False):
+    """Bring the indexes of one collection in line with the declared ones
+
+    Returns the list of actions as (action, index_name) tuples
+    """
+    actions = []
+    existing = {index['name']: index for index in collection.list_indexes()}
+    declared_names = set()
+
+    to_create = []
+    for index_model in declared:
+        name = index_model.document['name']
+        declared_names.add(name)
+        current = existing.get(name)
+        if current is None:
+            to_create.append(index_model)
+            actions.append(('create', name))
+        elif _index_spec(current) != _declared_spec(index_model):
+            if not dry_run:
+                collection.drop_index(name)
+            to_create.append(index_model)
+            actions.append(('rebuild', name))
+
+    if prune:
+        for name in existing:
+            if name != '_id_' and name not in declared_names:
+                if not dry_run:
+                    collection.drop_index(name)
+                actions.append(('drop', name))
+
+    if to_create and not dry_run:
+        collection.create_indexes(to_create)
+    return actions
+
+
+def ensure_indexes(database=None, collection_names=None, prune=False, dry_run=False):
+    """Reconcile every declared collection
+
+    database -- pymongo Database, defaults to the configured one
+    collection_names -- optional mapping setting name -> collection name
+    """
+    database = database if database is not None else get_database()
+    collection_names = collection_names or {}
+    report = {}
+    for setting, declared in INDEXES.items():
+        collection_name = _collection_name(setting, collection_names)
+        actions = reconcile_collection(database[collection_name], declared, prune=prune, dry_run=dry_run)
+        for action, name in actions:
+            logging.info(f"Index {action}{' (dry run)' if dry_run else ''}: {collection_name}.{name}")
+        report[collection_name] = actions
+    return report
+
+
+def drop_declared_indexes(database=None, collection_names=None):
+    """Drop the declared indexes, used to measure lookups without them"""
+    database = database if database is not None else get_database()
+    collection_names = collection_names or {}
+    for setting, declared in INDEXES.items():
+        collection = database[_collection_name(setting, collection_names)]
+        existing = {index['name'] for index in collection.list_indexes()}
+        for index_model in declared:
+            name = index_model.document['name']
+            if name in existing:
+                collection.drop_index(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create or reconcile the indexes of the security service collections')
+    parser.add_argument('--dry-run', action='store_true', help='Only report the changes')
+    parser.add_argument('--prune', action='store_true', help='Drop indexes that are not declared')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = ensure_indexes(prune=args.prune, dry_run=args.dry_run)
+    if not any(report.values()):
+        logging.info('Indexes are up to date')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,203 @@
 from pymongo import MongoClient
+from pymongo import monitoring
 from decouple import config
 import logging
+import os
+import threading
 from bson.objectid import ObjectId
+from utils.settings import get_settings
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Keep running counters of the connection pool events of the shared client
+
+    The counters are per process, so every gunicorn worker reports its own
+    pool. Multiply `open` by the number of workers to size against the
+    Mongo connection limit.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.pools = 0
+            self.open = 0
+            self.checked_out = 0
+            self.created = 0
+            self.closed = 0
+            self.check_out_failed = 0
+            self.cleared = 0
+
+    def _incr(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pools': self.pools,
+                'open': self.open,
+                'in_use': self.checked_out,
+                'idle': self.open - self.checked_out,
+                'created': self.created,
+                'closed': self.closed,
+                'check_out_failed': self.check_out_failed,
+                'cleared': self.cleared
+            }
+
+    def pool_created(self, event):
+        self._incr(pools=1)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._incr(cleared=1)
+
+    def pool_closed(self, event):
+        self._incr(pools=-1)
+
+    def connection_created(self, event):
+        self._incr(open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incr(open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._incr(check_out_failed=1)
+
+    def connection_checked_out(self, event):
+        self._incr(checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._incr(checked_out=-1)
+
+
+_client = None
+_client_pid = None
+_client_url = None
+_client_lock = threading.Lock()
+_pool_stats = PoolStatsListener()
+
+
+def get_client():
+    """Return the process-wide MongoClient, creating it on first use
+
+    The client is bound to the process that created it. A forked child
+    (gunicorn worker) never reuses the parent's sockets or monitor threads,
+    it builds its own client on first access instead. A MONGO_URL changed
+    by a settings reload gets a new client and the previous one is closed.
+    """
+    global _client, _client_pid, _client_url
+    pid = os.getpid()
+    url = get_settings().mongo_url
+    if _client is not None and _client_pid == pid and _client_url == url:
+        return _client
+    with _client_lock:
+        if _client is not None and _client_pid == pid and _client_url != url:
+            logging.info("MONGO_URL changed, closing the shared MongoClient")
+            _client.close()
+            _client = None
+        if _client is None or _client_pid != pid:
+            _pool_stats.reset()
+            _client = MongoClient(
+                url,
+                maxPoolSize=config("MONGO_MAX_POOL_SIZE", default=50, cast=int),
+                minPoolSize=config("MONGO_MIN_POOL_SIZE", default=0, cast=int),
+                maxIdleTimeMS=config("MONGO_MAX_IDLE_TIME_MS", default=60000, cast=int),
+                serverSelectionTimeoutMS=config("MONGO_SERVER_SELECTION_TIMEOUT_MS", default=5000, cast=int),
+                event_listeners=[_pool_stats],
+                connect=False
+            )
+            _client_pid = pid
+            _client_url = url
+    return _client
+
+
+def get_database():
+    return get_client()[get_settings().mongo_db]
+
+
+def run_in_transaction(callback):
+    """Run callback(session) in a transaction when MONGO_USE_TRANSACTIONS is set
+
+    Transactions need a replica set, on a standalone server the callback
+    runs with session None and its writes are applied one by one.
+    """
+    if not get_settings().mongo_use_transactions:
+        return callback(None)
+    with get_client().start_session() as session:
+        return session.with_transaction(callback)
+
+
+def close_client():
+    """Close the shared client of this process, the next access creates a new one"""
+    global _client, _client_pid, _client_url
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+        _client_url = None
+        _pool_stats.reset()
+
+
+def _reset_after_fork():
+    # The inherited client belongs to the parent, drop the reference without closing it
+    global _client, _client_pid, _client_url, _client_lock
+    _client = None
+    _client_pid = None
+    _client_url = None
+    _client_lock = threading.Lock()
+    _pool_stats._lock = threading.Lock()
+    _pool_stats.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def pool_stats():
+    """Connection pool statistics of the shared client in this process"""
+    stats = _pool_stats.snapshot()
+    stats['pid'] = os.getpid()
+    stats['max_pool_size'] = config("MONGO_MAX_POOL_SIZE", default=50, cast=int)
+    stats['min_pool_size'] = config("MONGO_MIN_POOL_SIZE", default=0, cast=int)
+    return stats
+
+
+def keyset_query(query, after=None):
+    """`query` restricted to the documents past the _id `after`, the next keyset page in _id order"""
+    if after is None:
+        return query
+    return {'$and': [query, {'_id': {'$gt': after}}]}
 
 
 class Connection:
 
     def __init__(self, collection_name):
-        self.collection = None
-        self.db = None
+        self.collection_name = None
         self.connect(collection_name)
 
     def connect(self, collection_name):
-        uri = config("MONGO_URL")
-        db = config("MONGO_DB")
-        self.collection = MongoClient(uri)[db][collection_name]
+        # Only the name is kept, the collection is resolved against the shared client and MONGO_DB on access
+        self.collection_name = collection_name
+
+    @property
+    def db(self):
+        return get_settings().mongo_db
+
+    @property
+    def collection(self):
+        return get_database()[self.collection_name]
 
     def get_all_data(self):
         try:
@@ -23,21 +206,40 @@ class Connection:
             return e
         return result
     
-    def find_one(self, name):
+    def find_one(self, name, projection=None):
         try:
-            result = self.collection.find_one(name)
+            result = self.collection.find_one(name, projection)
             return result
         except Exception as e:
             logging.exception(e)
             return str(e)
         
-    def get_by_query(self, query):
+    def get_by_query(self, query, projection=None):
         try:
-            result = self.collection.find(query)
+            result = self.collection.find(query, projection)
         except Exception as e:
             return e
         return result
 
+    def find_page(self, query, projection=None, after=None, limit=50):
+        """Up to `limit` documents of the query in _id order, those past the _id `after`
+
+        Keyset pagination, a page costs the same however deep it is. The
+        projection must keep _id, the last one is the cursor of the next page.
+        """
+        return list(self.collection.find(keyset_query(query, after), projection).sort('_id', 1).limit(limit))
+
+    def iter_batches(self, query, projection=None, batch_size=1000):
+        """Every document of the query as lists of at most `batch_size`, one find_page per list"""
+        after = None
+        while True:
+            page = self.find_page(query, projection, after, batch_size)
+            if page:
+                yield page
+            if len(page) < batch_size:
+                return
+            after = page[-1]['_id']
+
     def get_by_id(self, id):
         try:
             result = self.collection.find_one({"_id": ObjectId(id)})
@@ -45,11 +247,13 @@ class Connection:
             return e
         return result
 
-    def create_data(self, data):
+    def create_data(self, data, session=None):
         try:
-            return self.collection.insert_one(data)
+            return self.collection.insert_one(data, session=session)
         except Exception as e:
-            return e
+            # Raised as it is, a returned error looks like a result and hides the labels of transaction errors
+            logging.exception(e)
+            raise
         
     def update_by_id(self, id, new_data):
         try:
@@ -59,9 +263,9 @@ class Connection:
             logging.exception("Error updating data by id: %s", str(e))
             return False
 
-    def update_by_condition(self, condition, new_data):
+    def update_by_condition(self, condition, new_data, session=None):
         try:
-            return self.collection.update_one(condition, {"$set": new_data})
+            return self.collection.update_one(condition, {"$set": new_data}, session=session)
         except Exception as e:
             logging.exception(e)
             raise e
@@ -84,9 +288,10 @@ class Connection:
         except Exception as e:
             return e
     
-    def find_by_email(self, email):
+    def find_by_email(self, email, projection=None):
+        # projection limits the returned fields, e.g. {'status': 1, '_id': 0}
         try:
-            return self.collection.find_one({'email': email})
+            return self.collection.find_one({'email': email}, projection)
         except Exception as e:
             logging.error(f"Database error in find_by_email: {str(e)}", exc_info=True)
             raise
@@ -0,0 +1,132 @@
+"""
+Sends the emails queued in the outbox (EMAIL_DELIVERY=outbox)
+
+Runs apart from the API workers and any number of instances can run at
+once, each email is claimed by a single dispatcher under a lease. An email
+whose dispatcher died is claimed again once its lease expires.
+
+Usage from the repository root:
+    python email_dispatcher.py [--once]
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import time
+import uuid
+from decouple import config
+from models.email_outbox.outbox import EmailOutbox
+from utils.email_manager import EMAIL_BUILDERS, is_transient_error, mail_delivery_from_settings, use_sender
+from utils.settings import install_reload_signal, on_reload
+
+
+class Dispatcher:
+    def __init__(self, batch_size=20, lease_seconds=60, poll_interval=1.0, max_attempts=5, backoff=1.0, max_idle=60):
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_idle = max_idle
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.delivery = mail_delivery_from_settings(workers=0)
+        self.stats = {'sent': 0, 'retried': 0, 'failed': 0, 'released': 0, 'lost_lease': 0}
+        self._server = None
+        self._last_send = 0
+        self._stopping = False
+
+    def stop(self, *args):
+        self._stopping = True
+
+    def _settle(self, settled):
+        if not settled:
+            # Another dispatcher claimed it after our lease ran out
+            logging.warning('Lease lost while sending, the email may be sent twice')
+            self.stats['lost_lease'] += 1
+
+    def _send(self, email):
+        try:
+            message = EMAIL_BUILDERS[email['kind']](email['recipient'], EmailOutbox.fields(email))
+        except Exception as ex:
+            logging.error(f"Outbox email {email['_id']} can't be built: {ex}")
+            self._settle(EmailOutbox.mark_failed(email, self.worker_id, ex))
+            self.stats['failed'] += 1
+            return
+        self._server, error = self.delivery.send_now(self._server, email['recipient'], message)
+        self._last_send = time.monotonic()
+        if error is None:
+            self._settle(EmailOutbox.mark_sent(email, self.worker_id))
+            self.stats['sent'] += 1
+        elif is_transient_error(error) and email['attempts'] < self.max_attempts:
+            delay = self.backoff * 2 ** (email['attempts'] - 1)
+            logging.warning(f"Email to {email['recipient']} failed ({error}), retry in {delay}s")
+            self._settle(EmailOutbox.mark_retry(email, self.worker_id, error, delay))
+            self.stats['retried'] += 1
+        else:
+            logging.error(f"Error: unable to send email to {email['recipient']}: {error}")
+            self._settle(EmailOutbox.mark_failed(email, self.worker_id, error))
+            self.stats['failed'] += 1
+
+    def run_once(self):
+        """Claim and send one batch, return how many emails were claimed"""
+        batch = EmailOutbox.claim(self.worker_id, self.batch_size, self.lease_seconds)
+        claimed_at = time.monotonic()
+        for position, email in enumerate(batch):
+            if self._stopping or time.monotonic() - claimed_at > self.lease_seconds * 0.8:
+                # Hand the rest back before the lease runs out so nobody sends them twice
+                for rest in batch[position:]:
+                    EmailOutbox.release(rest, self.worker_id)
+                    self.stats['released'] += 1
+                break
+            self._send(email)
+        return len(batch)
+
+    def _close_idle_connection(self):
+        if self._server is not None and time.monotonic() - self._last_send > self.max_idle:
+            self.delivery.close_connection(self._server)
+            self._server = None
+
+    def run(self):
+        logging.info(f"Email dispatcher {self.worker_id} started")
+        while not self._stopping:
+            try:
+                claimed = self.run_once()
+            except Exception as ex:
+                logging.error(f"Email dispatch failed: {ex}")
+                claimed = 0
+            if not claimed:
+                self._close_idle_connection()
+                time.sleep(self.poll_interval)
+        if self._server is not None:
+            self.delivery.close_connection(self._server)
+        logging.info(f"Email dispatcher {self.worker_id} stopped: {self.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Send the emails waiting in the outbox')
+    parser.add_argument('--once', action='store_true', help='Send one batch and exit')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    dispatcher = Dispatcher(
+        batch_size=config('EMAIL_OUTBOX_BATCH_SIZE', default=20, cast=int),
+        lease_seconds=config('EMAIL_OUTBOX_LEASE_S', default=60, cast=int),
+        poll_interval=config('EMAIL_OUTBOX_POLL_INTERVAL_S', default=1.0, cast=float),
+        max_attempts=config('EMAIL_MAX_ATTEMPTS', default=5, cast=int),
+        backoff=config('EMAIL_RETRY_BACKOFF_S', default=1.0, cast=float),
+        max_idle=config('SMTP_MAX_IDLE_S', default=60, cast=float)
+    )
+    if args.once:
+        dispatcher.run_once()
+        return
+    signal.signal(signal.SIGTERM, dispatcher.stop)
+    signal.signal(signal.SIGINT, dispatcher.stop)
+    # SIGHUP picks up rotated SMTP credentials without stopping the dispatcher
+    on_reload(lambda settings: use_sender(dispatcher.delivery, settings))
+    install_reload_signal()
+    dispatcher.run()
+
+
+if __name__ == '__main__':
+    main()
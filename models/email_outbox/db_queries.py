@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+from db.mongo_client import Connection
+from decouple import config
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+__dbmanager__ = Connection(config('EMAIL_OUTBOX_COLLECTION', default='email_outbox'))
+
+def db_insert_outbox_email(document, session=None):
+    try:
+        return __dbmanager__.collection.insert_one(document, session=session).inserted_id
+    except Exception as e:
+        if session is not None and isinstance(e, PyMongoError):
+            # Inside a transaction, with_transaction retries on the labels of the original error
+            raise
+        raise RuntimeError(f'Error al guardar el correo en el outbox: {str(e)}')
+
+def db_insert_outbox_emails(documents):
+    try:
+        return __dbmanager__.collection.insert_many(documents, ordered=False).inserted_ids
+    except Exception as e:
+        raise RuntimeError(f'Error al guardar los correos en el outbox: {str(e)}')
+
+def db_claim_outbox_email(worker_id, lease_seconds):
+    # Pending emails that are due, or emails whose sender lost its lease
+    now = datetime.utcnow()
+    try:
+        return __dbmanager__.collection.find_one_and_update(
+            {'$or': [
+                {'status': 'pending', 'next_attempt_at': {'$lte': now}},
+                {'status': 'sending', 'lease_until': {'$lt': now}}
+            ]},
+            {
+                '$set': {'status': 'sending', 'claimed_by': worker_id, 'lease_until': now + timedelta(seconds=lease_seconds)},
+                '$inc': {'attempts': 1}
+            },
+            sort=[('next_attempt_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+    except Exception as e:
+        raise RuntimeError(f'Error al reclamar correos del outbox: {str(e)}')
+
+def db_finish_outbox_email(email_id, worker_id, update):
+    # Only the current lease holder may settle the email
+    try:
+        result = __dbmanager__.collection.update_one(
+            {'_id': email_id, 'status': 'sending', 'claimed_by': worker_id},
+            {'$set': update, '$unset': {'lease_until': '', 'claimed_by': ''}}
+        )
+        return result.matched_count > 0
+    except Exception as e:
+        raise RuntimeError(f'Error al actualizar el correo del outbox: {str(e)}')
+
+def db_outbox_counts():
+    try:
+        return {row['_id']: row['count'] for row in __dbmanager__.collection.aggregate([
+            {'$group': {'_id': '$status', 'count': {'$sum': 1}}}
+        ])}
+    except Exception as e:
+        raise RuntimeError(f'Error al contar los correos del outbox: {str(e)}')
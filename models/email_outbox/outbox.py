@@ -0,0 +1,80 @@
+import json
+from datetime import datetime, timedelta
+from models.email_outbox.db_queries import (
+    db_insert_outbox_email, db_insert_outbox_emails, db_claim_outbox_email, db_finish_outbox_email, db_outbox_counts
+)
+from utils.encryption_utils import EncryptionUtil
+
+
+class EmailOutbox:
+    """Emails waiting in Mongo for the dispatcher
+
+    The message fields are stored encrypted because they can hold a
+    temporary password. An email is 'pending' until a dispatcher claims it,
+    'sending' while the dispatcher holds its lease, and ends 'sent' or
+    'failed'. An email whose lease expired is claimed again.
+    """
+
+    @staticmethod
+    def document(kind, recipient, fields):
+        now = datetime.utcnow()
+        return {
+            'kind': kind,
+            'recipient': recipient,
+            'payload': EncryptionUtil().encrypt(json.dumps(fields)),
+            'status': 'pending',
+            'attempts': 0,
+            'created_at': now,
+            'next_attempt_at': now
+        }
+
+    @staticmethod
+    def add(kind, recipient, fields, session=None):
+        return db_insert_outbox_email(EmailOutbox.document(kind, recipient, fields), session=session)
+
+    @staticmethod
+    def add_many(kind, recipients_fields):
+        """Store a batch of (recipient, fields) in one insert"""
+        return db_insert_outbox_emails([EmailOutbox.document(kind, recipient, fields) for recipient, fields in recipients_fields])
+
+    @staticmethod
+    def claim(worker_id, batch_size, lease_seconds):
+        # One atomic claim per email so concurrent dispatchers never share one
+        batch = []
+        while len(batch) < batch_size:
+            email = db_claim_outbox_email(worker_id, lease_seconds)
+            if email is None:
+                break
+            batch.append(email)
+        return batch
+
+    @staticmethod
+    def fields(email):
+        return json.loads(EncryptionUtil().decrypt(email['payload']))
+
+    @staticmethod
+    def mark_sent(email, worker_id):
+        return db_finish_outbox_email(email['_id'], worker_id, {'status': 'sent', 'sent_at': datetime.utcnow()})
+
+    @staticmethod
+    def mark_retry(email, worker_id, error, delay):
+        return db_finish_outbox_email(email['_id'], worker_id, {
+            'status': 'pending',
+            'next_attempt_at': datetime.utcnow() + timedelta(seconds=delay),
+            'last_error': str(error)
+        })
+
+    @staticmethod
+    def mark_failed(email, worker_id, error):
+        return db_finish_outbox_email(email['_id'], worker_id, {
+            'status': 'failed', 'failed_at': datetime.utcnow(), 'last_error': str(error)
+        })
+
+    @staticmethod
+    def release(email, worker_id):
+        # Hand an unsent email back without counting the attempt
+        return db_finish_outbox_email(email['_id'], worker_id, {'status': 'pending', 'attempts': email['attempts'] - 1})
+
+    @staticmethod
+    def counts():
+        return db_outbox_counts()
@@ -0,0 +1,37 @@
+from datetime import datetime
+from db.mongo_client import Connection
+from decouple import config
+from pymongo.errors import DuplicateKeyError
+
+__dbmanager__ = Connection(config('IDEMPOTENCY_COLLECTION', default='idempotency_key'))
+
+def db_claim_idempotency_key(document):
+    """None when the key was claimed, otherwise the record that holds it"""
+    try:
+        __dbmanager__.collection.insert_one(document)
+        return None
+    except DuplicateKeyError:
+        pass
+    try:
+        # A pending record whose lease ran out belongs to a request that died, take it over
+        result = __dbmanager__.collection.update_one(
+            {'_id': document['_id'], 'status': 'pending', 'expires_at': {'$lte': datetime.utcnow()}},
+            {'$set': document}
+        )
+        if result.matched_count:
+            return None
+        return __dbmanager__.collection.find_one({'_id': document['_id']}) or document
+    except Exception as e:
+        raise RuntimeError(f'Error al reservar la clave de idempotencia: {str(e)}')
+
+def db_finish_idempotency_key(key_id, fields):
+    try:
+        __dbmanager__.collection.update_one({'_id': key_id, 'status': 'pending'}, {'$set': fields})
+    except Exception as e:
+        raise RuntimeError(f'Error al guardar el resultado de la clave de idempotencia: {str(e)}')
+
+def db_release_idempotency_key(key_id):
+    try:
+        __dbmanager__.collection.delete_one({'_id': key_id, 'status': 'pending'})
+    except Exception as e:
+        raise RuntimeError(f'Error al liberar la clave de idempotencia: {str(e)}')
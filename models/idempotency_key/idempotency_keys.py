@@ -0,0 +1,131 @@
+import hashlib
+from datetime import datetime, timedelta
+from decouple import config
+from models.idempotency_key.db_queries import (
+    db_claim_idempotency_key, db_finish_idempotency_key, db_release_idempotency_key
+)
+from utils.message_codes import INVALID_IDEMPOTENCY_KEY, IDEMPOTENCY_KEY_REUSED, IDEMPOTENCY_KEY_IN_PROGRESS
+from utils.server_response import ServerResponse, StatusCode
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+_MAX_KEY_LENGTH = 255
+
+
+def _digest(*parts):
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+
+class IdempotencyKeys:
+    """Stored results of requests sent with an Idempotency-Key header
+
+    The first request with a key claims it with a pending record that lasts
+    `lease` seconds, runs, and stores its response for `ttl` seconds. A
+    retry with the same key gets the stored response back without running
+    again, or a 409 while the first one is still running. Reusing a key for
+    a different body is rejected. Server errors are not stored, the key is
+    released so a retry runs again.
+
+    Records are keyed by the endpoint, the key and the account it acts on,
+    so clients picking the same key don't meet. The fingerprint of a body
+    leaves out the password, no fast hash of it is ever stored. A TTL index
+    on expires_at removes the records.
+    """
+    def __init__(self, ttl=86400, lease=60):
+        self.ttl = ttl
+        self.lease = lease
+
+    @staticmethod
+    def key_id(scope, key, account):
+        return _digest(scope, account.lower(), key)
+
+    @staticmethod
+    def fingerprint(*values):
+        return _digest(*(str(value) for value in values))
+
+    @staticmethod
+    def invalid_key(key):
+        """Error response for a malformed key, None when it is usable"""
+        if 0 < len(key) <= _MAX_KEY_LENGTH and key.isprintable():
+            return None
+        return ServerResponse(
+            message=f"The {IDEMPOTENCY_HEADER} header must be 1 to {_MAX_KEY_LENGTH} printable characters",
+            message_code=INVALID_IDEMPOTENCY_KEY,
+            status=StatusCode.BAD_REQUEST
+        )
+
+    def pending_document(self, key_id, fingerprint):
+        return {
+            '_id': key_id,
+            'fingerprint': fingerprint,
+            'status': 'pending',
+            'expires_at': datetime.utcnow() + timedelta(seconds=self.lease)
+        }
+
+    @staticmethod
+    def answer(record, fingerprint):
+        """Response to a request whose key is held by `record`"""
+        if record['fingerprint'] != fingerprint:
+            return ServerResponse(
+                message=f"The {IDEMPOTENCY_HEADER} was already used with a different request",
+                message_code=IDEMPOTENCY_KEY_REUSED,
+                status=StatusCode.UNPROCESSABLE_ENTITY
+            )
+        if record['status'] == 'pending':
+            return ServerResponse(
+                message="A request with this key is still being processed",
+                message_code=IDEMPOTENCY_KEY_IN_PROGRESS,
+                status=StatusCode.CONFLICT,
+                headers={'Retry-After': '1'}
+            )
+        stored = record['response']
+        return ServerResponse(
+            data=stored['data'],
+            message=stored['message'],
+            message_code=stored['message_code'],
+            status=stored['status'],
+            headers={'Idempotent-Replayed': 'true'}
+        )
+
+    def done_fields(self, response):
+        """Fields that store `response`, None when it must not be replayed"""
+        if response.status >= 500 or response.status == StatusCode.TOO_MANY_REQUESTS:
+            return None
+        return {
+            'status': 'done',
+            'response': {
+                'data': response.data,
+                'message': response.message,
+                'message_code': response.message_code,
+                'status': response.status
+            },
+            'expires_at': datetime.utcnow() + timedelta(seconds=self.ttl)
+        }
+
+    def begin(self, scope, key, account, fingerprint):
+        """(key id, None) when the request should run, (None, response) when it is answered already"""
+        error = self.invalid_key(key)
+        if error:
+            return None, error
+        key_id = self.key_id(scope, key, account)
+        record = db_claim_idempotency_key(self.pending_document(key_id, fingerprint))
+        if record is None:
+            return key_id, None
+        return None, self.answer(record, fingerprint)
+
+    def finish(self, key_id, response):
+        """Store the response of a claimed key, or release the key"""
+        fields = self.done_fields(response)
+        if fields is None:
+            db_release_idempotency_key(key_id)
+        else:
+            db_finish_idempotency_key(key_id, fields)
+
+
+_keys = IdempotencyKeys(
+    ttl=config('IDEMPOTENCY_TTL', default=86400, cast=int),
+    lease=config('IDEMPOTENCY_LEASE', default=60, cast=int)
+)
+
+
+def get_idempotency_keys():
+    return _keys
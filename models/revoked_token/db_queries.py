@@ -0,0 +1,25 @@
+from datetime import datetime
+from db.mongo_client import Connection
+from decouple import config
+
+__dbmanager__ = Connection(config('REVOKED_TOKEN_COLLECTION', default='revoked_token'))
+
+def db_revoke_token(jti, expires_at):
+    # The TTL index on expires_at removes the record once the token could not be used anyway
+    try:
+        __dbmanager__.collection.update_one(
+            {'_id': jti},
+            {'$setOnInsert': {'expires_at': expires_at, 'revoked_at': datetime.utcnow()}},
+            upsert=True
+        )
+    except Exception as e:
+        raise RuntimeError(f'Error al revocar el token: {str(e)}')
+
+def db_find_revoked_tokens(since=None):
+    try:
+        query = {'expires_at': {'$gt': datetime.utcnow()}}
+        if since is not None:
+            query['revoked_at'] = {'$gte': since}
+        return list(__dbmanager__.collection.find(query, {'expires_at': 1, 'revoked_at': 1}))
+    except Exception as e:
+        raise RuntimeError(f'Error al buscar los tokens revocados: {str(e)}')
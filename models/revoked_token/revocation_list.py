@@ -0,0 +1,146 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from decouple import config
+from models.revoked_token.db_queries import db_revoke_token, db_find_revoked_tokens
+from utils.bloom_filter import BloomFilter
+
+
+def _epoch(value):
+    # Mongo returns naive UTC datetimes
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class RevocationList:
+    """In-memory copy of the revoked token ids
+
+    A Bloom filter answers the common case, a token that was never revoked,
+    and the exact map of jti to expiry confirms the rest, so a check never
+    queries Mongo. A background thread pulls the ids revoked since its last
+    run every `sync_interval` seconds and rebuilds everything every
+    `full_sync_interval` seconds, which drops the expired ids from memory.
+    The records themselves are removed by the TTL index on expires_at.
+    """
+    def __init__(self, sync_interval=2, full_sync_interval=300, capacity=100000, error_rate=0.001, overlap=10):
+        self.sync_interval = sync_interval
+        self.full_sync_interval = full_sync_interval
+        self.capacity = capacity
+        self.error_rate = error_rate
+        # Re-read a window before the last sync to tolerate clock skew between instances
+        self.overlap = timedelta(seconds=overlap)
+        self._exact = {}
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._synced_at = None
+        self._full_synced_at = 0
+        self._load_attempted = False
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._thread_pid = None
+
+    def _after_fork(self):
+        # The sync thread of the parent may have held these when it forked
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def _add(self, jti, expires_at):
+        with self._lock:
+            if jti not in self._exact:
+                self._bloom.add(jti)
+            self._exact[jti] = expires_at
+
+    def load(self):
+        started = datetime.utcnow()
+        records = db_find_revoked_tokens()
+        exact = {record['_id']: _epoch(record['expires_at']) for record in records}
+        bloom = BloomFilter(max(self.capacity, 2 * len(exact)), self.error_rate)
+        for jti in exact:
+            bloom.add(jti)
+        with self._lock:
+            self._exact = exact
+            self._bloom = bloom
+            self._synced_at = started
+            self._full_synced_at = time.monotonic()
+        self._load_attempted = True
+        logging.info(f"Revocation list loaded with {len(exact)} tokens")
+
+    def sync(self):
+        if self._synced_at is None or time.monotonic() - self._full_synced_at >= self.full_sync_interval:
+            self.load()
+            return
+        started = datetime.utcnow()
+        for record in db_find_revoked_tokens(since=self._synced_at - self.overlap):
+            self._add(record['_id'], _epoch(record['expires_at']))
+        self._synced_at = started
+
+    def _run(self):
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                self.sync()
+            except Exception as ex:
+                # Keep the last list, the next run tries again
+                logging.warning(f"Revocation list sync failed: {ex}")
+
+    def start(self):
+        """Start the sync thread of this process, a forked worker gets its own"""
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            threading.Thread(target=self._run, name='revocation-list', daemon=True).start()
+            self._thread_pid = os.getpid()
+
+    def _ensure_ready(self):
+        self.start()
+        if not self._load_attempted:
+            with self._load_lock:
+                if not self._load_attempted:
+                    try:
+                        self.load()
+                    except Exception as ex:
+                        logging.error(f"Could not load the revocation list, the sync thread retries: {ex}")
+                    self._load_attempted = True
+
+    def is_revoked(self, jti):
+        self._ensure_ready()
+        if jti not in self._bloom:
+            return False
+        expires_at = self._exact.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+    def revoke(self, jti, expires_at):
+        """Revoke a token id until `expires_at` (epoch seconds), visible here at once"""
+        db_revoke_token(jti, datetime.utcfromtimestamp(expires_at))
+        self.remember(jti, expires_at)
+
+    def remember(self, jti, expires_at):
+        """Add an id already stored by the caller, e.g. through the async driver"""
+        self._add(jti, expires_at)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'revoked': len(self._exact),
+                'filter_bits': self._bloom.size,
+                'filter_hashes': self._bloom.hash_count,
+                'last_sync': self._synced_at.isoformat() if self._synced_at else None
+            }
+
+
+_revocation_list = RevocationList(
+    sync_interval=config('REVOCATION_SYNC_INTERVAL', default=2, cast=float),
+    full_sync_interval=config('REVOCATION_FULL_SYNC_INTERVAL', default=300, cast=int),
+    capacity=config('REVOCATION_FILTER_CAPACITY', default=100000, cast=int),
+    error_rate=config('REVOCATION_FILTER_ERROR_RATE', default=0.001, cast=float)
+)
+
+
+def get_revocation_list():
+    return _revocation_list
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_revocation_list._after_fork)
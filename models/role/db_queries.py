@@ -21,3 +21,21 @@ def db_find_active_and_default_roles():
         return roles_list, default_role
     except Exception as e:
         raise RuntimeError(f'Error al buscar roles activos y predeterminados: {str(e)}')
+
+def db_find_roles_permissions():
+    try:
+        return list(__dbmanager__.collection.find({}, {'name': 1, 'permissions': 1, 'is_active': 1}))
+    except Exception as e:
+        raise RuntimeError(f'Error al buscar los permisos de los roles: {str(e)}')
+
+def db_roles_version():
+    # Cheap fingerprint of the collection, it changes when a role is added, removed or its mod_date moves
+    try:
+        result = list(__dbmanager__.collection.aggregate([
+            {'$group': {'_id': None, 'count': {'$sum': 1}, 'last_mod': {'$max': '$mod_date'}}}
+        ]))
+        if not result:
+            return (0, None)
+        return (result[0]['count'], result[0]['last_mod'])
+    except Exception as e:
+        raise RuntimeError(f'Error al obtener la version de los roles: {str(e)}')
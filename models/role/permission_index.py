@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+import time
+from decouple import config
+from models.role.db_queries import db_find_roles_permissions, db_roles_version
+from utils.message_codes import PERMISSIONS_UNAVAILABLE
+from utils.server_response import ServerResponse, StatusCode
+
+
+class PermissionIndexUnavailable(Exception):
+    """The index was never loaded and Mongo can't be reached to load it"""
+    def __init__(self, retry_after):
+        super().__init__("The permission index is not loaded")
+        self.retry_after = retry_after
+
+
+def _permission_name(permission):
+    # Permissions are stored as plain strings, older documents use {'name': ...}
+    if isinstance(permission, dict):
+        return permission.get('name') or permission.get('permission')
+    return permission
+
+
+def role_permissions(role):
+    """Permission names granted by a role document, inactive roles grant nothing"""
+    if not role.get('is_active', True):
+        return frozenset()
+    return frozenset(name for name in (_permission_name(p) for p in role.get('permissions') or []) if name)
+
+
+class PermissionIndex:
+    """In-memory map of role name to its permission set
+
+    Lookups never touch Mongo. A background thread compares the roles
+    version (count and last mod_date) every `check_interval` seconds and
+    rebuilds the map when it moved, plus a full rebuild every
+    `full_refresh_interval` seconds for edits that don't bump mod_date.
+    With a role snapshot attached lookups are answered from it, the index
+    is only loaded while the snapshot is unavailable.
+    """
+    def __init__(self, check_interval=10, full_refresh_interval=600):
+        self.check_interval = check_interval
+        self.full_refresh_interval = full_refresh_interval
+        self._roles = {}
+        self._version = None
+        self._loaded_at = 0
+        self._load_failed_at = None
+        self._loaded = threading.Event()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._snapshot = None
+
+    def use_snapshot(self, snapshot):
+        self._snapshot = snapshot
+
+    def load(self):
+        version = db_roles_version()
+        roles = {role['name']: role_permissions(role) for role in db_find_roles_permissions()}
+        with self._lock:
+            self._roles = roles
+            self._version = version
+            self._loaded_at = time.monotonic()
+        self._loaded.set()
+        logging.info(f"Permission index loaded with {len(roles)} roles")
+
+    def refresh_if_stale(self):
+        if time.monotonic() - self._loaded_at >= self.full_refresh_interval:
+            self.load()
+        elif db_roles_version() != self._version:
+            self.load()
+
+    def _run(self):
+        while True:
+            time.sleep(self.check_interval)
+            try:
+                self.refresh_if_stale()
+            except Exception as ex:
+                # Keep serving the last index, the next check tries again
+                logging.warning(f"Permission index refresh failed: {ex}")
+
+    def start(self):
+        """Start the refresher of this process, a forked worker gets its own"""
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self._run, name='permission-index', daemon=True)
+            self._thread.start()
+            self._thread_pid = os.getpid()
+
+    def _after_fork(self):
+        # A refresher thread of the parent may have held these when it forked
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        loaded = self._loaded.is_set()
+        self._loaded = threading.Event()
+        if loaded:
+            self._loaded.set()
+
+    def _ensure_ready(self):
+        self.start()
+        if not self._loaded.is_set():
+            # Only the very first lookups of a process without a preloaded index wait for Mongo
+            with self._load_lock:
+                if not self._loaded.is_set():
+                    self._first_load()
+
+    def _first_load(self):
+        """Load the index or raise PermissionIndexUnavailable
+
+        After a failure, lookups fail fast for `check_interval` seconds instead
+        of each waiting out the server selection timeout.
+        """
+        if self._load_failed_at is not None:
+            wait = self.check_interval - (time.monotonic() - self._load_failed_at)
+            if wait > 0:
+                raise PermissionIndexUnavailable(max(1, int(wait)))
+        try:
+            self.load()
+        except Exception as ex:
+            logging.error(f"Permission index load failed: {ex}")
+            self._load_failed_at = time.monotonic()
+            raise PermissionIndexUnavailable(max(1, self.check_interval)) from ex
+        self._load_failed_at = None
+
+    def permissions_of(self, role_name):
+        if self._snapshot is not None:
+            permissions = self._snapshot.permissions_of(role_name)
+            if permissions is not None:
+                return permissions
+        self._ensure_ready()
+        return self._roles.get(role_name, frozenset())
+
+    def has_permission(self, role_name, permission):
+        return permission in self.permissions_of(role_name)
+
+    def version(self):
+        return self._version
+
+
+_index = PermissionIndex(
+    check_interval=config('PERMISSION_INDEX_CHECK_INTERVAL', default=10, cast=int),
+    full_refresh_interval=config('PERMISSION_INDEX_FULL_REFRESH_INTERVAL', default=600, cast=int)
+)
+
+
+def get_permission_index():
+    return _index
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_index._after_fork)
+
+
+def unavailable_server_response(error):
+    """503 of the endpoints that check a permission while the index can't be loaded"""
+    return ServerResponse(
+        message="Permissions can't be checked right now, please retry later",
+        message_code=PERMISSIONS_UNAVAILABLE,
+        status=StatusCode.SERVICE_UNAVAILABLE,
+        headers={'Retry-After': str(error.retry_after)}
+    )
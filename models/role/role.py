@@ -1,61 +1,44 @@
 from models.role.db_queries import db_find_active_and_default_roles
 import logging
 from models.role.db_queries import __dbmanager__
+from models.role.role_cache import get_role_cache
+from models.role.role_snapshot import get_role_snapshot
+from utils.record import Record
+from utils.ttl_cache import MISSING
 
-class RoleModel:
-    def __init__(self, name, description, permissions, creation_date, mod_date, is_active, default_role, screens, app, _id=None):
-        self.name = name
-        self.description = description
-        self.permissions = permissions
-        self.creation_date = creation_date
-        self.mod_date = mod_date
-        self.is_active = is_active
-        self.default_role = default_role
-        self.screens = screens
-        self.app = app
-        self._id = _id
-        
-    def to_dict(self):
-        return {
-            "_id": self._id,
-            "name": self.name,
-            "description": self.description,
-            "permissions": self.permissions,
-            "creation_date": self.creation_date,
-            "mod_date": self.mod_date,
-            "is_active": self.is_active,
-            "default_role": self.default_role,
-            "screens": self.screens,
-            "app": self.app
-        }
+class RoleModel(Record):
+    __slots__ = ('_id', 'name', 'description', 'permissions', 'creation_date', 'mod_date', 'is_active',
+                 'default_role', 'screens', 'app')
 
     @classmethod
     def find_active_and_default_roles(cls):
         # Fetch active roles and the default role from the database
         try:
-            roles, default_role = db_find_active_and_default_roles()
+            snapshot = get_role_snapshot()
+            result = snapshot.find_active_and_default_roles() if snapshot else None
+            if result is None:
+                result = get_role_cache().get(('active_and_default',), db_find_active_and_default_roles)
+            roles, default_role = result
             return roles, default_role
         except Exception as e:
             raise Exception('Error finding active and default roles')
 
     @classmethod
-    def get_by_name(cls, name):
+    def get_by_name(cls, name, document=MISSING):
+        """document: the role already read by the caller (None when it doesn't exist), used on a cache miss"""
         try:
-            result = __dbmanager__.find_one({"name": name})
-            if result:
-                return cls(
-                    _id=result.get("_id"),
-                    name=result.get("name"),
-                    description=result.get("description"),
-                    permissions=result.get("permissions"),
-                    creation_date=result.get("creation_date"),
-                    mod_date=result.get("mod_date"),
-                    is_active=result.get("is_active"),
-                    default_role=result.get("default_role"),
-                    screens=result.get("screens"),
-                    app=result.get("app")
-                )
-            return None
+            snapshot = get_role_snapshot()
+            found, result = snapshot.find_role(name) if snapshot else (False, None)
+            if found:
+                return cls.from_document(result)
+            if document is not MISSING:
+                loader = lambda: cls.from_document(document)
+            else:
+                # Query the collection directly so a Mongo error is raised, not cached.
+                # Unknown names are cached as None too
+                loader = lambda: cls.from_document(__dbmanager__.collection.find_one({"name": name}))
+            # The cache keeps the read-only record itself
+            return get_role_cache().get(('name', name), loader)
         except Exception as ex:
             logging.exception(ex)
             raise Exception("Failed to get rol by name: " + str(ex))
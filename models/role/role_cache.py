@@ -0,0 +1,178 @@
+import logging
+import os
+import threading
+import time
+from decouple import config
+from models.role.db_queries import db_roles_version
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class RoleCache:
+    """Per-process cache of role documents
+
+    An entry is served while it is younger than `ttl` and the roles version
+    (count and last mod_date) has not moved. The version is checked at most
+    once every `version_check_interval` seconds. Concurrent misses of the
+    same key are coalesced into a single query, and when Mongo fails an entry
+    younger than `max_stale` seconds is served instead of the error. A version
+    change or an invalidation only marks entries expired, so they can still be
+    served stale. After a failed query Mongo is left alone for a backoff that
+    doubles up to `max_backoff` seconds, stale entries are served meanwhile
+    without waiting on the server selection timeout.
+    """
+    def __init__(self, ttl=300, version_check_interval=5, max_stale=3600, wait_timeout=10, max_backoff=60):
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self.max_stale = max_stale
+        self.wait_timeout = wait_timeout
+        self.max_backoff = max_backoff
+        # key: (value, loaded at, expired)
+        self._entries = {}
+        self._version = None
+        self._version_checked_at = 0
+        self._failures = 0
+        self._retry_at = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'loads': 0, 'coalesced': 0, 'stale_served': 0, 'version_checks': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _singleflight(self, key, fn):
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+        if not leader:
+            self._count('coalesced')
+            if not flight.event.wait(self.wait_timeout):
+                raise TimeoutError(f"Timed out waiting for the role query of {key!r}")
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = fn()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.event.set()
+        return flight.value
+
+    def _failed(self):
+        with self._lock:
+            self._failures += 1
+            backoff = min(self.version_check_interval * 2 ** (self._failures - 1), self.max_backoff)
+            now = time.monotonic()
+            self._retry_at = now + backoff
+            # The version isn't checked again before the backoff is over either
+            self._version_checked_at = now + backoff - self.version_check_interval
+
+    def _succeeded(self):
+        if self._failures:
+            with self._lock:
+                self._failures = 0
+                self._retry_at = 0
+
+    def _expire_all(self):
+        self._entries = {key: (value, loaded_at, True) for key, (value, loaded_at, _) in self._entries.items()}
+
+    def _check_version(self):
+        if time.monotonic() - self._version_checked_at < self.version_check_interval:
+            return
+        try:
+            version = self._singleflight('__version__', db_roles_version)
+        except Exception as ex:
+            logging.warning(f"Role version check failed: {ex}")
+            self._failed()
+            return
+        self._succeeded()
+        self._count('version_checks')
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    # Something changed in the roles collection, nothing is fresh anymore
+                    self._expire_all()
+                self._version = version
+            self._version_checked_at = time.monotonic()
+
+    def _stale(self, key, entry, ex):
+        if entry is not None and time.monotonic() - entry[1] < self.max_stale:
+            logging.warning(f"Serving stale role entry {key!r}: {ex}")
+            self._count('stale_served')
+            return True
+        return False
+
+    def get(self, key, loader):
+        self._check_version()
+        entry = self._entries.get(key)
+        if entry is not None and not entry[2] and time.monotonic() - entry[1] < self.ttl:
+            self._count('hits')
+            return entry[0]
+        self._count('misses')
+        if time.monotonic() < self._retry_at and self._stale(key, entry, "backing off after a failed query"):
+            return entry[0]
+
+        def load():
+            value = loader()
+            self._count('loads')
+            with self._lock:
+                self._entries[key] = (value, time.monotonic(), False)
+            return value
+
+        try:
+            value = self._singleflight(key, load)
+        except Exception as ex:
+            self._failed()
+            if self._stale(key, entry, ex):
+                return entry[0]
+            raise
+        self._succeeded()
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            # Kept expired, they can still be served stale
+            if key is None:
+                self._expire_all()
+            elif key in self._entries:
+                value, loaded_at, _ = self._entries[key]
+                self._entries[key] = (value, loaded_at, True)
+
+    def _after_fork(self):
+        # Threads of the parent may have held the lock or been running a query when it forked
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        return stats
+
+
+_cache = RoleCache(
+    ttl=config('ROLE_CACHE_TTL', default=300, cast=int),
+    version_check_interval=config('ROLE_CACHE_VERSION_CHECK_INTERVAL', default=5, cast=int),
+    max_stale=config('ROLE_CACHE_MAX_STALE', default=3600, cast=int),
+    max_backoff=config('ROLE_CACHE_MAX_BACKOFF', default=60, cast=int)
+)
+
+
+def get_role_cache():
+    return _cache
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_cache._after_fork)
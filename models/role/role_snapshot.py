@@ -0,0 +1,267 @@
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+import bson
+from decouple import config
+from models.role.db_queries import __dbmanager__, db_roles_version
+from models.role.permission_index import role_permissions
+
+# magic, snapshot version, published at (epoch), index length, body length, crc32 of index + body
+_HEADER = struct.Struct('<8sQdIII')
+_MAGIC = b'ROLESNP1'
+
+
+def _is_active_or_default(role):
+    # Same filter as db_find_active_and_default_roles
+    return role.get('is_active') is True and ('default_role' in role or role.get('default_role') is True)
+
+
+def build_snapshot(roles, version):
+    """Serialize role documents into the snapshot file layout
+
+    The index (JSON) holds, per role, the offset and length of its BSON
+    document in the body plus its permission names, so a lookup decodes a
+    single document straight from the mapping.
+    """
+    body = bytearray()
+    index = {'roles': {}, 'permissions': {}, 'active_and_default': [], 'default': None}
+    for role in roles:
+        name = role['name']
+        document = bson.encode(role)
+        index['roles'][name] = [len(body), len(document)]
+        index['permissions'][name] = sorted(role_permissions(role))
+        if _is_active_or_default(role):
+            index['active_and_default'].append(name)
+            if role.get('default_role'):
+                index['default'] = name
+        body += document
+    index = json.dumps(index, separators=(',', ':')).encode()
+    crc = zlib.crc32(body, zlib.crc32(index))
+    return _HEADER.pack(_MAGIC, version, time.time(), len(index), len(body), crc) + index + bytes(body)
+
+
+class _Mapping:
+    """One published snapshot, mapped read-only and never modified"""
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mm)
+        magic, self.version, self.published_at, index_len, body_len, crc = _HEADER.unpack_from(view)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a role snapshot")
+        index_end = _HEADER.size + index_len
+        if index_end + body_len != len(view):
+            raise ValueError(f"Role snapshot {path} is truncated")
+        if zlib.crc32(view[index_end:], zlib.crc32(view[_HEADER.size:index_end])) != crc:
+            raise ValueError(f"Role snapshot {path} failed its checksum")
+        index = json.loads(bytes(view[_HEADER.size:index_end]))
+        self._body = view[index_end:]
+        self._offsets = index['roles']
+        self.permissions = {name: frozenset(perms) for name, perms in index['permissions'].items()}
+        self.active_and_default = index['active_and_default']
+        self.default = index['default']
+
+    def find(self, name):
+        location = self._offsets.get(name)
+        if location is None:
+            return None
+        offset, length = location
+        return bson.decode(self._body[offset:offset + length])
+
+
+class RoleSnapshot:
+    """Roles shared by every worker of a host through a memory-mapped file
+
+    Readers map the file published at `path` and look roles up without
+    querying Mongo. They stat the file at most once every `check_interval`
+    seconds and swap to the new mapping when it was replaced. One process
+    of the host, whoever holds the flock on `path`.lock, publishes a new
+    file when the roles version changes and every `full_refresh_interval`
+    seconds. A snapshot older than `max_age` is ignored, callers then fall
+    back to their own cache.
+    """
+    def __init__(self, path, check_interval=1, publish_interval=5, full_refresh_interval=600, max_age=1800):
+        self.path = path
+        self.check_interval = check_interval
+        self.publish_interval = publish_interval
+        self.full_refresh_interval = full_refresh_interval
+        self.max_age = max_age
+        self._mapping = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._published_version = None
+        self._published_at = 0
+        self._thread = None
+        self._thread_pid = None
+
+    # Readers
+
+    def _current(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if now - self._checked_at >= self.check_interval:
+                    self._reload()
+                    self._checked_at = now
+        mapping = self._mapping
+        if mapping is None or time.time() - mapping.published_at > self.max_age:
+            return None
+        return mapping
+
+    def _reload(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        mapping = self._mapping
+        if mapping is not None and mapping.identity == (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+            return
+        try:
+            # Readers still holding the old mapping finish with it, it is unmapped once unreferenced
+            self._mapping = _Mapping(self.path)
+        except Exception as ex:
+            logging.warning(f"Could not map role snapshot {self.path}: {ex}")
+
+    def available(self):
+        return self._current() is not None
+
+    def version(self):
+        mapping = self._current()
+        return mapping.version if mapping else None
+
+    def find_role(self, name):
+        """Return (found, document), found is False when there is no usable snapshot"""
+        mapping = self._current()
+        if mapping is None:
+            return False, None
+        return True, mapping.find(name)
+
+    def find_active_and_default_roles(self):
+        """Return (roles, default_role) or None when there is no usable snapshot"""
+        mapping = self._current()
+        if mapping is None:
+            return None
+        roles = [mapping.find(name) for name in mapping.active_and_default]
+        default_role = mapping.find(mapping.default) if mapping.default else None
+        return roles, default_role
+
+    def permissions_of(self, role_name):
+        """Return the permission set of a role, None when there is no usable snapshot"""
+        mapping = self._current()
+        if mapping is None:
+            return None
+        return mapping.permissions.get(role_name, frozenset())
+
+    # Publisher
+
+    def publish(self):
+        """Write the roles collection to a new snapshot file and swap it in atomically"""
+        version = db_roles_version()
+        roles = list(__dbmanager__.collection.find({}))
+        with self._lock:
+            self._reload()
+        current = self._mapping
+        data = build_snapshot(roles, (current.version if current else 0) + 1)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.role-snapshot-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        self._published_version = version
+        self._published_at = time.monotonic()
+        with self._lock:
+            self._reload()
+        logging.info(f"Published role snapshot with {len(roles)} roles to {self.path}")
+
+    def _is_publisher(self):
+        if self._lock_file is not None:
+            return True
+        lock_file = open(self.path + '.lock', 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        # Held until the process exits, then another worker takes over
+        self._lock_file = lock_file
+        return True
+
+    def publish_if_stale(self):
+        if not self._is_publisher():
+            return
+        if (self._published_version is None
+                or time.monotonic() - self._published_at >= self.full_refresh_interval
+                or db_roles_version() != self._published_version):
+            self.publish()
+
+    def _run(self):
+        while True:
+            try:
+                self.publish_if_stale()
+            except Exception as ex:
+                logging.warning(f"Role snapshot publish failed: {ex}")
+            time.sleep(self.publish_interval)
+
+    def start(self):
+        """Start the publisher candidate of this process, a forked worker gets its own"""
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self._run, name='role-snapshot', daemon=True)
+            self._thread.start()
+            self._thread_pid = os.getpid()
+
+
+    def _after_fork(self):
+        # The parent's threads may have held the lock when it forked, and only the parent publishes:
+        # closing the inherited descriptor leaves its flock to the parent
+        self._lock = threading.Lock()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+_snapshot = None
+if config('ROLE_SNAPSHOT_ENABLED', default=False, cast=bool):
+    _snapshot = RoleSnapshot(
+        path=config('ROLE_SNAPSHOT_PATH', default=os.path.join(tempfile.gettempdir(), 'security-service-roles.snapshot')),
+        check_interval=config('ROLE_SNAPSHOT_CHECK_INTERVAL', default=1, cast=float),
+        publish_interval=config('ROLE_SNAPSHOT_PUBLISH_INTERVAL', default=5, cast=float),
+        full_refresh_interval=config('ROLE_SNAPSHOT_FULL_REFRESH_INTERVAL', default=600, cast=int),
+        max_age=config('ROLE_SNAPSHOT_MAX_AGE', default=1800, cast=int)
+    )
+
+
+def get_role_snapshot():
+    """The host-wide snapshot, None unless ROLE_SNAPSHOT_ENABLED"""
+    return _snapshot
+
+
+if _snapshot is not None and hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_snapshot._after_fork)
+
+
+if __name__ == '__main__':
+    # One-off publish, e.g. from a deploy hook before the workers start
+    if _snapshot is None:
+        sys.exit("ROLE_SNAPSHOT_ENABLED is not set")
+    _snapshot.publish()
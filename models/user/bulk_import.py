@@ -0,0 +1,394 @@
+"""
+Bulk import of users, e.g. the students of a new semester
+
+Rows are read as a stream, CSV with a name,email,password header or JSON
+lines with the same keys, and handled `batch_size` at a time so memory
+stays flat whatever the size of the file:
+    - every row goes through the /user/enrollment rules
+    - emails already registered are skipped before any KDF work
+    - the passwords of the batch are hashed on a process pool, the one
+      shared by the imports of the server or the pool of the command line
+    - the users are written with one unordered bulk_write of upserts, the
+      unique email index settles rows that race with an enrollment
+    - the verification emails are queued, one outbox insert per batch
+One result per row is yielded as soon as its batch is done.
+
+The server runs USER_IMPORT_CONCURRENCY imports per process at a time, a
+further one is refused with ImportBusy. A sync gunicorn worker is killed
+after SERVER_TIMEOUT seconds of a single request, so /user/import needs the
+gthread or gevent profile, large files are better imported from here.
+
+Usage from the repository root:
+    python -m models.user.bulk_import students.csv [--format jsonl] [--workers 4] [--dry-run]
+Prints one JSON result per row and a summary line.
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from decouple import config
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from models.role.role import RoleModel
+from models.user.db_queries import __dbmanager__
+from utils.email_manager import queue_emails
+from utils.enrollment_validator import enrollment_error
+from utils.message_codes import (
+    DUPLICATE_ROW, INVALID_FIELDS, USER_ALREADY_REGISTERED, USER_CREATION_ERROR, NO_ACTIVE_ROLES_FOUND, DEFAULT_ROLE_NOT_FOUND
+)
+from utils.password_hasher import hash_passwords
+from utils.server_response import encode
+
+FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+    'application/x-jsonlines': 'jsonl',
+}
+# Server error code of a unique index violation
+_DUPLICATE_KEY = 11000
+
+
+class ImportAborted(Exception):
+    """The import can't start, no row was written"""
+    def __init__(self, message, message_code):
+        super().__init__(message)
+        self.message_code = message_code
+
+
+class ImportTooLarge(Exception):
+    pass
+
+
+class ImportBusy(Exception):
+    """Every import slot of the process is taken"""
+    def __init__(self, message="Another import is running, please retry later", retry_after=60):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(config('USER_IMPORT_CONCURRENCY', default=1, cast=int), 1))
+
+
+def get_import_pool():
+    """Process pool hashing the passwords of the server imports, None when USER_IMPORT_WORKERS is 0
+
+    One pool per process, shared by the running imports, so concurrent
+    imports don't start processes of their own. It is separate from the
+    KDF executor, an import doesn't take the slots of login requests.
+    """
+    global _pool
+    workers = config('USER_IMPORT_WORKERS', default=2, cast=int)
+    if not workers:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context(config('KDF_EXECUTOR_START_METHOD', default='spawn'))
+                )
+    return _pool
+
+
+class ImportSlot:
+    """One of the USER_IMPORT_CONCURRENCY imports of the process, raise ImportBusy when none is free"""
+    def __init__(self):
+        if not _slots.acquire(blocking=False):
+            raise ImportBusy()
+        self._held = True
+        self._lock = threading.Lock()
+
+    def release(self):
+        # Called by the result stream and by the response close, whichever comes first
+        with self._lock:
+            held, self._held = self._held, False
+        if held:
+            _slots.release()
+
+
+def _reset_after_fork():
+    # Pool processes and locks of the parent are not usable in a forked worker
+    global _pool, _pool_lock, _slots
+    _pool = None
+    _pool_lock = threading.Lock()
+    _slots = threading.BoundedSemaphore(max(config('USER_IMPORT_CONCURRENCY', default=1, cast=int), 1))
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def read_csv(stream):
+    """(name, email, password) of a CSV text stream with a header line"""
+    for row in csv.DictReader(stream):
+        yield row.get('name'), row.get('email'), row.get('password')
+
+
+def read_jsonl(stream):
+    """(name, email, password) of a stream of JSON objects, one per line"""
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield ValueError("The line is not valid JSON")
+            continue
+        if not isinstance(row, dict):
+            yield ValueError("The line is not a JSON object")
+            continue
+        yield row.get('name'), row.get('email'), row.get('password')
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+def import_format(requested, content_type):
+    """Format named by the format query argument or else the content type, None when unsupported"""
+    if requested:
+        return requested if requested in FORMATS else None
+    return CONTENT_TYPES.get(content_type)
+
+
+class ImportBody:
+    """Uploaded file of an import, kept in memory up to 1MB and on disk beyond
+
+    The whole upload is received before the first row is written, so a
+    client that stops sending doesn't leave a half imported file.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.file = tempfile.SpooledTemporaryFile(max_size=1 << 20)
+
+    def write(self, chunk):
+        self.file.write(chunk)
+        if self.file.tell() > self.max_bytes:
+            raise ImportTooLarge(f"Imports are limited to {self.max_bytes} bytes")
+
+    def rows(self, file_format):
+        self.file.seek(0)
+        return READERS[file_format](io.TextIOWrapper(self.file, encoding='utf-8-sig', errors='replace', newline=''))
+
+    def close(self):
+        self.file.close()
+
+
+def _text(value):
+    # Spreadsheets pad cells and leave numbers unquoted
+    return value.strip() if isinstance(value, str) else (str(value) if value is not None else None)
+
+
+class UserImporter:
+    """Streams rows into the user collection, see the module docstring
+
+    pool -- concurrent.futures executor hashing the passwords, None hashes inline, not shut down here
+    parts -- chunks the passwords of a batch are split into on the pool
+    code_ttl -- seconds the verification codes stay valid, queued emails can take a while to go out
+    dry_run -- validate and report without hashing or writing anything
+    """
+    def __init__(self, batch_size=500, pool=None, parts=1, code_ttl=86400, dry_run=False):
+        self.batch_size = batch_size
+        self.pool = pool
+        self.parts = parts
+        self.code_ttl = code_ttl
+        self.dry_run = dry_run
+        self.summary = {'rows': 0, 'created': 0, 'valid': 0, 'exists': 0, 'duplicate': 0, 'invalid': 0, 'error': 0, 'emails_queued': 0}
+
+    def _result(self, row, email, status, message_code=None, message=None):
+        self.summary['rows'] += 1
+        self.summary[status] += 1
+        result = {'row': row, 'email': email, 'status': status}
+        if message_code:
+            result['message_code'] = message_code
+            result['message'] = message
+        return result
+
+    def default_role(self):
+        """Name of the role given to the imported users, raise ImportAborted without one"""
+        active_roles, default_role = RoleModel.find_active_and_default_roles()
+        if not active_roles:
+            raise ImportAborted("No active roles found", NO_ACTIVE_ROLES_FOUND)
+        if not default_role:
+            raise ImportAborted("Default role not found", DEFAULT_ROLE_NOT_FOUND)
+        return default_role['name']
+
+    def run(self, rows, role=None):
+        """Yield the result of every row of `rows`, an iterator from one of the READERS"""
+        role = role or self.default_role()
+        batch = []
+        seen = set()
+        for number, row in enumerate(rows, start=1):
+            if isinstance(row, Exception):
+                yield self._result(number, None, 'invalid', INVALID_FIELDS, str(row))
+                continue
+            name, email, password = _text(row[0]), _text(row[1]), row[2]
+            error = enrollment_error(name, email, password if isinstance(password, str) else None)
+            if error:
+                yield self._result(number, email, 'invalid', error.message_code, error.message)
+            elif email in seen:
+                yield self._result(number, email, 'duplicate', DUPLICATE_ROW, "The email appears earlier in the file")
+            else:
+                seen.add(email)
+                batch.append((number, name, email, password))
+                if len(batch) >= self.batch_size:
+                    yield from self._write(batch, role)
+                    batch = []
+                    if not self.dry_run:
+                        # Emails of earlier batches are in the database now, their duplicates show as existing
+                        seen.clear()
+        if batch:
+            yield from self._write(batch, role)
+
+    def _write(self, batch, role):
+        registered = {
+            user['email'] for user in
+            __dbmanager__.collection.find({'email': {'$in': [email for _, _, email, _ in batch]}}, {'email': 1, '_id': 0})
+        }
+        new_rows = [row for row in batch if row[2] not in registered]
+        for number, _, email, _ in batch:
+            if email in registered:
+                yield self._result(number, email, 'exists', USER_ALREADY_REGISTERED, "The user is already registered")
+        if not new_rows:
+            return
+        if self.dry_run:
+            for number, _, email, _ in new_rows:
+                yield self._result(number, email, 'valid')
+            return
+
+        passwords = hash_passwords([password for _, _, _, password in new_rows], pool=self.pool, parts=self.parts)
+        expiration_code = datetime.utcnow() + timedelta(seconds=self.code_ttl)
+        codes = [random.randint(100000, 999999) for _ in new_rows]
+        operations = [
+            UpdateOne({'email': email}, {'$setOnInsert': {
+                'name': name,
+                'password': password_hash,
+                'email': email,
+                'status': 'Pending',
+                'verification_code': code,
+                'expiration_code': expiration_code,
+                'role': role,
+                'token': "",
+                'is_session_active': False
+            }}, upsert=True)
+            for (_, name, email, _), password_hash, code in zip(new_rows, passwords, codes)
+        ]
+        failed = {}
+        try:
+            upserted = __dbmanager__.collection.bulk_write(operations, ordered=False).upserted_ids
+        except BulkWriteError as ex:
+            upserted = {item['index']: item['_id'] for item in ex.details.get('upserted', [])}
+            for error in ex.details.get('writeErrors', []):
+                failed[error['index']] = error
+        except Exception as ex:
+            logging.error(f"Bulk import write failed: {ex}", exc_info=True)
+            for number, _, email, _ in new_rows:
+                yield self._result(number, email, 'error', USER_CREATION_ERROR, "Error creating user")
+            return
+
+        created = [index for index in range(len(new_rows)) if index in upserted]
+        queued = [False] * len(created)
+        try:
+            queued = queue_emails('verification', [(new_rows[index][2], {'code': codes[index]}) for index in created])
+        except Exception as ex:
+            # The users stay Pending, enrolling again sends them a new code
+            logging.error(f"Bulk import could not queue the verification emails: {ex}", exc_info=True)
+        queued = dict(zip(created, queued))
+
+        for index, (number, _, email, _) in enumerate(new_rows):
+            if index in queued:
+                result = self._result(number, email, 'created')
+                result['email_queued'] = queued[index]
+                self.summary['emails_queued'] += queued[index]
+            elif index in failed and failed[index].get('code') != _DUPLICATE_KEY:
+                result = self._result(number, email, 'error', USER_CREATION_ERROR, failed[index].get('errmsg'))
+            else:
+                # Enrolled between the lookup and the write
+                result = self._result(number, email, 'exists', USER_ALREADY_REGISTERED, "The user is already registered")
+            yield result
+
+
+def ndjson_results(importer, body, file_format, role, slot):
+    """NDJSON lines of the row results and a final summary for the import endpoints
+
+    The body is closed and the ImportSlot released at the end.
+    """
+    try:
+        for result in importer.run(body.rows(file_format), role):
+            yield encode(result) + b'\n'
+        yield encode({'summary': importer.summary}) + b'\n'
+    except Exception as e:
+        # The status line is gone already, the client learns about it from the last line
+        logging.error(f"User import failed: {str(e)}", exc_info=True)
+        yield encode({'error': "The import stopped on an unexpected error", 'summary': importer.summary}) + b'\n'
+    finally:
+        body.close()
+        slot.release()
+
+
+def importer_from_settings(**overrides):
+    """UserImporter of the server, hashing on the shared import pool unless overridden"""
+    options = {
+        'batch_size': config('USER_IMPORT_BATCH_SIZE', default=500, cast=int),
+        'pool': get_import_pool(),
+        'parts': 2 * config('USER_IMPORT_WORKERS', default=2, cast=int),
+        'code_ttl': config('USER_IMPORT_CODE_TTL', default=86400, cast=int),
+    }
+    options.update({name: value for name, value in overrides.items() if value is not None})
+    return UserImporter(**options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help="CSV or JSON lines file, - for stdin")
+    parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension, csv for stdin")
+    parser.add_argument('--batch-size', type=int)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Hashing processes, 0 hashes inline")
+    parser.add_argument('--code-ttl', type=int, help="Seconds the verification codes stay valid")
+    parser.add_argument('--dry-run', action='store_true', help="Only validate the rows")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    file_format = args.format or ('jsonl' if args.path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    pool = None
+    if args.workers and not args.dry_run:
+        pool = ProcessPoolExecutor(
+            max_workers=args.workers,
+            mp_context=multiprocessing.get_context(config('KDF_EXECUTOR_START_METHOD', default='spawn'))
+        )
+    importer = UserImporter(
+        batch_size=args.batch_size or config('USER_IMPORT_BATCH_SIZE', default=500, cast=int),
+        pool=pool,
+        parts=2 * args.workers,
+        code_ttl=args.code_ttl or config('USER_IMPORT_CODE_TTL', default=86400, cast=int),
+        dry_run=args.dry_run
+    )
+    stream = sys.stdin if args.path == '-' else open(args.path, newline='', encoding='utf-8-sig')
+    try:
+        for result in importer.run(READERS[file_format](stream)):
+            print(json.dumps(result))
+    except ImportAborted as ex:
+        logging.error(f"Import aborted: {ex}")
+        sys.exit(1)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    print(json.dumps({'summary': importer.summary}))
+
+
+if __name__ == '__main__':
+    main()
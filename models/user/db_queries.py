@@ -2,9 +2,48 @@ import logging
 from db.mongo_client import Connection
 from decouple import config
 from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
+from models.user.records import LoginRecord
 
 __dbmanager__ = Connection(config('USER_COLLECTION'))
 
+def db_find_login_record(email):
+    """Login fields of the user, None when the email is unknown"""
+    return __dbmanager__.find_by_email(email, LoginRecord.projection())
+
+def pending_code_update(verification_code, expiration_code):
+    """Update pipeline that renews the verification code of a Pending user and leaves any other user as it is"""
+    pending = {'$eq': ['$status', 'Pending']}
+    return [{'$set': {
+        'verification_code': {'$cond': [pending, verification_code, '$verification_code']},
+        'expiration_code': {'$cond': [pending, expiration_code, '$expiration_code']}
+    }}]
+
+def db_renew_pending_code(email, verification_code, expiration_code, session=None):
+    """Status the user had before, None when the email is unknown"""
+    document = __dbmanager__.collection.find_one_and_update(
+        {'email': email},
+        pending_code_update(verification_code, expiration_code),
+        projection={'status': 1, '_id': 0},
+        session=session
+    )
+    return document['status'] if document else None
+
+def db_insert_user_once(user_data, session=None):
+    """True when the user was inserted, False when the email is already taken"""
+    try:
+        result = __dbmanager__.collection.update_one(
+            {'email': user_data['email']}, {'$setOnInsert': user_data}, upsert=True, session=session
+        )
+    except DuplicateKeyError:
+        # A concurrent enrollment of the same email won the unique index
+        return False
+    return result.upserted_id is not None
+
+def db_record_login(condition, new_data):
+    """True when the user still matched the condition and got the session"""
+    return __dbmanager__.collection.find_one_and_update(condition, {'$set': new_data}, projection={'_id': 1}) is not None
+
 def update_token(user_id, token):
     try:
         object_id = ObjectId(user_id)
@@ -0,0 +1,69 @@
+"""
+Admin listing and export of users
+
+Pages are keyset paginated on _id: a page asks for the users after the last
+_id of the previous one, so every page costs one index range scan however
+deep it is, and users enrolled meanwhile don't shift the pages. Users can
+be filtered by status, role and email domain, and the fields returned are
+picked from LISTED_FIELDS. The password, the verification code and the
+session token are never read.
+"""
+import logging
+import re
+from decouple import config
+from models.user.db_queries import __dbmanager__
+from models.user.listing_fields import LISTED_FIELDS
+from utils.server_response import encode
+
+
+def listing_query(status=None, role=None, domain=None):
+    query = {}
+    if status:
+        query['status'] = status
+    if role:
+        query['role'] = role
+    if domain:
+        # Anchored on the end of the email, the domain can't match inside the local part
+        query['email'] = {'$regex': '@' + re.escape(domain) + '$', '$options': 'i'}
+    return query
+
+
+def listing_projection(fields=LISTED_FIELDS):
+    return {name: 1 for name in fields if name in LISTED_FIELDS}
+
+
+def listed_user(document, fields=LISTED_FIELDS):
+    user = {'id': str(document['_id'])}
+    user.update({name: document.get(name) for name in fields})
+    return user
+
+
+def listing_page(documents, fields, limit):
+    """Response data of a page fetched with limit + 1 documents, the extra one only tells there is a next page"""
+    users = [listed_user(document, fields) for document in documents[:limit]]
+    return {'users': users, 'next': users[-1]['id'] if len(documents) > limit else None}
+
+
+def find_users_page(query, fields, after=None, limit=50):
+    return listing_page(__dbmanager__.find_page(query, listing_projection(fields), after, limit + 1), fields, limit)
+
+
+def export_batch_size():
+    return config('USER_EXPORT_BATCH_SIZE', default=1000, cast=int)
+
+
+def iter_listed_users(query, fields, batch_size=None):
+    """Lists of listed users covering the query, one keyset page each"""
+    for documents in __dbmanager__.iter_batches(query, listing_projection(fields), batch_size or export_batch_size()):
+        yield [listed_user(document, fields) for document in documents]
+
+
+def ndjson_users(query, fields, batch_size=None):
+    """NDJSON lines of the export, one user each, written a batch at a time"""
+    try:
+        for users in iter_listed_users(query, fields, batch_size):
+            yield b''.join(encode(user) + b'\n' for user in users)
+    except Exception as e:
+        # The status line is gone already, the client learns about it from the last line
+        logging.error(f"User export failed: {str(e)}", exc_info=True)
+        yield encode({'error': "The export stopped on an unexpected error"}) + b'\n'
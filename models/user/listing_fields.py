@@ -0,0 +1,51 @@
+"""
+Query arguments of the user listing, see models.user.listing
+
+Kept apart from the listing queries so the request schemas can use them
+without a database connection.
+"""
+import re
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from decouple import config
+
+# Fields a listing may return, the _id is always returned as id
+LISTED_FIELDS = ('name', 'email', 'status', 'role', 'is_session_active')
+_DOMAIN = re.compile(r'^[A-Za-z0-9-]+(\.[A-Za-z0-9-]+)*$')
+
+
+def page_limit(value):
+    """Coerce the limit argument, 1 to USER_LIST_MAX_LIMIT"""
+    try:
+        limit = int(value)
+    except (ValueError, TypeError):
+        raise ValueError('must be an integer')
+    maximum = config('USER_LIST_MAX_LIMIT', default=500, cast=int)
+    if not 1 <= limit <= maximum:
+        raise ValueError(f'must be between 1 and {maximum}')
+    return limit
+
+
+def page_cursor(value):
+    """Coerce the after argument, the id of the last user of the previous page"""
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise ValueError('must be the id of a user')
+
+
+def listed_fields(value):
+    """Coerce the comma separated fields argument into a tuple of LISTED_FIELDS"""
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in LISTED_FIELDS]
+    if unknown:
+        raise ValueError(f"can't include {', '.join(unknown)}, pick from {', '.join(LISTED_FIELDS)}")
+    return fields or LISTED_FIELDS
+
+
+def email_domain(value):
+    """Coerce the domain argument, e.g. utn.ac.cr"""
+    domain = value.strip().lstrip('@')
+    if not _DOMAIN.match(domain):
+        raise ValueError('must be a domain name')
+    return domain
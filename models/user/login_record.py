@@ -0,0 +1,30 @@
+"""
+Data path of the login
+
+A login reads only the fields it needs (see LoginRecord) with one indexed
+find by email, takes the role from the role cache, and records the session
+with one find_one_and_update conditioned on the values it authenticated
+against (id, email, name, role, status and password hash). A password or
+status changed in between makes the update match nothing. An outdated
+password hash is replaced in that same update.
+"""
+from bson import ObjectId
+
+
+def login_condition(record):
+    """Matches the stored user only while it still has the authenticated values"""
+    return {
+        '_id': ObjectId(record.id),
+        'name': record.name,
+        'email': record.email,
+        'password': record.password,
+        'status': 'Active',
+        'role': record.role
+    }
+
+
+def login_update(token, new_password_hash=None):
+    update = {'token': token, 'is_session_active': True}
+    if new_password_hash:
+        update['password'] = new_password_hash
+    return update
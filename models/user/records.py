@@ -0,0 +1,36 @@
+"""
+Projected views of a user document, one per use case
+
+Each record reads only the fields its use case needs, see utils.record.Record.
+"""
+from utils.record import Record
+
+
+class UserStatus(Record):
+    """Enrollment: whether the email is taken and in which state"""
+    __slots__ = ('status',)
+
+
+class UserCredentials(Record):
+    """Password change"""
+    __slots__ = ('status', 'password')
+
+
+class UserVerification(Record):
+    """Account verification"""
+    __slots__ = ('status', 'verification_code', 'expiration_code')
+
+
+class UserSession(Record):
+    """Logout, the stored token is revoked with the session"""
+    __slots__ = ('token',)
+
+
+class UserExists(Record):
+    """Existence checks, only the _id is read"""
+    __slots__ = ('id',)
+
+
+class LoginRecord(Record):
+    """Login"""
+    __slots__ = ('id', 'name', 'email', 'password', 'status', 'role')
@@ -1,7 +1,14 @@
 import logging
 from bson import ObjectId
-from utils.encryption_utils import EncryptionUtil
-from models.user.db_queries import __dbmanager__, update_token, update_password
+from pymongo.errors import PyMongoError
+from utils.password_hasher import hash_password, verify_password, needs_rehash
+from utils.kdf_executor import KdfPoolSaturated
+from models.user.db_queries import (
+    __dbmanager__, update_token, update_password, db_find_login_record, db_record_login, db_renew_pending_code,
+    db_insert_user_once
+)
+from models.user.login_record import login_condition, login_update
+from models.user.records import LoginRecord
 
 class UserModel:
     def __init__(self, name, password, email, status, verification_code, expiration_code, role, token="", is_session_active=False):
@@ -28,38 +35,46 @@ class UserModel:
             'is_session_active': self.is_session_active
         }
     
-    @classmethod
-    def create_user(cls, user_data):
+    @staticmethod
+    def renew_verification_code(email, verification_code, expiration_code, session=None):
+        """Give a Pending user a new verification code, in one operation
+
+        Returns the status the user had, None when the email is unknown. Only
+        a Pending user is updated.
+        """
         try:
-            # Encrypt password
-            encryption_util = EncryptionUtil()
-            user_data['password'] = encryption_util.encrypt(user_data['password'])
-            
-            # Insert the user in the database
-            result = __dbmanager__.create_data(user_data)
-            
-            if result:
-                # Create UserModel instance with expected fields
-                return cls(
-                    name=user_data['name'],
-                    password=user_data['password'],
-                    email=user_data['email'],
-                    status=user_data['status'],
-                    verification_code=user_data['verification_code'],
-                    expiration_code=user_data['expiration_code'],
-                    role=user_data['role'],
-                    token=user_data['token'],
-                    is_session_active=user_data['is_session_active']
-                )
-            else:
-                raise Exception("Failed to create user in database")
+            return db_renew_pending_code(email, verification_code, expiration_code, session=session)
+        except PyMongoError:
+            # A WriteConflict with a concurrent enrollment is retried by with_transaction
+            raise
+        except Exception as e:
+            logging.error(f"Error renewing verification code: {str(e)}", exc_info=True)
+            raise Exception('Error renewing verification code')
+
+    @staticmethod
+    def create_user_once(user_data, session=None):
+        """Insert a user whose password is already hashed, False when its email is taken
+
+        The unique email index decides between concurrent enrollments, no
+        lookup runs before the insert.
+        """
+        try:
+            return db_insert_user_once(user_data, session=session)
+        except PyMongoError:
+            raise
         except Exception as e:
             logging.error(f"Error creating user: {str(e)}", exc_info=True)
             raise Exception('Error creating user')
 
     @staticmethod
-    def find_by_email(email):
+    def find_by_email(email, record_type=None):
+        """The user as a record_type (see models.user.records) read with its projection
+
+        Without record_type the whole document is returned as a dict.
+        """
         try:
+            if record_type is not None:
+                return record_type.from_document(__dbmanager__.find_by_email(email, record_type.projection()))
             user = __dbmanager__.find_by_email(email)
             if user:
                 user['id'] = str(user.pop('_id'))
@@ -67,6 +82,33 @@ class UserModel:
         except Exception as e:
             raise Exception(f"Error in find_by_email: {str(e)}")
         
+    @staticmethod
+    def find_login_record(email):
+        """The LoginRecord of the user, None when the email is unknown"""
+        try:
+            return LoginRecord.from_document(db_find_login_record(email))
+        except Exception as e:
+            raise Exception(f"Error in find_login_record: {str(e)}")
+
+    @staticmethod
+    def record_login(user, token, plain_password):
+        """Store the session token of a verified login, False when the stored user no longer matches
+
+        An outdated password hash is replaced in the same update.
+        """
+        new_password_hash = None
+        if needs_rehash(user.password):
+            try:
+                new_password_hash = hash_password(plain_password)
+            except KdfPoolSaturated:
+                # Not urgent, the next login tries again
+                pass
+        try:
+            return db_record_login(login_condition(user), login_update(token, new_password_hash))
+        except Exception as e:
+            logging.error(f"Error recording login: {str(e)}", exc_info=True)
+            return False
+
     @staticmethod
     def logout_user(email):
         try:
@@ -76,8 +118,7 @@ class UserModel:
 
     @staticmethod
     def verify_password(plain_password, encrypted_password):
-        encryption_util = EncryptionUtil()
-        return encryption_util.verify_password(plain_password, encrypted_password)
+        return verify_password(plain_password, encrypted_password)
 
     @classmethod
     def update_password(cls, email, new_password):
@@ -94,7 +135,7 @@ class UserModel:
             raise Exception('Error updating password')
         
     @staticmethod
-    def update_reset_password_info(user_email, verification_code, expiration_time, encrypted_temp_password):
+    def update_reset_password_info(user_email, verification_code, expiration_time, encrypted_temp_password, session=None):
         try:
             update_data = {
                 'verification_code': verification_code,
@@ -102,14 +143,15 @@ class UserModel:
                 'password': encrypted_temp_password,
                 'status': 'blocked'
             }
-            result = __dbmanager__.update_by_condition({'email': user_email}, update_data)
+            result = __dbmanager__.update_by_condition({'email': user_email}, update_data, session=session)
             if result is None or result.matched_count == 0:
                 logging.warning(f"Failed to update reset password info for user: {user_email}. User not found or no changes made.")
                 return False
             else:
                 logging.info(f"Successfully updated reset password info for user: {user_email}")
                 return True
-                
+        except PyMongoError:
+            raise
         except Exception as e:
             logging.error(f"Error updating reset password info: {str(e)}", exc_info=True)
             raise Exception('Error updating reset password info')
@@ -154,16 +196,17 @@ class UserModel:
             raise Exception('Error saving user to database')
         
     @staticmethod
-    def update_user(email, update_data):
+    def update_user(email, update_data, session=None):
         try:
-            result = __dbmanager__.update_by_condition({'email': email}, update_data)
+            result = __dbmanager__.update_by_condition({'email': email}, update_data, session=session)
             if result is None or result.matched_count == 0:
                 logging.warning(f"Failed to update user: {email}. User not found or no changes made.")
                 return False
             else:
                 logging.info(f"Successfully updated user: {email}")
                 return True
-                
+        except PyMongoError:
+            raise
         except Exception as e:
             logging.error(f"Error updating user: {str(e)}", exc_info=True)
             raise Exception('Error updating user')
@@ -2,4 +2,8 @@ if [ -f .env ]; then
     # Load Environment Variables
     export $(cat .env | grep -v '#' | awk '/=/ {print $1}')
 fi
-gunicorn --reload --log-level 'debug' -t 3600 -b :${SECURITY_SERVICE_PORT} run_server:App
\ No newline at end of file
+if [ "$1" = "--dev" ]; then
+    # Auto-reload and debug logging for local work, only when asked for
+    export SERVER_RELOAD=True SERVER_LOG_LEVEL=debug
+fi
+python run_server.py
\ No newline at end of file
@@ -1 +1,123 @@
-from app import app as App
\ No newline at end of file
+"""
+Production entry point of the Flask app
+
+    python run_server.py
+
+runs gunicorn with the worker profile chosen by SERVER_PROFILE:
+    sync     one request at a time per worker process
+    gthread  SERVER_THREADS request threads per worker process
+    gevent   cooperative greenlets, SERVER_WORKER_CONNECTIONS per worker (needs gevent)
+
+`gunicorn run_server:App` keeps working for setups that pass their own
+gunicorn options.
+"""
+import logging
+import multiprocessing
+from decouple import config
+from gunicorn.app.base import BaseApplication
+
+PROFILES = ('sync', 'gthread', 'gevent')
+
+
+def default_workers(profile):
+    cpus = multiprocessing.cpu_count()
+    if profile == 'sync':
+        # Blocking workers, extra processes cover the time spent waiting on Mongo
+        return cpus * 2 + 1
+    return cpus
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        # The worker imports app.py itself, after the gevent worker has patched the standard library
+        return
+    # The parent's Mongo client and executors are dropped by their fork hooks, which
+    # also re-create the locks of the refreshers, those have to be started again in every worker
+    from db.mongo_client import close_client
+    from models.revoked_token.revocation_list import get_revocation_list
+    from models.role.permission_index import get_permission_index
+    from models.role.role_snapshot import get_role_snapshot
+    close_client()
+    if get_role_snapshot() is not None:
+        get_role_snapshot().start()
+    else:
+        get_permission_index().start()
+    get_revocation_list().start()
+    server.log.info(f"Worker {worker.pid} initialized")
+
+
+def post_worker_init(worker):
+    # Workers reset the signal handlers they inherit, SIGHUP sent to a worker reloads its settings
+    from utils.settings import install_reload_signal, reload_settings
+    if worker.cfg.preload_app:
+        # Workers restarted by a HUP to the master are forked from the preloaded app, read the settings again
+        reload_settings()
+    install_reload_signal()
+
+
+def server_options(profile=None):
+    profile = profile or config('SERVER_PROFILE', default='gthread')
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown SERVER_PROFILE {profile}, expected one of {', '.join(PROFILES)}")
+    options = {
+        'bind': f"{config('FLASK_RUN_HOST', default='0.0.0.0')}:{config('SECURITY_SERVICE_PORT')}",
+        'worker_class': profile,
+        'workers': config('SERVER_WORKERS', default=0, cast=int) or default_workers(profile),
+        'timeout': config('SERVER_TIMEOUT', default=30, cast=int),
+        'graceful_timeout': config('SERVER_GRACEFUL_TIMEOUT', default=30, cast=int),
+        'keepalive': config('SERVER_KEEPALIVE', default=5, cast=int),
+        # Recycle workers so slow leaks can't grow forever, the jitter keeps them from restarting together
+        'max_requests': config('SERVER_MAX_REQUESTS', default=2000, cast=int),
+        'max_requests_jitter': config('SERVER_MAX_REQUESTS_JITTER', default=200, cast=int),
+        'loglevel': config('SERVER_LOG_LEVEL', default='info'),
+        'accesslog': config('SERVER_ACCESS_LOG', default='-') or None,
+        'reload': config('SERVER_RELOAD', default=False, cast=bool),
+        # Load the app once in the master, workers share its warmed caches copy-on-write
+        'preload_app': config('SERVER_PRELOAD', default=True, cast=bool),
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+    }
+    if profile == 'gthread':
+        options['threads'] = config('SERVER_THREADS', default=4, cast=int)
+    elif profile == 'gevent':
+        # The gevent worker patches the standard library after the fork, the app must be imported after that
+        options['preload_app'] = False
+        options['worker_connections'] = config('SERVER_WORKER_CONNECTIONS', default=100, cast=int)
+    if options['reload']:
+        # The reloader watches files of the worker, it can't work on a preloaded app
+        options['preload_app'] = False
+    return options
+
+
+class StandaloneServer(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app import app
+        return app
+
+
+def __getattr__(name):
+    # `gunicorn run_server:App`, imported on demand so the gevent profile can patch first
+    if name == 'App':
+        from app import app
+        return app
+    raise AttributeError(name)
+
+
+if __name__ == '__main__':
+    options = server_options()
+    if options['worker_class'] == 'gevent':
+        try:
+            import gevent  # noqa: F401
+        except ImportError:
+            raise SystemExit("SERVER_PROFILE=gevent needs the gevent package")
+    logging.basicConfig(level=logging.INFO)
+    logging.info(f"Starting {options['workers']} {options['worker_class']} workers on {options['bind']}")
+    StandaloneServer(options).run()
@@ -5,9 +5,13 @@ from controllers.health.controller import HealthController
 from controllers.auth.auth import LoginController
 from controllers.auth.verify_auth import AuthController
 from controllers.auth.refresh_token import RefreshController
+from controllers.auth.jwks import JwksController
 from controllers.rol.rol_controller import RolController
 from controllers.user.UserVerificationController import UserVerificationController
 from controllers.user.UserEnrollment_controller import UserEnrollmentController
+from controllers.user.UserImportController import UserImportController
+from controllers.user.UserListController import UserListController
+from controllers.user.UserExportController import UserExportController
 def addServiceLayer(api: Api):
     # Health
     api.add_resource(HealthController, HealthController.route)
@@ -16,6 +20,7 @@ def addServiceLayer(api: Api):
     api.add_resource(AuthController, AuthController.route)
     api.add_resource(LoginController, LoginController.route)
     api.add_resource(RefreshController, RefreshController.route)
+    api.add_resource(JwksController, JwksController.route)
     # Rol
     api.add_resource(RolController, RolController.route)
 
@@ -23,6 +28,9 @@ def addServiceLayer(api: Api):
     api.add_resource(LogoutController,LogoutController.route)
     # User
     api.add_resource(UserEnrollmentController, UserEnrollmentController.route)
+    api.add_resource(UserImportController, UserImportController.route)
+    api.add_resource(UserListController, UserListController.route)
+    api.add_resource(UserExportController, UserExportController.route)
     api.add_resource(UserPasswordController, UserPasswordController.route)
     
     api.add_resource(UserVerificationController, UserVerificationController.route)
@@ -0,0 +1,23 @@
+from utils.bloom_filter import BloomFilter
+
+
+def test_added_items_are_always_found():
+    bloom = BloomFilter(1000)
+    for i in range(1000):
+        bloom.add(f"jti-{i}")
+    assert all(f"jti-{i}" in bloom for i in range(1000))
+    assert bloom.count == 1000
+
+
+def test_false_positive_rate_at_capacity():
+    for error_rate in (0.01, 0.001):
+        bloom = BloomFilter(10000, error_rate)
+        for i in range(10000):
+            bloom.add(f"jti-{i}")
+        false_positives = sum(f"other-{i}" in bloom for i in range(100000))
+        assert false_positives / 100000 <= error_rate * 1.5
+
+
+def test_empty_filter_has_no_items():
+    bloom = BloomFilter(0)
+    assert "jti" not in bloom
@@ -0,0 +1,97 @@
+import pytest
+from utils.rate_limiter import Limit, RateLimited, SlidingWindowTable, retry_after, sliding_count, _PROBES
+
+
+@pytest.fixture
+def table(tmp_path):
+    return SlidingWindowTable(str(tmp_path / 'ratelimit.bin'), slots=1024)
+
+
+def test_sliding_count_at_window_boundaries():
+    # The previous window counts in full at the start of the current one and not at all at its end
+    assert sliding_count(2, 10, 0, 60) == 12
+    assert sliding_count(0, 10, 30, 60) == 5
+    assert sliding_count(2, 10, 60, 60) == 2
+
+
+def test_retry_after_waits_for_the_next_window_when_the_current_one_is_full():
+    # 50s to the next window, then 12s for the 5 requests of this one to decay to 4
+    assert retry_after(5, 0, 10, Limit(5, 60)) == 62
+
+
+def test_retry_after_waits_for_the_previous_window_to_decay():
+    # 20 * (1 - 33/60) + 0 = 9, one more fits 3s from now
+    assert retry_after(0, 20, 30, Limit(10, 60)) == 3
+    assert retry_after(2, 20, 30, Limit(10, 60)) == 9
+
+
+def test_retry_after_is_at_least_one_second():
+    assert retry_after(0, 10, 6, Limit(10, 60)) == 1
+
+
+def test_limit_parse():
+    limit = Limit.parse('30/60')
+    assert (limit.count, limit.window) == (30, 60)
+    with pytest.raises(ValueError):
+        Limit.parse('0/60')
+
+
+def test_acquire_across_window_boundaries(table):
+    limit = Limit(2, 10)
+    check = [('ip', '10.0.0.1', limit, True)]
+    table.acquire(check, now=100)
+    table.acquire(check, now=105)
+    with pytest.raises(RateLimited) as raised:
+        table.acquire(check, now=109)
+    assert raised.value.scope == 'ip'
+    # Start of the next window, the previous one still counts in full
+    with pytest.raises(RateLimited):
+        table.acquire(check, now=110)
+    # Half way, 2 * 0.5 + 1 fits
+    table.acquire(check, now=115)
+    # Two windows later nothing is left
+    table.acquire(check, now=130)
+    table.acquire(check, now=131)
+
+
+def test_acquire_is_all_or_none(table):
+    ip_limit = Limit(1, 60)
+    failure_limit = Limit(1, 300)
+    table.add('ana@est.utn.ac.cr', failure_limit, now=100)
+    with pytest.raises(RateLimited) as raised:
+        table.acquire([
+            ('ip', '10.0.0.1', ip_limit, True),
+            ('email', 'ana@est.utn.ac.cr', failure_limit, False),
+        ], now=100)
+    assert raised.value.scope == 'email'
+    # The ip check passed but was not counted
+    table.acquire([('ip', '10.0.0.1', ip_limit, True)], now=100)
+    with pytest.raises(RateLimited):
+        table.acquire([('ip', '10.0.0.1', ip_limit, True)], now=100)
+
+
+def test_clear_forgets_a_key(table):
+    limit = Limit(1, 300)
+    table.add('ana@est.utn.ac.cr', limit, now=100)
+    table.clear('ana@est.utn.ac.cr', limit, now=100)
+    table.acquire([('email', 'ana@est.utn.ac.cr', limit, False)], now=100)
+
+
+def test_full_probes_evict_the_quietest_slot(tmp_path):
+    # As many slots as probes, every key sees the whole table
+    table = SlidingWindowTable(str(tmp_path / 'ratelimit.bin'), slots=_PROBES)
+    limit = Limit(1, 60)
+    table.add('quiet', limit, now=100)
+    for i in range(_PROBES - 1):
+        table.add(f'noisy-{i}', limit, now=100)
+        table.add(f'noisy-{i}', limit, now=100)
+
+    table.acquire([('ip', 'newcomer', Limit(10, 60), True)], now=100)
+
+    # The quiet key lost its slot and starts over, the noisy ones kept theirs
+    table.acquire([('ip', 'quiet', limit, False)], now=100)
+    for i in range(_PROBES - 1):
+        with pytest.raises(RateLimited):
+            table.acquire([('ip', f'noisy-{i}', limit, False)], now=100)
+    with pytest.raises(RateLimited):
+        table.acquire([('ip', 'newcomer', limit, False)], now=100)
@@ -1,12 +1,236 @@
 from functools import wraps
+import hashlib
+import logging
+import os
+import threading
+import time
+import jwt
 import requests
+from requests.adapters import HTTPAdapter
 from flask import request
 from decouple import config
+from utils.ttl_cache import TTLCache, MISSING
 import random
 import string
 
 
-def auth_required(action=None, permission='', with_args=False):
+class LocalVerificationUnavailable(Exception):
+    """The token can't be checked locally, the remote verify_auth call has to decide"""
+
+
+class PermissionDenied(Exception):
+    """The token is valid but its role does not grant the permission"""
+
+
+class LocalTokenVerifier:
+    """Verify tokens in-process with the keys published on /auth/jwks
+
+    The key set is cached for `cache_ttl` seconds. An unknown `kid` forces a
+    refresh, at most once every `min_refresh_interval` seconds, so a key
+    rotation is picked up without hammering the auth service.
+    """
+    def __init__(self, jwks_url, cache_ttl=300, min_refresh_interval=30, issuer=None, leeway=0):
+        self.jwks_url = jwks_url
+        self.cache_ttl = cache_ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.issuer = issuer
+        self.leeway = leeway
+        self._keys = {}
+        self._fetched_at = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self, force=False):
+        with self._lock:
+            age = time.monotonic() - self._fetched_at
+            if (force and age < self.min_refresh_interval) or (not force and age < self.cache_ttl):
+                return
+            try:
+                response = get_http_session().get(self.jwks_url, timeout=5)
+                response.raise_for_status()
+                keys = {}
+                for jwk in response.json().get('keys', []):
+                    try:
+                        keys[jwk['kid']] = jwt.PyJWK(jwk)
+                    except Exception as ex:
+                        logging.warning(f"Skipping unusable JWK {jwk.get('kid')}: {ex}")
+                self._keys = keys
+            except Exception as ex:
+                # Keep serving the keys we have, the remote check covers the gap
+                logging.warning(f"Could not refresh JWKS from {self.jwks_url}: {ex}")
+            self._fetched_at = time.monotonic()
+
+    def _get_key(self, kid):
+        self._refresh()
+        key = self._keys.get(kid)
+        if key is None:
+            self._refresh(force=True)
+            key = self._keys.get(kid)
+        return key
+
+    def verify(self, token, permission=''):
+        """Return the token claims, raise jwt.InvalidTokenError for a bad token
+
+        Raise LocalVerificationUnavailable when no published key matches or
+        the token carries no permissions claim to check `permission` against.
+        Raise PermissionDenied when the claim lacks `permission`.
+        """
+        header = jwt.get_unverified_header(token)
+        kid = header.get('kid')
+        if not kid:
+            raise LocalVerificationUnavailable("Token is not signed with a published key")
+        key = self._get_key(kid)
+        if key is None:
+            raise LocalVerificationUnavailable(f"No published key for kid {kid}")
+        options = {'require': ['exp', 'sub']}
+        claims = jwt.decode(
+            token, key.key, algorithms=[key.algorithm_name], issuer=self.issuer,
+            leeway=self.leeway, options=options
+        )
+        if permission:
+            if 'permissions' not in claims:
+                raise LocalVerificationUnavailable("Token has no permissions claim")
+            if permission not in claims['permissions']:
+                raise PermissionDenied(permission)
+        return claims
+
+
+_verifier = None
+_verifier_lock = threading.Lock()
+
+
+def get_local_verifier():
+    global _verifier
+    if _verifier is None:
+        with _verifier_lock:
+            if _verifier is None:
+                _verifier = LocalTokenVerifier(
+                    jwks_url=config('AUTH_API_URL') + config('AUTH_API_PORT') + '/auth/jwks',
+                    cache_ttl=config('AUTH_JWKS_CACHE_TTL', default=300, cast=int),
+                    min_refresh_interval=config('AUTH_JWKS_MIN_REFRESH_INTERVAL', default=30, cast=int),
+                    issuer=config('JWT_ISSUER', default='security-service-api'),
+                    leeway=config('AUTH_JWT_LEEWAY', default=0, cast=int)
+                )
+    return _verifier
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+_verification_cache = None
+_counters = {'remote_calls': 0, 'negative_hits': 0}
+_counters_lock = threading.Lock()
+
+
+def get_http_session():
+    """Keep-alive session with a bounded connection pool, one per process"""
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config('AUTH_HTTP_POOL_SIZE', default=10, cast=int))
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+                _session_pid = os.getpid()
+    return _session
+
+
+def get_verification_cache():
+    global _verification_cache
+    if _verification_cache is None:
+        with _session_lock:
+            if _verification_cache is None:
+                _verification_cache = TTLCache(config('AUTH_CACHE_MAXSIZE', default=10000, cast=int))
+    return _verification_cache
+
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def _token_lifetime(token):
+    # Seconds left before exp, the signature is checked by the auth service
+    try:
+        exp = jwt.decode(_strip_scheme(token), options={'verify_signature': False}).get('exp')
+    except jwt.InvalidTokenError:
+        return 0
+    return exp - time.time() if exp else 0
+
+
+def verify_remote(token, permission, cache_accepted=True):
+    """Ask verify_auth about a token and permission, return (status code, body)
+
+    Accepted results are only cached when AUTH_CACHE_TTL is set, until then
+    or the token expiry, whichever comes first. A token revoked by logout
+    keeps passing for up to AUTH_CACHE_TTL seconds then. Rejections are cached for AUTH_NEGATIVE_CACHE_TTL
+    seconds so retries with a bad token don't reach the auth service. With
+    cache_accepted False only rejections are read and stored, a revocation
+    can only turn an accepted token down.
+    """
+    cache = get_verification_cache()
+    key = hashlib.sha256(token.encode()).hexdigest() + ':' + permission
+    cached = cache.get(key)
+    if cached is not MISSING and (cache_accepted or cached[0] != 200):
+        if cached[0] != 200:
+            _count('negative_hits')
+        return cached
+
+    response = get_http_session().post(
+        config('AUTH_API_URL') + config('AUTH_API_PORT') + '/auth/verify_auth',
+        json={'permission': permission},
+        headers={'Authorization': token},
+        timeout=config('AUTH_HTTP_TIMEOUT', default=20, cast=float)
+    )
+    _count('remote_calls')
+    try:
+        body = response.json()
+    except ValueError:
+        body = {'message': "Invalid response from the auth service"}
+    result = (response.status_code, body)
+
+    if response.status_code == 200 and cache_accepted:
+        cache.set(key, result, min(config('AUTH_CACHE_TTL', default=0, cast=int), _token_lifetime(token)))
+    elif 400 <= response.status_code < 500:
+        cache.set(key, result, config('AUTH_NEGATIVE_CACHE_TTL', default=5, cast=int))
+    return result
+
+
+def verification_cache_stats():
+    """Cache counters to measure how many verify_auth calls are saved"""
+    stats = get_verification_cache().stats()
+    with _counters_lock:
+        stats.update(_counters)
+    return stats
+
+
+def _is_revocation_sensitive(permission, revocation_sensitive):
+    if revocation_sensitive:
+        return True
+    sensitive = config('AUTH_REVOCATION_SENSITIVE_PERMISSIONS', default='')
+    return permission in [p.strip() for p in sensitive.split(',') if p.strip()]
+
+
+def _strip_scheme(token):
+    for scheme in ('Bearer ', 'JWT '):
+        if token.startswith(scheme):
+            return token[len(scheme):].strip()
+    return token.strip()
+
+
+def auth_required(action=None, permission='', with_args=False, revocation_sensitive=False):
+    """Protect an endpoint of a consuming service
+
+    With AUTH_VERIFY_MODE=local the token is verified in-process against the
+    published keys. Revocation sensitive permissions, listed in
+    AUTH_REVOCATION_SENSITIVE_PERMISSIONS or flagged with
+    `revocation_sensitive`, and tokens without a published key always go
+    through the remote verify_auth endpoint. Remote answers are cached, see
+    verify_remote, except the accepted ones of revocation sensitive checks.
+    A revoked token is only seen by the remote check: the local mode, and a
+    non-zero AUTH_CACHE_TTL, accept it until it expires or the cache entry does.
+    """
     def decorator(f):
         @wraps(f)
         def catcher(*args, **kwargs):
@@ -16,25 +240,44 @@ def auth_required(action=None, permission='', with_args=False):
                 token = request.headers["Authorization"]
             except:
                 return {'message': "Authorization token is required"}, 401
+
+            sensitive = _is_revocation_sensitive(permission, revocation_sensitive)
+            if config('AUTH_VERIFY_MODE', default='remote') == 'local' and not sensitive:
+                claims = None
+                try:
+                    claims = get_local_verifier().verify(_strip_scheme(token), permission)
+                except LocalVerificationUnavailable:
+                    pass
+                except PermissionDenied:
+                    return {'message': "The user role does not grant this permission"}, 403
+                except jwt.InvalidTokenError:
+                    return {'message': "Token Not Valid"}, 401
+                if claims is not None:
+                    if with_args:
+                        kwargs['current_user'] = {
+                            'identity': claims['sub'],
+                            'rolName': claims.get('rolName'),
+                            'email': claims.get('email'),
+                            'name': claims.get('name'),
+                            'status': claims.get('status')
+                        }
+                    return f(*args, **kwargs)
+
             try:
                 #Send Permission to verify if the user has authorization
-                body = {'permission': permission}
-                response = requests.post(config('AUTH_API_URL') + config('AUTH_API_PORT') + '/auth/verify_auth', json=body, headers={'Authorization': f'JWT {token}'}, timeout=20)
-                
+                status_code, body = verify_remote(token, permission, cache_accepted=not sensitive)
             except Exception as ex:
                 return {'message': "Error in authentication occurred" + str(ex)}, 500
             # If status code is 200, user is valid
-            if response.status_code == 200:
-                try:
-                    user = response.json()["user"]["username"]
-                    if with_args:
-                        kwargs['current_user'] = response.json()["user"]
-                except:
-                    user = None
+            if status_code == 200:
+                if with_args:
+                    kwargs['current_user'] = body.get('data')
                 #log_action(action, user)
                 return f(*args, **kwargs)
-            else:
-                return response.json(), 401
+            # A denial stays 403 and an unavailable auth service 5xx, like the local path; the rest is unauthenticated
+            if status_code == 403 or status_code >= 500:
+                return body, status_code
+            return body, 401
         return catcher
     return decorator
 def generate_verification_code(length=4):
@@ -1,59 +1,338 @@
+import atexit
+import logging
+import os
+import queue
 import smtplib
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from decouple import config
+from models.email_outbox.outbox import EmailOutbox
+from utils.settings import get_settings, on_reload
 
 
-def send_email(recipient_email, code):
+def build_verification_email(recipient_email, code):
     # create a multipart message object
     msg = MIMEMultipart('alternative')
-    msg['FROM'] = config('SENDER_EMAIL')
+    msg['FROM'] = get_settings().sender_email
     msg['TO'] = recipient_email
     msg['Subject'] = 'Verification Code'
-    message = ' Hi ' + recipient_email + ' Your verification Code to activate your account is: ' + str(code) + ' Follow this link http//:localhost:4200/activateAcc to proceed on activating your account' 
+    message = ' Hi ' + recipient_email + ' Your verification Code to activate your account is: ' + str(code) + ' Follow this link http//:localhost:4200/activateAcc to proceed on activating your account'
     # record the MIME type of both parts to be included in message
     part1 = MIMEText(message, 'plain')
     msg.attach(part1)
+    return msg
 
 
-    try:
-        # create a secure SSL connection with server
-        server = smtplib.SMTP(config('SMTP_SERVER'),config('SMTP_PORT'))
-        server.starttls()
-        # Login to your outlook email
-        server.login(config('SENDER_EMAIL'), config('SENDER_EMAIL_PASSWORD'))
-        # send email
-        server.sendmail(config('SENDER_EMAIL'), recipient_email, msg.as_string())
-        print('Email Have been sent!')
-    except smtplib.SMTPException as e:
-        print('Error: unable to send email', str(e))
-    finally:
-        #close connection
-        server.quit()
-
-def send_email_new_password(recipient_email, new_password):
+def build_new_password_email(recipient_email, new_password):
     # Crea un mensaje multipart
     msg = MIMEMultipart('alternative')
-    msg['From'] = config('SENDER_EMAIL')
+    msg['From'] = get_settings().sender_email
     msg['To'] = recipient_email
     msg['Subject'] = 'Your New Password'
-    
+
     # Define el cuerpo del mensaje con la nueva contraseña
     message = f"Hi,\n\nYour password has been successfully reset. Your new password is: {new_password}\n\nPlease use this password to log in and change your password immediately.\n\nBest regards,\nYour Support Team"
     part1 = MIMEText(message, 'plain')
     msg.attach(part1)
+    return msg
+
+
+# Outbox emails store the kind and its fields, the message is built when sending
+EMAIL_BUILDERS = {
+    'verification': lambda recipient, fields: build_verification_email(recipient, fields['code']),
+    'new_password': lambda recipient, fields: build_new_password_email(recipient, fields['new_password']),
+}
+
+
+class _Outgoing:
+    def __init__(self, recipient, message):
+        self.recipient = recipient
+        self.message = message
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+
+def is_transient_error(error):
+    # 4xx replies and dropped connections are worth another try, 5xx replies are final
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    return isinstance(error, (smtplib.SMTPServerDisconnected, OSError))
+
+
+class MailDelivery:
+    """Background delivery of outgoing emails
+
+    Messages wait in a queue of at most `queue_size` entries. Each of the
+    `workers` threads keeps one authenticated SMTP connection open and
+    closes it after `max_idle` seconds without traffic. A transient failure
+    is retried up to `max_attempts` times, waiting `backoff` seconds
+    doubled on every attempt. With zero workers messages are delivered
+    inline by the caller.
+    """
+    def __init__(self, host, port, sender, password, workers=2, queue_size=100, max_attempts=5,
+                 backoff=1.0, max_idle=60, timeout=30, starttls=True, login=True, enqueue_timeout=0.5):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.password = password
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.starttls = starttls
+        self.login = login
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stats = {
+            'enqueued': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'dropped': 0,
+            'connections_opened': 0, 'send_seconds': 0.0, 'queued_seconds': 0.0
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.login:
+                server.login(self.sender, self.password)
+        except Exception:
+            server.close()
+            raise
+        self._count('connections_opened')
+        return server
+
+    @staticmethod
+    def close_connection(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def send_now(self, server, recipient, message):
+        """Send on `server`, connecting when it is None
+
+        Return (connection to keep using or None, error or None)
+        """
+        try:
+            if server is None:
+                server = self._connect()
+            server.sendmail(self.sender, recipient, message.as_string())
+        except Exception as error:
+            return self._recover(server, error), error
+        return server, None
+
+    def _deliver(self, server, outgoing):
+        """Send one message, return (connection to keep using or None, seconds to wait before a retry or None)"""
+        outgoing.attempts += 1
+        started = time.perf_counter()
+        server, error = self.send_now(server, outgoing.recipient, outgoing.message)
+        if error is not None:
+            return server, self._failed(outgoing, error)
+        self._count('sent')
+        self._count('send_seconds', time.perf_counter() - started)
+        self._count('queued_seconds', time.monotonic() - outgoing.enqueued_at)
+        logging.info(f"Email sent to {outgoing.recipient}")
+        return server, None
+
+    def _recover(self, server, error):
+        # A rejected message leaves the session usable, anything else gets a new connection
+        if server is not None and isinstance(error, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+            try:
+                server.rset()
+                return server
+            except Exception:
+                pass
+        if server is not None:
+            self.close_connection(server)
+        return None
+
+    def _failed(self, outgoing, error):
+        """Seconds to wait before retrying `outgoing`, None when it is given up"""
+        if is_transient_error(error) and outgoing.attempts < self.max_attempts:
+            delay = self.backoff * 2 ** (outgoing.attempts - 1)
+            logging.warning(f"Email to {outgoing.recipient} failed ({error}), retry {outgoing.attempts} in {delay}s")
+            self._count('retried')
+            return delay
+        logging.error(f"Error: unable to send email to {outgoing.recipient}: {error}")
+        self._count('failed')
+        return None
+
+    def _requeue(self, outgoing):
+        try:
+            self._queue.put(outgoing, timeout=self.timeout)
+        except queue.Full:
+            logging.error(f"Email queue full, dropping retry for {outgoing.recipient}")
+            self._count('dropped')
+
+    def _run(self):
+        server = None
+        while True:
+            try:
+                outgoing = self._queue.get(timeout=self.max_idle if server is not None else None)
+            except queue.Empty:
+                # Let the server forget us instead of holding an idle connection
+                self.close_connection(server)
+                server = None
+                continue
+            try:
+                server, delay = self._deliver(server, outgoing)
+                if delay is not None:
+                    timer = threading.Timer(delay, self._requeue, (outgoing,))
+                    timer.daemon = True
+                    timer.start()
+            finally:
+                self._queue.task_done()
+
+    def _start(self):
+        # Worker threads don't survive a fork, every process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            for i in range(self.workers):
+                threading.Thread(target=self._run, name=f'mail-delivery-{i}', daemon=True).start()
+            self._pid = os.getpid()
+
+    def send(self, recipient, message, block=False):
+        """Queue a message, return False when it had to be dropped
+
+        With `block` the caller waits for room in the queue instead, for bulk
+        senders that must not drop anything.
+        """
+        outgoing = _Outgoing(recipient, message)
+        if not self.workers:
+            self._count('enqueued')
+            # Retries run here, on the one connection, closed once at the end
+            server = None
+            try:
+                while True:
+                    server, delay = self._deliver(server, outgoing)
+                    if delay is None:
+                        break
+                    time.sleep(delay)
+            finally:
+                if server is not None:
+                    self.close_connection(server)
+            return True
+        self._start()
+        try:
+            self._queue.put(outgoing, timeout=None if block else self.enqueue_timeout)
+        except queue.Full:
+            logging.error(f"Email queue full, dropping email to {recipient}")
+            self._count('dropped')
+            return False
+        self._count('enqueued')
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until the queued messages are handled, True when the queue drained"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['avg_send_seconds'] = stats['send_seconds'] / stats['sent'] if stats['sent'] else None
+        stats['avg_delivery_seconds'] = stats['queued_seconds'] / stats['sent'] if stats['sent'] else None
+        return stats
+
+
+_delivery = None
+_delivery_lock = threading.Lock()
+
+
+def mail_delivery_from_settings(workers):
+    settings = get_settings()
+    return MailDelivery(
+        host=config('SMTP_SERVER'),
+        port=config('SMTP_PORT', cast=int),
+        sender=settings.sender_email,
+        password=settings.sender_email_password,
+        workers=workers,
+        queue_size=config('EMAIL_QUEUE_SIZE', default=100, cast=int),
+        max_attempts=config('EMAIL_MAX_ATTEMPTS', default=5, cast=int),
+        backoff=config('EMAIL_RETRY_BACKOFF_S', default=1.0, cast=float),
+        max_idle=config('SMTP_MAX_IDLE_S', default=60, cast=float),
+        timeout=config('SMTP_TIMEOUT_S', default=30, cast=float),
+        starttls=config('SMTP_STARTTLS', default=True, cast=bool),
+        login=config('SMTP_LOGIN', default=True, cast=bool)
+    )
+
+
+def get_mail_delivery():
+    global _delivery
+    if _delivery is None:
+        with _delivery_lock:
+            if _delivery is None:
+                _delivery = mail_delivery_from_settings(config('EMAIL_WORKERS', default=2, cast=int))
+                # Give queued messages a chance to leave on a clean shutdown
+                atexit.register(_delivery.flush, config('EMAIL_SHUTDOWN_FLUSH_S', default=5, cast=float))
+    return _delivery
+
+
+def use_sender(delivery, settings):
+    # Connections opened from now on log in with the new credentials
+    delivery.sender = settings.sender_email
+    delivery.password = settings.sender_email_password
+
+
+@on_reload
+def _rotate_sender(settings):
+    if _delivery is not None:
+        use_sender(_delivery, settings)
+
+
+def mail_stats():
+    return get_mail_delivery().stats() if _delivery is not None else None
+
+
+def queue_email(kind, recipient_email, fields, session=None):
+    """Hand an email over for delivery
+
+    With EMAIL_DELIVERY=outbox it is stored in the outbox, in the caller's
+    transaction when `session` is given, and sent by email_dispatcher.py.
+    Otherwise it goes to the in-process delivery workers.
+    """
+    if get_settings().email_delivery == 'outbox':
+        EmailOutbox.add(kind, recipient_email, fields, session=session)
+        return True
+    return get_mail_delivery().send(recipient_email, EMAIL_BUILDERS[kind](recipient_email, fields))
+
+
+def queue_emails(kind, recipients_fields):
+    """queue_email for a batch of (recipient, fields), one outbox insert for all of them
+
+    Without the outbox the batch waits for room in the delivery queue, a
+    batch larger than the queue is sent at the pace of the delivery
+    workers instead of being dropped. Returns whether each email was
+    handed over.
+    """
+    if get_settings().email_delivery == 'outbox':
+        EmailOutbox.add_many(kind, recipients_fields)
+        return [True] * len(recipients_fields)
+    delivery = get_mail_delivery()
+    return [delivery.send(recipient, EMAIL_BUILDERS[kind](recipient, fields), block=True) for recipient, fields in recipients_fields]
+
+
+def send_email(recipient_email, code, session=None):
+    return queue_email('verification', recipient_email, {'code': code}, session=session)
 
-    try:
-        # Conéctate al servidor SMTP
-        server = smtplib.SMTP(config('SMTP_SERVER'), config('SMTP_PORT'))
-        server.starttls()
-        # Inicia sesión en tu correo electrónico
-        server.login(config('SENDER_EMAIL'), config('SENDER_EMAIL_PASSWORD'))
-        # Envía el correo electrónico
-        server.sendmail(config('SENDER_EMAIL'), recipient_email, msg.as_string())
-        print('Email has been sent!')
-    except smtplib.SMTPException as e:
-        print('Error: unable to send email', str(e))
-    finally:
-        # Cierra la conexión
-        server.quit()
\ No newline at end of file
+def send_email_new_password(recipient_email, new_password, session=None):
+    return queue_email('new_password', recipient_email, {'new_password': new_password}, session=session)
@@ -1,15 +1,90 @@
 import os
 import base64
-from decouple import config
+import hashlib
+import threading
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes, padding
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from utils.settings import get_settings
+
+# Envelope layout: v1$<key id>$<base64url(record salt + nonce + ciphertext and tag)>
+ENVELOPE_VERSION = 'v1'
+ENVELOPE_SEPARATOR = '$'
+MASTER_KEY_ITERATIONS = 100000
+RECORD_SALT_SIZE = 16
+NONCE_SIZE = 12
+SUBKEY_INFO = b'security-service-api/envelope/v1'
+
+# Master keys derived in this process, keyed by key id and secret digest
+_master_keys = {}
+_master_keys_lock = threading.Lock()
+# (settings snapshot, active key id, {key id: secret})
+_keyring = None
+
+
+def _master_key(key_id, secret):
+    cache_key = (key_id, hashlib.sha256(secret).digest())
+    key = _master_keys.get(cache_key)
+    if key is None:
+        with _master_keys_lock:
+            key = _master_keys.get(cache_key)
+            if key is None:
+                # The expensive derivation runs once per key and process
+                kdf = PBKDF2HMAC(
+                    algorithm=hashes.SHA256(),
+                    length=32,
+                    salt=b'security-service-api/master/' + key_id.encode(),
+                    iterations=MASTER_KEY_ITERATIONS,
+                    backend=default_backend()
+                )
+                key = kdf.derive(secret)
+                _master_keys[cache_key] = key
+    return key
+
+
+def _record_key(master_key, record_salt):
+    # Cheap per-record subkey, one HMAC based expansion
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=record_salt,
+        info=SUBKEY_INFO,
+        backend=default_backend()
+    ).derive(master_key)
+
+
+def _load_keys():
+    """Return (active key id, {key id: secret}) from the settings
+
+    ENCRYPTION_PASSWORD is the active key, named by ENCRYPTION_KEY_ID.
+    ENCRYPTION_RETIRED_KEYS lists older keys as "kid:secret,kid:secret",
+    they are only used to decrypt. The key ring is built once per settings
+    snapshot and shared by every EncryptionUtil.
+    """
+    global _keyring
+    settings = get_settings()
+    keyring = _keyring
+    if keyring is not None and keyring[0] is settings:
+        return keyring[1], keyring[2]
+    active_key_id = settings.encryption_key_id
+    keys = {active_key_id: settings.encryption_password.encode()}
+    for key_id, secret in settings.encryption_retired_keys:
+        keys.setdefault(key_id, secret.encode())
+    for key_id in keys:
+        if not key_id or ENVELOPE_SEPARATOR in key_id:
+            raise ValueError(f"Invalid encryption key id: {key_id!r}")
+    _keyring = (settings, active_key_id, keys)
+    return active_key_id, keys
+
 
 class EncryptionUtil:
     def __init__(self):
-        # Retrieve the password from an environment variable
-        self.password = config('ENCRYPTION_PASSWORD').encode()
+        # Key ring of the current settings snapshot
+        self.key_id, self.keys = _load_keys()
+        self.password = self.keys[self.key_id]
 
     def encrypt(self, data):
         # Check if the input data is a non-empty string
@@ -17,46 +92,85 @@ class EncryptionUtil:
             raise ValueError("Input data must be a non-empty string.")
 
         try:
-            # Convert data to bytes
-            data = data.encode()
-            # Apply PKCS7 padding to the data
-            padder = padding.PKCS7(algorithms.AES.block_size).padder()
-            padded_data = padder.update(data) + padder.finalize()
-
-            # Generate a unique salt for each encryption
-            salt = os.urandom(16)
-
-            # Derive a key from the password using PBKDF2HMAC with SHA256
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=salt,
-                iterations=100000,
-                backend=default_backend()
-            )
-            key = kdf.derive(self.password)
-
-            # Generate a random IV (Initialization Vector)
-            iv = os.urandom(16)
-            # Create a Cipher object with the derived key and IV
-            cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
-            encryptor = cipher.encryptor()
-            # Encrypt the padded data
-            ct = encryptor.update(padded_data) + encryptor.finalize()
-
-            # Concatenate salt, IV, and ciphertext
-            encrypted_data = salt + iv + ct
-            # Encode the result to base64 for safe transmission/storage
-            return base64.urlsafe_b64encode(encrypted_data).decode('utf-8')
+            master_key = _master_key(self.key_id, self.password)
+            return self._seal(master_key, data)
+        except Exception as e:
+            raise Exception(f"Encryption failed: {str(e)}")
 
+    def encrypt_many(self, values):
+        """Encrypt a list of strings, the master key is derived only once"""
+        for data in values:
+            if not isinstance(data, str) or not data:
+                raise ValueError("Input data must be a non-empty string.")
+        try:
+            master_key = _master_key(self.key_id, self.password)
+            return [self._seal(master_key, data) for data in values]
         except Exception as e:
             raise Exception(f"Encryption failed: {str(e)}")
 
+    def _seal(self, master_key, data):
+        # Each record gets its own salt, subkey and nonce
+        record_salt = os.urandom(RECORD_SALT_SIZE)
+        nonce = os.urandom(NONCE_SIZE)
+        header = f"{ENVELOPE_VERSION}{ENVELOPE_SEPARATOR}{self.key_id}{ENVELOPE_SEPARATOR}"
+        # The header is authenticated so the key id can't be swapped
+        ct = AESGCM(_record_key(master_key, record_salt)).encrypt(nonce, data.encode(), header.encode())
+        return header + base64.urlsafe_b64encode(record_salt + nonce + ct).decode('utf-8')
+
     def decrypt(self, encrypted_data):
         # Check if the input encrypted data is a non-empty string
         if not isinstance(encrypted_data, str) or not encrypted_data:
             raise ValueError("Input encrypted data must be a non-empty string.")
 
+        if not is_envelope(encrypted_data):
+            return self._decrypt_legacy(encrypted_data)
+
+        try:
+            version, key_id, payload = encrypted_data.split(ENVELOPE_SEPARATOR, 2)
+            secret = self.keys.get(key_id)
+            if secret is None:
+                raise Exception(f"Unknown key id: {key_id}")
+            raw = base64.urlsafe_b64decode(payload.encode('utf-8'))
+            record_salt = raw[:RECORD_SALT_SIZE]
+            nonce = raw[RECORD_SALT_SIZE:RECORD_SALT_SIZE + NONCE_SIZE]
+            ct = raw[RECORD_SALT_SIZE + NONCE_SIZE:]
+            header = f"{version}{ENVELOPE_SEPARATOR}{key_id}{ENVELOPE_SEPARATOR}"
+            subkey = _record_key(_master_key(key_id, secret), record_salt)
+            return AESGCM(subkey).decrypt(nonce, ct, header.encode()).decode('utf-8')
+        except Exception as e:
+            raise Exception(f"Decryption failed: {str(e)}")
+
+    def decrypt_many(self, values):
+        """Decrypt a list of envelopes or legacy blobs, master keys are derived once per key id"""
+        return [self.decrypt(encrypted_data) for encrypted_data in values]
+
+    def needs_rotation(self, encrypted_data):
+        """True for legacy blobs and envelopes sealed with another key than the active one"""
+        if not is_envelope(encrypted_data):
+            return True
+        return encrypted_data.split(ENVELOPE_SEPARATOR, 2)[1] != self.key_id
+
+    def rotate(self, encrypted_data):
+        """Re-encrypt a value with the active key, unchanged if it already uses it"""
+        if not self.needs_rotation(encrypted_data):
+            return encrypted_data
+        return self.encrypt(self.decrypt(encrypted_data))
+
+    def rotate_many(self, values):
+        return [self.rotate(encrypted_data) for encrypted_data in values]
+
+    def _decrypt_legacy(self, encrypted_data):
+        # Layout written before the envelope: base64url(salt + IV + AES-CBC ciphertext)
+        last_error = None
+        # The blob has no key id, try the active key first and then the retired ones
+        for secret in [self.password] + [s for k, s in self.keys.items() if k != self.key_id]:
+            try:
+                return self._decrypt_legacy_with(encrypted_data, secret)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    def _decrypt_legacy_with(self, encrypted_data, secret):
         try:
             # Decode the base64 encoded encrypted data
             encrypted_data = base64.urlsafe_b64decode(encrypted_data.encode('utf-8'))
@@ -73,7 +187,7 @@ class EncryptionUtil:
                 iterations=100000,
                 backend=default_backend()
             )
-            key = kdf.derive(self.password)
+            key = kdf.derive(secret)
 
             # Create a Cipher object with the derived key and extracted IV
             cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
@@ -99,3 +213,8 @@ class EncryptionUtil:
             return plain_password == decrypted_password
         except Exception as e:
             return False
+
+
+def is_envelope(encrypted_data):
+    # The legacy base64url layout never contains the separator
+    return encrypted_data.startswith(ENVELOPE_VERSION + ENVELOPE_SEPARATOR)
@@ -0,0 +1,45 @@
+from validate_email import validate_email
+from utils.password_hasher import password_length_error
+from utils.message_codes import INVALID_EMAIL_DOMAIN, INVALID_NAME, INVALID_PASSWORD
+from utils.server_response import ServerResponse, StatusCode
+
+ENROLLMENT_DOMAINS = ('utn.ac.cr', 'est.utn.ac.cr', 'adm.utn.ac.cr')
+
+
+def enrollment_error(name, email, password):
+    """422 ServerResponse for the first enrollment rule the fields break, None when they are valid
+
+    Shared by /user/enrollment and the bulk import.
+    """
+    if not email or not validate_email(email):
+        return ServerResponse(
+            message="The provided email is not valid",
+            message_code=INVALID_EMAIL_DOMAIN,
+            status=StatusCode.UNPROCESSABLE_ENTITY
+        )
+    if not any(domain in email for domain in ENROLLMENT_DOMAINS):
+        return ServerResponse(
+            message="The entered domain does not meet the established standards",
+            message_code=INVALID_EMAIL_DOMAIN,
+            status=StatusCode.UNPROCESSABLE_ENTITY
+        )
+    if not name or len(name.strip()) < 2:
+        return ServerResponse(
+            message="The name does not meet the established standards",
+            message_code=INVALID_NAME,
+            status=StatusCode.UNPROCESSABLE_ENTITY
+        )
+    if not password or len(password) < 8:
+        return ServerResponse(
+            message="The password does not meet the established standards",
+            message_code=INVALID_PASSWORD,
+            status=StatusCode.UNPROCESSABLE_ENTITY
+        )
+    length_error = password_length_error(password)
+    if length_error:
+        return ServerResponse(
+            message=length_error,
+            message_code=INVALID_PASSWORD,
+            status=StatusCode.UNPROCESSABLE_ENTITY
+        )
+    return None
@@ -1,22 +1,256 @@
 import jwt
-from datetime import datetime, timedelta
-from decouple import config
+import logging
+import base64
+import hashlib
+import json
+import threading
+import time
+import uuid
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed448, ed25519, rsa
+from jwt.algorithms import HMACAlgorithm, get_default_algorithms
+from jwt.api_jws import PyJWS
+from jwt.api_jwt import PyJWT
+from models.revoked_token.revocation_list import get_revocation_list
+from utils.settings import get_settings
 
-def generate_jwt(identity, rolName, email, name, status):
+TOKEN_LIFETIME = 30 * 60
+EC_ALGORITHMS = {'secp256r1': 'ES256', 'secp384r1': 'ES384', 'secp521r1': 'ES512'}
+
+
+class PreparedHMAC(HMACAlgorithm):
+    """HMAC whose secrets are checked once, PyJWT validates the secret again on every call"""
+    def __init__(self, hash_alg):
+        super().__init__(hash_alg)
+        self._prepared = {}
+
+    def prepare_key(self, key):
+        prepared = self._prepared.get(key)
+        if prepared is None:
+            prepared = super().prepare_key(key)
+            # Only the keyring secrets get here, a rotation adds one entry
+            self._prepared[key] = prepared
+        return prepared
+
+
+# Signatures only, with the prepared HMAC secrets, the claims are checked by _check_claims
+_jws = PyJWS()
+_jws.unregister_algorithm('HS256')
+_jws.register_algorithm('HS256', PreparedHMAC(HMACAlgorithm.SHA256))
+# PyJWT's own claim validation, run on the payload _jws verified
+_jwt = PyJWT()
+_CLAIM_OPTIONS = {**_jwt.options, 'require': ['exp', 'sub']}
+
+
+def _algorithm_of(key):
+    if isinstance(key, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey, ed448.Ed448PrivateKey, ed448.Ed448PublicKey)):
+        return 'EdDSA'
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)) and key.curve.name in EC_ALGORITHMS:
+        return EC_ALGORITHMS[key.curve.name]
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return 'RS256'
+    raise ValueError(f"Unsupported key type {type(key).__name__}")
+
+
+class JwtKey:
+    """One key of the keyring, parsed once
+
+    HMAC keys hold the secret as bytes. Asymmetric keys hold the
+    cryptography key objects, a retiring key can be a public key only. Its
+    public half is published as a JWK.
+    """
+    def __init__(self, algorithm, key, kid=None, active=False):
+        self.algorithm = algorithm
+        self.active = active
+        if algorithm == 'HS256':
+            self.private_key = self.public_key = key
+            default_kid = hashlib.sha256(b'security-service-api/kid/' + key).hexdigest()[:16]
+        else:
+            self.private_key = key if hasattr(key, 'public_key') else None
+            self.public_key = key.public_key() if self.private_key else key
+            public_der = self.public_key.public_bytes(
+                serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+            )
+            default_kid = hashlib.sha256(public_der).hexdigest()[:16]
+        self.kid = kid or default_kid
+
+    @property
+    def publishable(self):
+        return self.algorithm != 'HS256'
+
+    def to_jwk(self):
+        jwk = get_default_algorithms()[self.algorithm].to_jwk(self.public_key, as_dict=True)
+        jwk.update({'kid': self.kid, 'alg': self.algorithm, 'use': 'sig'})
+        return jwk
+
+    def describe(self):
+        return {'kid': self.kid, 'alg': self.algorithm, 'active': self.active}
+
+
+class Keyring:
+    """The key that signs new tokens and every key that still verifies them, by kid"""
+    def __init__(self, keys):
+        self.keys = {}
+        for key in keys:
+            if key.kid in self.keys:
+                raise ValueError(f"Duplicate JWT key id {key.kid}")
+            self.keys[key.kid] = key
+        self.signing_key = next(key for key in keys if key.active)
+        self._signing_headers = {'kid': self.signing_key.kid}
+
+    def candidates(self, header):
+        """Keys to try on a token, the one named by its kid or, for tokens issued before kids, those of its alg"""
+        kid = header.get('kid')
+        if kid is not None:
+            key = self.keys.get(kid)
+            return [key] if key is not None and key.algorithm == header.get('alg') else []
+        return [key for key in self.keys.values() if key.algorithm == header.get('alg')]
+
+    def sign(self, payload):
+        signing_key = self.signing_key
+        return _jws.encode(
+            json.dumps(payload, separators=(',', ':')).encode(), signing_key.private_key,
+            algorithm=signing_key.algorithm, headers=self._signing_headers
+        )
+
+    def verify(self, token):
+        """Claims of a token signed by one of the keys, raise jwt.InvalidTokenError otherwise"""
+        candidates = self.candidates(_unverified_header(token))
+        if not candidates:
+            raise jwt.InvalidTokenError("Unknown key id")
+        error = None
+        for key in candidates:
+            try:
+                decoded = _jws.decode_complete(token, key.public_key, algorithms=[key.algorithm])
+            except jwt.InvalidSignatureError as ex:
+                # Only tokens without a kid have more than one candidate
+                error = ex
+                continue
+            try:
+                payload = json.loads(decoded['payload'])
+            except ValueError as ex:
+                raise jwt.DecodeError(f"Invalid payload: {ex}")
+            return _check_claims(payload)
+        raise error
+
+    def jwks(self):
+        return {'keys': [key.to_jwk() for key in self.keys.values() if key.publishable]}
+
+
+def _load_pem(pem):
+    data = pem.encode()
+    if b'PRIVATE KEY' in data:
+        return serialization.load_pem_private_key(data, password=None)
+    return serialization.load_pem_public_key(data)
+
+
+def _load_private_key(settings):
+    pem = settings.jwt_private_key
+    if not pem and settings.jwt_private_key_file:
+        with open(settings.jwt_private_key_file) as key_file:
+            pem = key_file.read()
+    if not pem:
+        raise ValueError(f"JWT_PRIVATE_KEY or JWT_PRIVATE_KEY_FILE is required for {settings.jwt_algorithm}")
+    return serialization.load_pem_private_key(pem.encode(), password=None)
+
+
+def build_keyring(settings):
+    """Keyring of a settings snapshot
+
+    JWT_ALGORITHM picks the signing key: JWT_SECRET_KEY for HS256, the
+    private key of JWT_PRIVATE_KEY(_FILE) otherwise, named by JWT_KEY_ID.
+    JWT_SECRET_KEY keeps verifying when it doesn't sign. JWT_RETIRING_KEYS
+    ("kid:secret,...") and JWT_RETIRING_KEY_FILES ("kid:path.pem,...")
+    only verify, and the asymmetric ones are published.
+    """
+    hmac_active = settings.jwt_algorithm == 'HS256'
+    keys = [JwtKey('HS256', settings.jwt_secret_key.encode(),
+                   kid=(settings.jwt_key_id or None) if hmac_active else None, active=hmac_active)]
+    if not hmac_active:
+        keys.append(JwtKey(settings.jwt_algorithm, _load_private_key(settings), kid=settings.jwt_key_id or None, active=True))
+    for kid, secret in settings.jwt_retiring_keys:
+        keys.append(JwtKey('HS256', secret.encode(), kid=kid))
+    for kid, path in settings.jwt_retiring_key_files:
+        with open(path) as key_file:
+            key = _load_pem(key_file.read())
+        keys.append(JwtKey(_algorithm_of(key), key, kid=kid))
+    return Keyring(keys)
+
+
+# (settings snapshot, Keyring built from it)
+_keyring = None
+_keyring_lock = threading.Lock()
+
+
+def get_keyring():
+    """Keyring of the current settings, built once per snapshot so a reload picks up rotated keys"""
+    global _keyring
+    settings = get_settings()
+    keyring = _keyring
+    if keyring is None or keyring[0] is not settings:
+        with _keyring_lock:
+            keyring = _keyring
+            if keyring is None or keyring[0] is not settings:
+                keyring = _keyring = (settings, build_keyring(settings))
+    return keyring[1]
+
+
+def get_jwks():
+    """Public keys that consumers can use to verify tokens locally"""
+    return get_keyring().jwks()
+
+
+def jwt_key_stats():
+    """Key ids and algorithms of the keyring, without the keys"""
+    return [key.describe() for key in get_keyring().keys.values()]
+
+
+def _unverified_header(token):
+    # Only the first segment, the signature is checked by the key it names
+    try:
+        segment = token.split('.', 1)[0].encode()
+        header = json.loads(base64.urlsafe_b64decode(segment + b'=' * (-len(segment) % 4)))
+    except (ValueError, TypeError) as ex:
+        raise jwt.DecodeError(f"Invalid header: {ex}")
+    if not isinstance(header, dict):
+        raise jwt.DecodeError("Invalid header")
+    return header
+
+
+def _check_claims(payload):
+    # Same checks as jwt.decode: exp, nbf, iat, aud and our issuer, with exp and sub required
+    if not isinstance(payload, dict):
+        raise jwt.DecodeError("Invalid payload")
+    _jwt._validate_claims(payload, _CLAIM_OPTIONS, issuer=get_settings().jwt_issuer)
+    return payload
+
+
+def _decode(token):
+    return get_keyring().verify(token)
+
+
+def generate_jwt(identity, rolName, email, name, status, permissions=None):
     """
     Generate a JSON Web Token (JWT) for the given identity with additional details
+    The role permissions, when given, let consumers authorize without calling verify_auth
+    The jti claim identifies the token so it can be revoked
+    The token is signed by the active key of the keyring and names it in its kid header
     """
+    now = int(time.time())
     payload = {
-        'exp': datetime.utcnow() + timedelta(minutes=30), 
-        'iat': datetime.utcnow(),
+        'exp': now + TOKEN_LIFETIME,
+        'iat': now,
+        'iss': get_settings().jwt_issuer,
+        'jti': uuid.uuid4().hex,
         'sub': identity,
         'rolName': rolName,
         'email': email,
         'name': name,
         'status': status
     }
-    token = jwt.encode(payload, config('JWT_SECRET_KEY'), algorithm='HS256')
-    return token
+    if permissions is not None:
+        payload['permissions'] = sorted(permissions)
+    return get_keyring().sign(payload)
 
 def validate_jwt(token):
     """
@@ -24,13 +258,16 @@ def validate_jwt(token):
     """
     try:
         token = token.replace("Bearer", "").strip()  # Remove 'Bearer' prefix if present
-        payload = jwt.decode(token, config('JWT_SECRET_KEY'), algorithms=['HS256'])
+        payload = _decode(token)
+        if 'jti' in payload and get_revocation_list().is_revoked(payload['jti']):
+            logging.debug("JWT has been revoked")
+            return None
         return {
             'identity': payload['sub'],
             'rolName': payload.get('rolName'),
             'email': payload.get('email'),
             'name': payload.get('name'),
-            'status': payload.get('status') 
+            'status': payload.get('status')
         }
     except jwt.ExpiredSignatureError:
         print("JWT has expired")
@@ -39,9 +276,30 @@ def validate_jwt(token):
         print("Invalid JWT token")
         return None
 
+def decode_revocable(token):
+    """
+    Return the claims of a valid token that can be revoked, None otherwise
+    """
+    try:
+        payload = _decode(token.replace("Bearer", "").strip())
+    except jwt.InvalidTokenError:
+        return None
+    # Tokens issued before they carried an id stay valid until exp
+    return payload if 'jti' in payload else None
+
+def revoke_token(token):
+    """
+    Revoke a valid token until it expires, return False when there is nothing to revoke
+    """
+    payload = decode_revocable(token)
+    if payload is None:
+        return False
+    get_revocation_list().revoke(payload['jti'], payload['exp'])
+    return True
+
 def get_jwt_identity(token):
     """
     Get the identity from a valid JWT
     """
-    payload = jwt.decode(token, config('JWT_SECRET_KEY'), algorithms=['HS256'])
+    payload = _decode(token)
     return payload['sub']
@@ -0,0 +1,194 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from decouple import config
+from utils.server_response import ServerResponse, StatusCode
+from utils.message_codes import SERVER_BUSY
+
+
+class KdfPoolSaturated(Exception):
+    """Raised when the KDF executor has no free slot, the request should be rejected fast"""
+    def __init__(self, message="KDF executor is saturated", retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _timed_call(fn, submitted_at, args):
+    # Runs in the pool process, wall clock time is comparable across processes
+    started_at = time.time()
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, started_at - submitted_at, time.perf_counter() - start
+
+
+class KdfExecutor:
+    """Size-limited executor for CPU bound key derivation work
+
+    At most `workers` calls run at the same time and `queue_depth` more may
+    wait for a worker. Any call beyond that raises KdfPoolSaturated right
+    away instead of queueing behind the others. With `workers` set to 0 the
+    calls run inline on the request thread, still bounded by `queue_depth`.
+    """
+    def __init__(self, workers, queue_depth, timeout, start_method='spawn'):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self.start_method = start_method
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + queue_depth)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'calls': 0,
+            'rejected': 0,
+            'timeouts': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0,
+            'compute_ms_total': 0.0,
+            'compute_ms_max': 0.0,
+            'in_flight': 0
+        }
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context(self.start_method)
+                    )
+        return self._pool
+
+    def _record(self, fn, wait, compute):
+        wait_ms = wait * 1000
+        compute_ms = compute * 1000
+        with self._stats_lock:
+            self._stats['calls'] += 1
+            self._stats['wait_ms_total'] += wait_ms
+            self._stats['wait_ms_max'] = max(self._stats['wait_ms_max'], wait_ms)
+            self._stats['compute_ms_total'] += compute_ms
+            self._stats['compute_ms_max'] = max(self._stats['compute_ms_max'], compute_ms)
+        logging.debug(f"KDF call {fn.__name__}: wait {wait_ms:.1f}ms, compute {compute_ms:.1f}ms")
+
+    def _release(self):
+        with self._stats_lock:
+            self._stats['in_flight'] -= 1
+        self._slots.release()
+
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self._stats['rejected'] += 1
+            raise KdfPoolSaturated()
+        with self._stats_lock:
+            self._stats['in_flight'] += 1
+
+    def _submit(self, fn, args):
+        try:
+            future = self._get_pool().submit(_timed_call, fn, time.time(), args)
+        except BrokenProcessPool:
+            self._release()
+            self.shutdown()
+            raise
+        except Exception:
+            self._release()
+            raise
+        # The slot is held until the work is really done, even if the caller gave up waiting
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def run(self, fn, *args):
+        """Run fn(*args) on the executor and return its result
+
+        fn must be a module level function so it can be sent to the pool.
+        """
+        self._acquire()
+
+        if self.workers == 0:
+            try:
+                result, wait, compute = _timed_call(fn, time.time(), args)
+            finally:
+                self._release()
+            self._record(fn, wait, compute)
+            return result
+
+        future = self._submit(fn, args)
+
+        try:
+            result, wait, compute = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._stats_lock:
+                self._stats['timeouts'] += 1
+            raise KdfPoolSaturated("KDF call timed out waiting for the executor")
+        except BrokenProcessPool:
+            self.shutdown()
+            raise
+        self._record(fn, wait, compute)
+        return result
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        calls = stats['calls'] or 1
+        stats['wait_ms_avg'] = stats['wait_ms_total'] / calls
+        stats['compute_ms_avg'] = stats['compute_ms_total'] / calls
+        stats['workers'] = self.workers
+        stats['queue_depth'] = self.queue_depth
+        return stats
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_kdf_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = KdfExecutor(
+                    workers=config('KDF_EXECUTOR_WORKERS', default=2, cast=int),
+                    queue_depth=config('KDF_EXECUTOR_QUEUE_DEPTH', default=8, cast=int),
+                    timeout=config('KDF_EXECUTOR_TIMEOUT_S', default=10, cast=float),
+                    start_method=config('KDF_EXECUTOR_START_METHOD', default='spawn')
+                )
+    return _executor
+
+
+def saturated_server_response(error):
+    return ServerResponse(
+        message="The server is busy, please retry later",
+        message_code=SERVER_BUSY,
+        status=StatusCode.SERVICE_UNAVAILABLE,
+        headers={'Retry-After': str(error.retry_after)}
+    )
+
+
+def saturated_response(error):
+    """Fast 503 returned by the endpoints when the KDF executor rejects a call"""
+    return saturated_server_response(error).to_response()
+
+
+def kdf_stats():
+    return get_kdf_executor().stats()
+
+
+def _reset_after_fork():
+    # Pool processes and locks of the parent are not usable in a forked worker
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -9,6 +9,7 @@ INVALID_CREDENTIALS = 'INVALID_CREDENTIALS'
 DECRYPTION_ERROR = 'DECRYPTION_ERROR'
 USER_NOT_ACTIVE = 'USER_NOT_ACTIVE'
 USER_AUTHENTICATED = 'USER_AUTHENTICATED'
+PERMISSION_DENIED = 'PERMISSION_DENIED'
 USER_ALREADY_REGISTERED_GENERATING_NEW_CODE = "USER_ALREADY_REGISTERED_GENERATING_NEW_CODE"
 USER_ALREADY_REGISTERED = "USER_ALREADY_REGISTERED"
 USER_SUCCESSFULLY_CREATED = "USER_SUCCESSFULLY_CREATED"
@@ -25,10 +26,21 @@ CONFLICT_MSG = 'CONFLICT_MSG'
 UNPROCESSABLE_ENTITY_MSG = 'UNPROCESSABLE_ENTITY_MSG'
 INTERNAL_SERVER_ERROR_MSG = 'INTERNAL_SERVER_ERROR_MSG'
 SERVER_TIMEOUT_MSG = 'SERVER_TIMEOUT_MSG'
+SERVER_BUSY = 'SERVER_BUSY'
+PERMISSIONS_UNAVAILABLE = 'PERMISSIONS_UNAVAILABLE'
+TOO_MANY_REQUESTS = 'TOO_MANY_REQUESTS'
+INVALID_IDEMPOTENCY_KEY = 'INVALID_IDEMPOTENCY_KEY'
+IDEMPOTENCY_KEY_REUSED = 'IDEMPOTENCY_KEY_REUSED' # Same Idempotency-Key sent with another body
+IDEMPOTENCY_KEY_IN_PROGRESS = 'IDEMPOTENCY_KEY_IN_PROGRESS' # The first request with the key has not finished
 NO_DATA = 'NO_DATA'
 
 # Common Validations Messages
 INVALID_ID = 'INVALID_ID' # Invalid Id
+INVALID_FIELDS = 'INVALID_FIELDS' # A field of the request has the wrong type
+DUPLICATE_ROW = 'DUPLICATE_ROW' # The email appears earlier in an imported file
+INVALID_IMPORT_FORMAT = 'INVALID_IMPORT_FORMAT' # The import body is neither CSV nor JSON lines
+IMPORT_TOO_LARGE = 'IMPORT_TOO_LARGE'
+IMPORT_UNAVAILABLE = 'IMPORT_UNAVAILABLE' # The sync profile would kill the worker during the import
 
 # Health Validations Messages
 HEALTH_NOT_FOUND = 'HEALTH_NOT_FOUND' # Health not found
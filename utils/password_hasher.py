@@ -0,0 +1,244 @@
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import threading
+import time
+import bcrypt
+from decouple import config
+from utils.encryption_utils import EncryptionUtil
+from utils.kdf_executor import get_kdf_executor
+
+
+def _b64encode(raw):
+    return base64.b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _b64decode(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+class BcryptHasher:
+    """bcrypt, cost is the log2 of the rounds"""
+    name = 'bcrypt'
+    default_cost = 12
+    min_cost = 10
+    max_cost = 16
+    prefixes = ('$2b$', '$2a$', '$2y$')
+    # bcrypt only uses the first 72 bytes, longer passwords are refused by password_length_error
+    max_password_bytes = 72
+
+    def hash(self, password, cost):
+        encoded = password.encode('utf-8')
+        if len(encoded) > self.max_password_bytes:
+            raise ValueError(f"bcrypt passwords are limited to {self.max_password_bytes} bytes")
+        return bcrypt.hashpw(encoded, bcrypt.gensalt(rounds=cost)).decode('ascii')
+
+    def verify(self, password, hashed):
+        # Hashes stored before the limit was enforced were made from the first 72 bytes
+        return bcrypt.checkpw(password.encode('utf-8')[:self.max_password_bytes], hashed.encode('ascii'))
+
+    def cost_of(self, hashed):
+        return int(hashed.split('$')[2])
+
+    def next_cost(self, cost):
+        return cost + 1
+
+
+class Pbkdf2Hasher:
+    """PBKDF2-HMAC-SHA256, cost is the iteration count
+
+    Stored as $pbkdf2-sha256$<iterations>$<salt>$<hash>
+    """
+    name = 'pbkdf2_sha256'
+    default_cost = 600000
+    min_cost = 100000
+    max_cost = 10000000
+    prefixes = ('$pbkdf2-sha256$',)
+
+    def hash(self, password, cost):
+        salt = os.urandom(16)
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, cost)
+        return f"$pbkdf2-sha256${cost}${_b64encode(salt)}${_b64encode(digest)}"
+
+    def verify(self, password, hashed):
+        _, _, iterations, salt, expected = hashed.split('$')
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), _b64decode(salt), int(iterations))
+        return hmac.compare_digest(digest, _b64decode(expected))
+
+    def cost_of(self, hashed):
+        return int(hashed.split('$')[2])
+
+    def next_cost(self, cost):
+        return cost * 2
+
+
+class ScryptHasher:
+    """scrypt with r=8 and p=1, cost is the log2 of N
+
+    Stored as $scrypt$<log2 N>$<salt>$<hash>
+    """
+    name = 'scrypt'
+    default_cost = 15
+    min_cost = 14
+    max_cost = 20
+    prefixes = ('$scrypt$',)
+    block_size = 8
+    parallelism = 1
+
+    def _derive(self, password, salt, cost):
+        n = 1 << cost
+        return hashlib.scrypt(
+            password.encode('utf-8'), salt=salt, n=n, r=self.block_size, p=self.parallelism,
+            maxmem=256 * n * self.block_size, dklen=32
+        )
+
+    def hash(self, password, cost):
+        salt = os.urandom(16)
+        return f"$scrypt${cost}${_b64encode(salt)}${_b64encode(self._derive(password, salt, cost))}"
+
+    def verify(self, password, hashed):
+        _, _, cost, salt, expected = hashed.split('$')
+        return hmac.compare_digest(self._derive(password, _b64decode(salt), int(cost)), _b64decode(expected))
+
+    def cost_of(self, hashed):
+        return int(hashed.split('$')[2])
+
+    def next_cost(self, cost):
+        return cost + 1
+
+
+HASHERS = {hasher.name: hasher for hasher in (BcryptHasher(), Pbkdf2Hasher(), ScryptHasher())}
+
+_policy = None
+_policy_lock = threading.Lock()
+
+
+def identify(stored_password):
+    """Return the hasher of a stored value or None for the legacy reversible format"""
+    if stored_password.startswith('$'):
+        for hasher in HASHERS.values():
+            if stored_password.startswith(hasher.prefixes):
+                return hasher
+    return None
+
+
+def calibrate(algorithm, target_ms):
+    """Pick the highest cost of `algorithm` whose hash time stays within `target_ms`
+
+    The result is never below the minimum cost of the algorithm.
+    """
+    hasher = HASHERS[algorithm]
+    cost = hasher.min_cost
+    while cost < hasher.max_cost:
+        start = time.perf_counter()
+        hasher.hash('calibration-password', cost)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        next_cost = hasher.next_cost(cost)
+        # Every step doubles the work
+        if elapsed_ms * 2 > target_ms:
+            break
+        cost = min(next_cost, hasher.max_cost)
+    return cost
+
+
+def configure(algorithm=None, cost=None, target_ms=None):
+    """Set the scheme used for new hashes
+
+    When no cost is given it is calibrated against target_ms, or the
+    algorithm default is used when there is no target either.
+    """
+    global _policy
+    algorithm = algorithm or config('PASSWORD_HASH_ALGORITHM', default='bcrypt')
+    if algorithm not in HASHERS:
+        raise ValueError(f"Unknown password hash algorithm: {algorithm}")
+    hasher = HASHERS[algorithm]
+    if cost is None:
+        cost = config('PASSWORD_HASH_COST', default=0, cast=int) or None
+    if cost is None:
+        if target_ms is None:
+            target_ms = config('PASSWORD_HASH_TARGET_MS', default=0, cast=int)
+        if target_ms:
+            cost = calibrate(algorithm, target_ms)
+            logging.info(f"Password hashing calibrated to {algorithm} cost {cost} for {target_ms}ms")
+        else:
+            cost = hasher.default_cost
+    with _policy_lock:
+        _policy = (hasher, cost)
+    return algorithm, cost
+
+
+def _current_policy():
+    if _policy is None:
+        configure()
+    return _policy
+
+
+def password_length_error(password):
+    """Message when the current scheme can't use all of `password`, None otherwise"""
+    hasher, _ = _current_policy()
+    limit = getattr(hasher, 'max_password_bytes', None)
+    if limit and len(password.encode('utf-8')) > limit:
+        return f"The password must be at most {limit} bytes long."
+    return None
+
+
+def _hash_with(algorithm, cost, password):
+    return HASHERS[algorithm].hash(password, cost)
+
+
+def _verify_with(password, stored_password):
+    hasher = identify(stored_password)
+    try:
+        if hasher is None:
+            # Records written before the hashing scheme hold a reversible ciphertext
+            return EncryptionUtil().verify_password(password, stored_password)
+        return hasher.verify(password, stored_password)
+    except Exception as e:
+        logging.warning(f"Password verification failed: {str(e)}")
+        return False
+
+
+def hash_password(password):
+    """Hash with the current scheme on the KDF executor, may raise KdfPoolSaturated"""
+    if not isinstance(password, str) or not password:
+        raise ValueError("Password must be a non-empty string.")
+    hasher, cost = _current_policy()
+    return get_kdf_executor().run(_hash_with, hasher.name, cost, password)
+
+
+def verify_password(password, stored_password):
+    """Verify on the KDF executor, may raise KdfPoolSaturated"""
+    if not password or not stored_password:
+        return False
+    return get_kdf_executor().run(_verify_with, password, stored_password)
+
+
+def _hash_many(algorithm, cost, passwords):
+    return [_hash_with(algorithm, cost, password) for password in passwords]
+
+
+def hash_passwords(passwords, pool=None, parts=1):
+    """Hash a batch with the current scheme, for bulk work
+
+    The batch is split in `parts` chunks run on `pool`, a concurrent.futures
+    executor of the caller, or inline without one. It never goes through the
+    KDF executor so a bulk job doesn't take the slots of the requests.
+    """
+    hasher, cost = _current_policy()
+    if pool is None or not passwords:
+        return _hash_many(hasher.name, cost, passwords)
+    size = -(-len(passwords) // max(parts, 1))
+    chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+    results = pool.map(_hash_many, [hasher.name] * len(chunks), [cost] * len(chunks), chunks)
+    return [hashed for chunk in results for hashed in chunk]
+
+
+def needs_rehash(stored_password):
+    """True when the stored value is weaker than, or different from, the current scheme"""
+    hasher, cost = _current_policy()
+    stored_hasher = identify(stored_password)
+    if stored_hasher is not hasher:
+        return True
+    return stored_hasher.cost_of(stored_password) < cost
@@ -1,4 +1,7 @@
+from utils.password_hasher import password_length_error
+
+
 def validate_password(password):
     if len(password) < 8:
         return "The password must be at least 8 characters long."
-    return None
+    return password_length_error(password)
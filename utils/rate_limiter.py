@@ -0,0 +1,337 @@
+"""
+Sliding-window rate limits shared by the workers of a host
+
+The endpoints that cost KDF work (login, password change and reset,
+enrollment) check three limits before touching Mongo or the KDF executor:
+    global   requests of the host, RATE_LIMIT_GLOBAL
+    ip       requests of one client address, RATE_LIMIT_IP
+    email    failed logins or password changes of one account, RATE_LIMIT_EMAIL_FAILURES
+Limits are written "count/seconds". A rejected request gets a 429 with a
+Retry-After header.
+
+The counters live in a memory-mapped file (RATE_LIMIT_PATH), a fixed table of
+RATE_LIMIT_SLOTS slots of 24 bytes, so every worker of the host sees the same
+counts. Each slot keeps the count of the current and the previous window of a
+key, the sliding count is the previous one weighted by how much of it still
+overlaps the last `window` seconds, plus the current one.
+"""
+import fcntl
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from decouple import config
+from flask import request
+from utils.message_codes import TOO_MANY_REQUESTS
+from utils.server_response import ServerResponse, StatusCode
+
+# magic, slots, key hashing salt
+_HEADER = struct.Struct('<8sI16s')
+_MAGIC = b'RATELIM1'
+# key hash, window seconds, window number, count in that window, count in the window before
+_SLOT = struct.Struct('<QIIII')
+# Slots probed for a key before one is evicted
+_PROBES = 8
+
+
+class RateLimited(Exception):
+    """Raised when a limit is exceeded, the request should be rejected before doing any work"""
+    def __init__(self, scope, retry_after):
+        super().__init__(f"Rate limit {scope} exceeded")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class Limit:
+    """`count` requests every `window` seconds, parsed from "count/seconds" """
+    __slots__ = ('count', 'window')
+
+    def __init__(self, count, window):
+        if count < 1 or window < 1:
+            raise ValueError("Rate limits need a count and a window of at least 1")
+        self.count = count
+        self.window = window
+
+    @classmethod
+    def parse(cls, value):
+        count, window = value.split('/')
+        return cls(int(count), int(window))
+
+    def __repr__(self):
+        return f"{self.count}/{self.window}"
+
+
+def sliding_count(current, previous, elapsed, window):
+    """Requests in the last `window` seconds, `elapsed` seconds into the current window"""
+    return previous * (1 - elapsed / window) + current
+
+
+def retry_after(current, previous, elapsed, limit, cost=1):
+    """Seconds until `cost` more requests fit in the limit"""
+    window = limit.window
+    if current + cost > limit.count:
+        # Wait for the next window and for this one to decay enough in it
+        wait = window - elapsed + window * (1 - (limit.count - cost) / current)
+    else:
+        wait = window * (1 - (limit.count - current - cost) / previous) - elapsed
+    return max(1, math.ceil(wait))
+
+
+class SlidingWindowTable:
+    """Fixed size table of sliding-window counters in a memory-mapped file
+
+    Keys are hashed with a salt kept in the file and placed by linear
+    probing. A key that finds no free or expired slot among `_PROBES` takes
+    the one with the fewest requests, so an attacker rotating keys can only
+    make the limits forget the quietest clients. Updates hold an flock on
+    the file, processes of the host take turns.
+    """
+    def __init__(self, path, slots=65536):
+        self.path = path
+        self.requested_slots = slots
+        self.slots = None
+        self._lock = threading.Lock()
+        self._fd = None
+        self._mm = None
+        self._salt = None
+        self._pid = None
+
+    def _open(self):
+        # A descriptor inherited through fork shares its flock with the parent, every process opens its own
+        if self._pid == os.getpid():
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_size < _HEADER.size:
+                os.ftruncate(fd, 0)
+                os.write(fd, _HEADER.pack(_MAGIC, self.requested_slots, os.urandom(16)))
+                os.ftruncate(fd, _HEADER.size + self.requested_slots * _SLOT.size)
+            magic, slots, salt = _HEADER.unpack(os.pread(fd, _HEADER.size, 0))
+            if magic != _MAGIC or os.fstat(fd).st_size != _HEADER.size + slots * _SLOT.size:
+                raise ValueError(f"{self.path} is not a rate limit table")
+            if slots != self.requested_slots:
+                logging.warning(f"Rate limit table {self.path} has {slots} slots, using it as it is")
+            mm = mmap.mmap(fd, 0)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd, self._mm, self.slots, self._salt, self._pid = fd, mm, slots, salt, os.getpid()
+
+    def _hash(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=8, key=self._salt).digest()
+        # Zero marks a free slot
+        return int.from_bytes(digest, 'little') | 1
+
+    def _offset(self, index):
+        return _HEADER.size + (index % self.slots) * _SLOT.size
+
+    def _find(self, key_hash, window, now):
+        """(offset, counts of the key as (current, previous)), a free or evicted slot for a new key"""
+        number = int(now // window)
+        start = key_hash % self.slots
+        reusable = None
+        quietest = None
+        for probe in range(_PROBES):
+            offset = self._offset(start + probe)
+            slot_hash, slot_window, slot_number, current, previous = _SLOT.unpack_from(self._mm, offset)
+            if slot_hash == key_hash and slot_window == window:
+                if slot_number == number:
+                    return offset, (current, previous)
+                if slot_number == number - 1:
+                    return offset, (0, current)
+                return offset, (0, 0)
+            if reusable is None and (slot_hash == 0 or slot_number < int(now // max(slot_window, 1)) - 1):
+                reusable = offset
+            if quietest is None or current + previous < quietest[1]:
+                quietest = (offset, current + previous)
+        return (reusable if reusable is not None else quietest[0]), None
+
+    def acquire(self, checks, now=None):
+        """Count a request against every (scope, key, limit, counted) check, all or none
+
+        Checks with `counted` False are only compared with their limit, e.g.
+        past failures. Raise RateLimited with the longest wait when any limit
+        is exceeded, nothing is counted then.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                pending = []
+                worst = None
+                for scope, key, limit, counted in checks:
+                    key_hash = self._hash(key)
+                    offset, counts = self._find(key_hash, limit.window, now)
+                    current, previous = counts or (0, 0)
+                    elapsed = now % limit.window
+                    # Whether one more request fits, counted or not
+                    if sliding_count(current, previous, elapsed, limit.window) + 1 > limit.count:
+                        wait = retry_after(current, previous, elapsed, limit)
+                        if worst is None or wait > worst[1]:
+                            worst = (scope, wait)
+                    elif counted:
+                        pending.append((key_hash, limit.window))
+                if worst is not None:
+                    raise RateLimited(*worst)
+                for key_hash, window in pending:
+                    # Found again, a new key may have taken the slot picked for another one
+                    self._increment(key_hash, window, now)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _increment(self, key_hash, window, now):
+        offset, counts = self._find(key_hash, window, now)
+        current, previous = counts or (0, 0)
+        _SLOT.pack_into(self._mm, offset, key_hash, window, int(now // window), current + 1, previous)
+
+    def add(self, key, limit, now=None):
+        """Count one more event for `key` without checking its limit"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                self._increment(self._hash(key), limit.window, now)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def clear(self, key, limit, now=None):
+        """Forget the counts of `key`"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                offset, counts = self._find(self._hash(key), limit.window, now)
+                if counts is not None:
+                    _SLOT.pack_into(self._mm, offset, 0, 0, 0, 0, 0)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+class RateLimiter:
+    """The global, per address and per account limits of the throttled endpoints"""
+    def __init__(self, table, global_limit, ip_limit, failure_limit):
+        self.table = table
+        self.global_limit = global_limit
+        self.ip_limit = ip_limit
+        self.failure_limit = failure_limit
+        self._stats = {'allowed': 0, 'rejected_global': 0, 'rejected_ip': 0, 'rejected_email': 0, 'failures': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def check(self, ip, email=None):
+        """Count a request of `ip`, raise RateLimited when a limit is exceeded
+
+        With `email`, the request is also rejected while the account has too
+        many recent failures.
+        """
+        checks = [('global', 'global', self.global_limit, True), ('ip', 'ip:' + ip, self.ip_limit, True)]
+        if email:
+            checks.append(('email', 'failures:' + email.lower(), self.failure_limit, False))
+        try:
+            self.table.acquire(checks)
+        except RateLimited as e:
+            self._count('rejected_' + e.scope)
+            raise
+        self._count('allowed')
+
+    def record_failure(self, email):
+        self._count('failures')
+        self.table.add('failures:' + email.lower(), self.failure_limit)
+
+    def clear_failures(self, email):
+        self.table.clear('failures:' + email.lower(), self.failure_limit)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({'global': repr(self.global_limit), 'ip': repr(self.ip_limit), 'email_failures': repr(self.failure_limit)})
+        return stats
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """The limiter of this host, None when RATE_LIMIT_ENABLED is off"""
+    global _limiter
+    if _limiter is None and config('RATE_LIMIT_ENABLED', default=True, cast=bool):
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(
+                    SlidingWindowTable(
+                        config('RATE_LIMIT_PATH', default=os.path.join(tempfile.gettempdir(), 'security-service-ratelimit.bin')),
+                        slots=config('RATE_LIMIT_SLOTS', default=65536, cast=int)
+                    ),
+                    global_limit=config('RATE_LIMIT_GLOBAL', default='100/1', cast=Limit.parse),
+                    ip_limit=config('RATE_LIMIT_IP', default='30/60', cast=Limit.parse),
+                    failure_limit=config('RATE_LIMIT_EMAIL_FAILURES', default='5/300', cast=Limit.parse)
+                )
+    return _limiter
+
+
+def client_ip(remote_addr, forwarded_for=None):
+    """Address the limits apply to
+
+    With RATE_LIMIT_FORWARDED_FOR the service runs behind a proxy, the
+    address it appended last to X-Forwarded-For is the client's. Earlier
+    entries come from the client and can't be trusted.
+    """
+    if forwarded_for and config('RATE_LIMIT_FORWARDED_FOR', default=False, cast=bool):
+        return forwarded_for.split(',')[-1].strip()
+    return remote_addr or 'unknown'
+
+
+def request_ip():
+    """client_ip of the current Flask request"""
+    return client_ip(request.remote_addr, request.headers.get('X-Forwarded-For'))
+
+
+def check_rate_limits(ip, email=None):
+    """See RateLimiter.check, a no-op when rate limiting is off"""
+    limiter = get_rate_limiter()
+    if limiter is not None:
+        limiter.check(ip, email)
+
+
+def record_failure(email):
+    limiter = get_rate_limiter()
+    if limiter is not None:
+        limiter.record_failure(email)
+
+
+def clear_failures(email):
+    limiter = get_rate_limiter()
+    if limiter is not None:
+        limiter.clear_failures(email)
+
+
+def rate_limit_stats():
+    return _limiter.stats() if _limiter is not None else None
+
+
+def throttled_server_response(error):
+    return ServerResponse(
+        message="Too many requests, please retry later",
+        message_code=TOO_MANY_REQUESTS,
+        status=StatusCode.TOO_MANY_REQUESTS,
+        headers={'Retry-After': str(error.retry_after)}
+    )
+
+
+def throttled_response(error):
+    """429 returned by the endpoints when a rate limit rejects the request"""
+    return throttled_server_response(error).to_response()
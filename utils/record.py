@@ -0,0 +1,52 @@
+class Record:
+    """Read-only object with a fixed set of fields
+
+    Subclasses list their fields in __slots__, so instances carry no __dict__.
+    `projection()` asks Mongo for exactly those fields and `from_document`
+    builds the record from the result; a field named `id` holds the document
+    _id as a string.
+    """
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields.get(name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    @classmethod
+    def projection(cls):
+        projection = {('_id' if name == 'id' else name): 1 for name in cls.__slots__}
+        projection.setdefault('_id', 0)
+        return projection
+
+    @classmethod
+    def from_document(cls, document):
+        if document is None:
+            return None
+        fields = {name: document.get(name) for name in cls.__slots__}
+        if 'id' in cls.__slots__:
+            fields['id'] = str(document['_id'])
+        return cls(**fields)
+
+    def replace(self, **changes):
+        """Copy of the record with some fields changed"""
+        fields = self.to_dict()
+        fields.update(changes)
+        return type(self)(**fields)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
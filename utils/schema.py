@@ -0,0 +1,164 @@
+"""
+Declarative validation of request bodies
+
+A Schema is declared once, at import, and validates a body in one pass:
+
+    LOGIN = Schema(
+        email=Field(str, required=True, help="Email cannot be blank!"),
+        password=Field(str, required=True, help="Password cannot be blank!")
+    )
+    values, error = LOGIN.validate(data)
+    if error:
+        return error.to_response()
+
+Errors are ServerResponses with the offending fields in data['errors']:
+400 MISSING_REQUIRED_FIELDS for absent fields or a body that isn't an
+object, 422 INVALID_FIELDS for values that can't be coerced to their type.
+"""
+from flask import request
+from utils.message_codes import MISSING_REQUIRED_FIELDS, INVALID_FIELDS
+from utils.server_response import ServerResponse, StatusCode
+
+
+class Invalid(ValueError):
+    pass
+
+
+def _to_str(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise Invalid('must be a string')
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        raise Invalid('must be an integer')
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            pass
+    raise Invalid('must be an integer')
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    raise Invalid('must be a boolean')
+
+
+def _of_type(kind, name):
+    def coerce(value):
+        if isinstance(value, kind):
+            return value
+        raise Invalid(f'must be {name}')
+    return coerce
+
+
+COERCERS = {
+    str: _to_str,
+    int: _to_int,
+    bool: _to_bool,
+    list: _of_type(list, 'a list'),
+    dict: _of_type(dict, 'an object'),
+}
+
+
+class Field:
+    """One body field
+
+    kind -- str, int, bool, list or dict, or a callable that coerces the raw
+            value and raises ValueError when it can't
+    required -- the field must be present and not null
+    blank -- whether an empty string satisfies a required field
+    help -- message reported when a required field is missing
+    default -- value of an absent optional field
+    """
+    __slots__ = ('kind', 'coerce', 'required', 'blank', 'help', 'default')
+
+    def __init__(self, kind=str, required=False, blank=True, help=None, default=None):
+        self.kind = kind
+        self.coerce = COERCERS.get(kind, kind)
+        self.required = required
+        self.blank = blank
+        self.help = help
+        self.default = default
+
+
+class Schema:
+    """Compiled set of fields, see the module docstring
+
+    message -- overrides the message of the missing fields error
+    from_values -- also read form fields and the query string, the JSON body wins,
+                   for the endpoints whose reqparse parsers accepted them
+    """
+    def __init__(self, message=None, from_values=False, **fields):
+        self.message = message
+        self.from_values = from_values
+        # Flattened once so validate is a single loop over tuples
+        self._fields = tuple(
+            (name, field.coerce, field.required, field.blank, field.help, field.default)
+            for name, field in fields.items()
+        )
+        self.names = tuple(fields)
+
+    def validate(self, data):
+        """Return (values, None) or (None, error ServerResponse)"""
+        if data is None:
+            data = {}
+        elif not isinstance(data, dict):
+            return None, ServerResponse(
+                message="The request body must be a JSON object",
+                message_code=MISSING_REQUIRED_FIELDS,
+                status=StatusCode.BAD_REQUEST
+            )
+        values = {}
+        missing = None
+        invalid = None
+        for name, coerce, required, blank, help_message, default in self._fields:
+            value = data.get(name)
+            if value is None or (not blank and value == ''):
+                if required:
+                    missing = missing or {}
+                    missing[name] = help_message or f"{name} is required"
+                values[name] = default
+                continue
+            try:
+                values[name] = coerce(value)
+            except (ValueError, TypeError) as ex:
+                invalid = invalid or {}
+                invalid[name] = f"{name} {ex}"
+        if missing:
+            return None, ServerResponse(
+                data={'errors': missing},
+                message=self.message or next(iter(missing.values())),
+                message_code=MISSING_REQUIRED_FIELDS,
+                status=StatusCode.BAD_REQUEST
+            )
+        if invalid:
+            return None, ServerResponse(
+                data={'errors': invalid},
+                message=next(iter(invalid.values())),
+                message_code=INVALID_FIELDS,
+                status=StatusCode.UNPROCESSABLE_ENTITY
+            )
+        return values, None
+
+    def parse_request(self, with_query=False):
+        """Validate the JSON body of the current Flask request, merged over its query string when with_query
+
+        A from_values schema is merged over the form fields and the query string.
+        """
+        data = request.get_json(silent=True)
+        extra = request.values if self.from_values else request.args if with_query else None
+        if extra:
+            data = {**extra.to_dict(), **data} if isinstance(data, dict) else extra.to_dict()
+        return self.validate(data)
@@ -1,4 +1,8 @@
 from flask import Response
+from datetime import date, datetime
+from uuid import UUID
+from bson import ObjectId
+from decouple import config
 import json
 import logging
 
@@ -11,10 +15,92 @@ class StatusCode:
     UNPROCESSABLE_ENTITY = 422
     INTERNAL_SERVER_ERROR = 500
     TIMEOUT = 503
+    SERVICE_UNAVAILABLE = 503
+    TOO_MANY_REQUESTS = 429
     BAD_REQUEST = 400
+    PAYLOAD_TOO_LARGE = 413
     FORBIDDEN = 403 
     UNAUTHORIZED = 401
 
+DEFAULT_MESSAGES = {
+    StatusCode.OK: ('Successfully requested', "OK_MSG"),
+    StatusCode.CREATED: ('Successfully created', "CREATED_MSG"),
+    StatusCode.NOT_FOUND: ('Record not found', "NOT_FOUND_MSG"),
+    StatusCode.CONFLICT: ('Conflict error with the request', "CONFLICT_MSG"),
+    StatusCode.UNPROCESSABLE_ENTITY: ('Unprocessable entity', "UNPROCESSABLE_ENTITY_MSG"),
+    StatusCode.INTERNAL_SERVER_ERROR: ('Internal server error', "INTERNAL_SERVER_ERROR_MSG"),
+    StatusCode.TIMEOUT: ('Server timeout', "SERVER_TIMEOUT_MSG"),
+}
+
+
+def serialize(value):
+    """Values JSON has no type for, anything else is a serialization error"""
+    if isinstance(value, datetime):
+        # Same text str() gave these values before
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (ObjectId, UUID)):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def json_encoder(body):
+    return json.dumps(body, default=serialize, separators=(',', ':')).encode()
+
+
+def orjson_encoder(body):
+    import orjson
+    # Datetimes go through serialize too, so both encoders write them the same way
+    return orjson.dumps(body, default=serialize, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+
+
+def _default_encoder():
+    name = config('RESPONSE_ENCODER', default='auto')
+    if name == 'json':
+        return json_encoder
+    try:
+        import orjson  # noqa: F401
+        return orjson_encoder
+    except ImportError:
+        if name == 'orjson':
+            raise
+        return json_encoder
+
+
+_encode = _default_encoder()
+_static_bodies = {}
+_STATIC_BODIES_MAX = 512
+
+
+def set_encoder(encoder):
+    """Replace the body encoder, a callable from the body dict to bytes"""
+    global _encode
+    _encode = encoder
+    _static_bodies.clear()
+
+
+def encode(value):
+    """Any JSON value with the current encoder, e.g. one line of an NDJSON stream"""
+    return _encode(value)
+
+
+def encode_body(data, message, message_code):
+    body = {'data': data, 'message': message, 'message_code': message_code}
+    if data is not None:
+        return _encode(body)
+    # Bodies without data repeat a few constant messages, e.g. INVALID_CREDENTIALS, encode each once
+    key = (message, message_code)
+    encoded = _static_bodies.get(key)
+    if encoded is None:
+        encoded = _encode(body)
+        if len(_static_bodies) < _STATIC_BODIES_MAX:
+            _static_bodies[key] = encoded
+    return encoded
+
+
 class ServerResponse:
     """Handle server responses
     
@@ -23,51 +109,37 @@ class ServerResponse:
     message -- description of the response
     message_code -- multilanguage code 
     status -- integer http status code
+    headers -- optional extra response headers
     """
-    def __init__(self, data=None, message=None, message_code=None, status=StatusCode.OK):
+    def __init__(self, data=None, message=None, message_code=None, status=StatusCode.OK, headers=None):
         self.data = data
         self.message = message
         self.message_code = message_code
         self.status = status
+        self.headers = headers
         self.__get_default_msg()
 
     def __get_default_msg(self):
-        if not self.message:
-            if self.status == StatusCode.OK:
-                self.message = 'Successfully requested'
-                self.message_code = "OK_MSG"
-            elif self.status == StatusCode.CREATED:
-                self.message = 'Successfully created'
-                self.message_code = "CREATED_MSG"
-            elif self.status == StatusCode.NOT_FOUND:
-                self.message = 'Record not found'
-                self.message_code = "NOT_FOUND_MSG"
-            elif self.status == StatusCode.CONFLICT:
-                self.message = 'Conflict error with the request'
-                self.message_code = "CONFLICT_MSG"
-            elif self.status == StatusCode.UNPROCESSABLE_ENTITY:
-                self.message = 'Unprocessable entity'
-                self.message_code = "UNPROCESSABLE_ENTITY_MSG"
-            elif self.status == StatusCode.INTERNAL_SERVER_ERROR:
-                self.message = 'Internal server error'
-                self.message_code = "INTERNAL_SERVER_ERROR_MSG"
-            elif self.status == StatusCode.TIMEOUT:
-                self.message = 'Server timeout'
-                self.message_code = "SERVER_TIMEOUT_MSG"
+        if not self.message and self.status in DEFAULT_MESSAGES:
+            self.message, self.message_code = DEFAULT_MESSAGES[self.status]
 
-    def __server_response(self):
-        self.__get_default_msg()
-        body = {
-            'data': self.data,
-            'message': self.message,
-            'message_code': self.message_code
-        }
+    def __body_json(self):
+        if not self.message:
+            self.__get_default_msg()
         try:
-            body_json = json.dumps(body, default=str)  # Use default=str to handle datetime serialization
+            return encode_body(self.data, self.message, self.message_code)
         except TypeError as e:
             logging.error(f"Serialization error: {e}")
-            body_json = json.dumps({'message': 'Serialization error'}, default=str)
-        return Response(body_json, mimetype='application/json', status=int(self.status))
+            return _encode({'message': 'Serialization error'})
+
+    def __server_response(self):
+        return Response(self.__body_json(), mimetype='application/json', status=int(self.status), headers=self.headers)
 
     def to_response(self):
         return self.__server_response()
+
+    def to_tuple(self):
+        """(body, status, headers) for frameworks other than Flask, e.g. the async app"""
+        headers = {'Content-Type': 'application/json'}
+        headers.update(self.headers or {})
+        return self.__body_json(), int(self.status), headers
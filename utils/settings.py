@@ -0,0 +1,183 @@
+"""
+Typed settings snapshot
+
+The settings read on every request are parsed and validated once, into a
+read-only Settings, instead of going through decouple.config on each call:
+
+    settings = get_settings()
+    jwt.encode(payload, settings.jwt_secret_key, algorithm='HS256')
+
+A missing or malformed key fails at start-up, with every bad key listed.
+reload_settings() reads the environment and .env again and swaps the
+snapshot, install_reload_signal() runs it on SIGHUP so secrets can be
+rotated without restarting the workers. State derived from a setting is
+kept next to the snapshot it came from, or dropped by an on_reload callback.
+"""
+import logging
+import os
+import signal
+import threading
+from decouple import AutoConfig, UndefinedValueError
+from jwt.algorithms import get_default_algorithms
+from utils.record import Record
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REQUIRED = object()
+
+
+def _one_of(*choices):
+    def cast(value):
+        if value not in choices:
+            raise ValueError(f"expected one of {', '.join(choices)}, got {value!r}")
+        return value
+    return cast
+
+
+def _jwt_algorithm(value):
+    if value not in get_default_algorithms() or value.startswith('HS') and value != 'HS256':
+        raise ValueError(f"unsupported algorithm {value!r}")
+    return value
+
+
+def _pem(value):
+    # Single line .env values carry the PEM line breaks escaped
+    return value.replace('\\n', '\n')
+
+
+def _key_list(value):
+    # "kid:secret,kid:secret" as a tuple of (kid, secret)
+    keys = []
+    for entry in value.split(','):
+        if entry.strip():
+            if ':' not in entry:
+                raise ValueError("expected kid:secret entries separated by commas")
+            key_id, secret = entry.strip().split(':', 1)
+            keys.append((key_id, secret))
+    return tuple(keys)
+
+
+# attribute: (key, cast, default)
+FIELDS = {
+    'mongo_url': ('MONGO_URL', str, REQUIRED),
+    'mongo_db': ('MONGO_DB', str, REQUIRED),
+    'mongo_use_transactions': ('MONGO_USE_TRANSACTIONS', bool, False),
+    'user_collection': ('USER_COLLECTION', str, REQUIRED),
+    'role_collection': ('ROLE_COLLECTION', str, REQUIRED),
+    'jwt_secret_key': ('JWT_SECRET_KEY', str, REQUIRED),
+    'jwt_algorithm': ('JWT_ALGORITHM', _jwt_algorithm, 'HS256'),
+    'jwt_private_key': ('JWT_PRIVATE_KEY', _pem, ''),
+    'jwt_private_key_file': ('JWT_PRIVATE_KEY_FILE', str, ''),
+    'jwt_key_id': ('JWT_KEY_ID', str, ''),
+    'jwt_retiring_keys': ('JWT_RETIRING_KEYS', _key_list, ''),
+    'jwt_retiring_key_files': ('JWT_RETIRING_KEY_FILES', _key_list, ''),
+    'jwt_issuer': ('JWT_ISSUER', str, 'security-service-api'),
+    'jwks_max_age': ('JWKS_MAX_AGE', int, 300),
+    'encryption_key_id': ('ENCRYPTION_KEY_ID', str, 'k1'),
+    'encryption_password': ('ENCRYPTION_PASSWORD', str, REQUIRED),
+    'encryption_retired_keys': ('ENCRYPTION_RETIRED_KEYS', _key_list, ''),
+    'sender_email': ('SENDER_EMAIL', str, REQUIRED),
+    'sender_email_password': ('SENDER_EMAIL_PASSWORD', str, ''),
+    'email_delivery': ('EMAIL_DELIVERY', _one_of('queue', 'outbox'), 'queue'),
+}
+
+# Masked in repr so a logged snapshot doesn't leak them
+SECRETS = ('mongo_url', 'jwt_secret_key', 'jwt_private_key', 'jwt_retiring_keys', 'encryption_password',
+           'encryption_retired_keys', 'sender_email_password')
+
+
+class SettingsError(Exception):
+    """Missing or malformed settings, all of them in `problems`"""
+    def __init__(self, problems):
+        self.problems = problems
+        super().__init__('Invalid settings: ' + '; '.join(problems))
+
+
+class Settings(Record):
+    """Read-only snapshot of the settings listed in FIELDS"""
+    __slots__ = tuple(FIELDS)
+
+    def __repr__(self):
+        fields = ', '.join(
+            f"{name}={'***' if name in SECRETS and getattr(self, name) else repr(getattr(self, name))}"
+            for name in self.__slots__
+        )
+        return f"Settings({fields})"
+
+
+def load_settings(source=None):
+    """Build a Settings from `source`, by default the environment and .env read again
+
+    Raise SettingsError listing every missing or malformed key.
+    """
+    # decouple's module level config caches the .env forever, a new one reads the current file
+    source = source or AutoConfig(search_path=BASE_DIR)
+    values = {}
+    problems = []
+    for name, (key, cast, default) in FIELDS.items():
+        try:
+            if default is REQUIRED:
+                values[name] = source(key, cast=cast)
+                if values[name] == '':
+                    problems.append(f"{key} is required")
+            else:
+                values[name] = source(key, default=default, cast=cast)
+        except UndefinedValueError:
+            problems.append(f"{key} is required")
+        except ValueError as ex:
+            problems.append(f"{key}: {ex}")
+    if problems:
+        raise SettingsError(problems)
+    return Settings(**values)
+
+
+_settings = None
+_settings_lock = threading.Lock()
+_callbacks = []
+
+
+def get_settings():
+    """The current snapshot, loaded on first use"""
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _settings = load_settings()
+    return _settings
+
+
+def on_reload(callback):
+    """Call `callback(settings)` with every new snapshot"""
+    _callbacks.append(callback)
+    return callback
+
+
+def reload_settings():
+    """Swap in a fresh snapshot, return False and keep the current one when the new settings are invalid"""
+    global _settings
+    try:
+        settings = load_settings()
+    except SettingsError as ex:
+        logging.error(f"Settings not reloaded: {ex}")
+        return False
+    # A plain assignment, readers see the old or the new snapshot, never a mix
+    _settings = settings
+    for callback in list(_callbacks):
+        try:
+            callback(settings)
+        except Exception as ex:
+            logging.error(f"Settings reload callback {callback.__name__} failed: {ex}")
+    logging.info("Settings reloaded")
+    return True
+
+
+def install_reload_signal(signum=None):
+    """Reload the settings when the process receives `signum`, SIGHUP by default
+
+    Signal handlers can only be set from the main thread, elsewhere this is
+    a no-op that returns False.
+    """
+    signum = signum or getattr(signal, 'SIGHUP', None)
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+    signal.signal(signum, lambda received, frame: reload_settings())
+    return True